@@ -2,6 +2,21 @@
 """
 RecipeScript Compiler - Main Entry Point
 Run this file to use the RecipeScript compiler
+
+Usage:
+    python recipescript.py                           Interactive mode
+    python recipescript.py file.recipe               Compile and run
+    python recipescript.py compile file.recipe [out.rsc]
+                                                     Compile to bytecode
+    python recipescript.py run-bytecode file.rsc     Run compiled bytecode
+    python recipescript.py specialize file.recipe name=value ... [out.rsc]
+                                                     Compile to bytecode with
+                                                     fixed input values
+
+Options:
+    -O0 | -O1 | -O2 | -O3                            Optimization level (default -O2)
+    --register-vm                                    Run on the slot-indexed register
+                                                     VM instead of the interpreter
 """
 
 import sys
@@ -10,8 +25,45 @@ import os
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
-# Import and run the compiler
-from compiler import main
-
 if __name__ == "__main__":
-    main()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    
+    if command == 'compile' and len(sys.argv) > 2:
+        from compiler import compile_file
+        from pass_manager import parse_opt_level
+        try:
+            opt_level, args = parse_opt_level(sys.argv[2:])
+            if not args:
+                raise Exception("No input file given to 'compile'")
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            sys.exit(2)
+        output = args[1] if len(args) > 1 else None
+        sys.exit(0 if compile_file(args[0], output, opt_level) else 1)
+    elif command == 'specialize' and len(sys.argv) > 2:
+        from compiler import specialize_file
+        from pass_manager import parse_opt_level
+        try:
+            opt_level, args = parse_opt_level(sys.argv[2:])
+            if not args:
+                raise Exception("No input file given to 'specialize'")
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            sys.exit(2)
+        bindings = dict(arg.split('=', 1) for arg in args[1:] if '=' in arg)
+        outputs = [arg for arg in args[1:] if '=' not in arg]
+        output = outputs[0] if outputs else None
+        sys.exit(0 if specialize_file(args[0], bindings, output, opt_level) else 1)
+    elif command == 'run-bytecode' and len(sys.argv) > 2:
+        # Only the bytecode loader and interpreter are imported here
+        from bytecode import run_bytecode
+        from register_vm import parse_backend
+        register_vm, args = parse_backend(sys.argv[2:])
+        if not args:
+            print("[ERROR] No bytecode file given to 'run-bytecode'")
+            sys.exit(2)
+        sys.exit(0 if run_bytecode(args[0], register_vm) else 1)
+    else:
+        # Import and run the compiler
+        from compiler import main
+        main()
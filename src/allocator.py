@@ -0,0 +1,134 @@
+"""
+Temporary Slot Allocator for RecipeScript
+Maps compiler temporaries (t0, t1, ...) onto a small set of reusable slots
+with a linear-scan allocator over live intervals, so the interpreter's
+variable table grows with the number of simultaneously live values rather
+than with program length.
+
+Each slot is named after the first temporary assigned to it; user
+variables and any name shared with another function are never renamed.
+"""
+
+from cfg import (ControlFlowGraph, TEMP_PATTERN, uses, defs, replace_uses, replace_defs,
+                 copy_instruction, liveness)
+
+# Instructions that refer to a variable by its source name at runtime
+NAMED_OPS = ['display', 'scale', 'input']
+
+
+class LiveInterval:
+    """Range of instruction positions over which a temporary holds a value"""
+    def __init__(self, name, position):
+        self.name = name
+        self.start = position
+        self.end = position
+        self.slot = None
+        self.starts_with_def = False
+
+    def extend(self, position):
+        """Grow the interval to cover position"""
+        self.start = min(self.start, position)
+        self.end = max(self.end, position)
+
+    def __repr__(self):
+        return f"{self.name}[{self.start}, {self.end}]"
+
+
+class TempAllocator:
+    def __init__(self, functions):
+        self.functions = functions
+        self.temps_before = 0
+        self.slots_after = 0
+
+    def allocatable(self, function):
+        """Temporaries private to a function"""
+        elsewhere = set()
+        for other in self.functions:
+            if other is function:
+                continue
+            for instr in other.instructions:
+                elsewhere.update(uses(instr))
+                elsewhere.update(defs(instr))
+        temps = set()
+        named = set()
+        for instr in function.instructions:
+            names = uses(instr) + defs(instr)
+            if instr.op in NAMED_OPS:
+                named.update(names)
+            temps.update(name for name in names if TEMP_PATTERN.match(name))
+        return temps - elsewhere - named
+
+    def live_intervals(self, cfg, candidates):
+        """Live intervals of candidate temporaries in layout order"""
+        _, live_out = liveness(cfg)
+        live_after = {}
+        position = 0
+        positions = {}
+        for block in cfg.blocks:
+            for instr in block.instructions:
+                positions[id(instr)] = position
+                position += 1
+            live = set(live_out[block.id])
+            for instr in reversed(block.instructions):
+                live_after[id(instr)] = set(live)
+                live -= set(defs(instr))
+                live |= set(uses(instr))
+
+        intervals = {}
+        for block in cfg.blocks:
+            for instr in block.instructions:
+                pos = positions[id(instr)]
+                for name in live_after[id(instr)] | set(uses(instr)) | set(defs(instr)):
+                    if name not in candidates:
+                        continue
+                    if name in intervals:
+                        intervals[name].extend(pos)
+                    else:
+                        intervals[name] = LiveInterval(name, pos)
+                        intervals[name].starts_with_def = name in defs(instr) and name not in uses(instr)
+        return sorted(intervals.values(), key=lambda interval: (interval.start, interval.end))
+
+    def linear_scan(self, intervals):
+        """Assign slots; a slot is reused once its interval has ended"""
+        active = []
+        free_slots = []
+        slot_names = []
+        for interval in intervals:
+            # Operands are read before the result is written, so an interval
+            # ending at this position can hand its slot to one defined here
+            for old in list(active):
+                if old.end < interval.start or (old.end == interval.start and interval.starts_with_def):
+                    active.remove(old)
+                    free_slots.append(old.slot)
+            if free_slots:
+                free_slots.sort()
+                interval.slot = free_slots.pop(0)
+            else:
+                interval.slot = len(slot_names)
+                slot_names.append(interval.name)
+            active.append(interval)
+        return {interval.name: slot_names[interval.slot] for interval in intervals}, len(slot_names)
+
+    def allocate(self, function):
+        """Rename a function's temporaries onto reusable slots"""
+        candidates = self.allocatable(function)
+        if not candidates:
+            return function.instructions
+        cfg = ControlFlowGraph(function.instructions)
+        intervals = self.live_intervals(cfg, candidates)
+        mapping, slot_count = self.linear_scan(intervals)
+        self.temps_before += len(intervals)
+        self.slots_after += slot_count
+
+        def rename(name):
+            return mapping.get(name, name)
+
+        allocated = []
+        for instr in function.instructions:
+            instr = copy_instruction(instr)
+            replace_uses(instr, rename)
+            replace_defs(instr, rename)
+            if instr.op == 'assign' and instr.arg1 == instr.result:
+                continue  # Copy between temporaries that now share a slot
+            allocated.append(instr)
+        return allocated
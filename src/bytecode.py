@@ -0,0 +1,361 @@
+"""
+Bytecode Format for RecipeScript
+Serializes optimized Three-Address Code to .rsc files so that deployments
+can execute recipes without the lexer, parser and semantic analyzer.
+
+File Layout (little-endian):
+----------------------------
+1. HEADER: magic "RSC\\0", format version (u16), flags (u16),
+   SHA-256 hash of the source text (32 bytes)
+2. CONSTANT POOL: count (u32), then per entry a tag (u8) and payload
+   tag 0 = int (i64), tag 1 = float (f64), tag 2 = string (u32 length + UTF-8)
+3. NAME TABLE: interned variable/recipe names, count (u32) + strings
+4. LABEL TABLE: count (u32), then (name index u32, instruction index u32)
+5. RECIPE TABLE: count (u32), then (name index u32, instruction index u32)
+6. INSTRUCTIONS: count (u32), then per instruction an opcode (u8) and three
+   operands (arg1, arg2, result), each a kind (u8) and a u32 index:
+   kind 0 = none, 1 = name, 2 = constant, 3 = label,
+   kind 4 = name list (index holds the length, followed by u32 name indices)
+
+Library units (flag FLAG_LIBRARY) append three sections used by the linker:
+7. COMPILER: fingerprint of the compiler that built the unit (32 bytes)
+8. IMPORT TABLE: count (u32), then per import the path string and the
+   SHA-256 hash of the library source it was compiled against
+9. EXPORT TABLE: count (u32), then per recipe its name, return type
+   (empty string if none), parameters as (type, name) string pairs, and the
+   main-program variables it may read as a count (u32) + strings
+"""
+
+import hashlib
+import re
+import struct
+
+from tac import TACInstruction, FUSED_BRANCH_OPS
+
+BYTECODE_MAGIC = b'RSC\x00'
+BYTECODE_VERSION = 5
+FLAG_LIBRARY = 1
+BYTECODE_EXTENSION = '.rsc'
+
+OPCODES = [
+    'assign', 'add', 'sub', 'mul', 'div',
+    'eq', 'neq', 'gt', 'lt', 'gte', 'lte',
+    'label', 'goto', 'if_false', 'if_true',
+    'print', 'mix', 'heat', 'wait', 'serve', 'display', 'scale',
+    'add_ingredient', 'input',
+    'begin_recipe', 'end_recipe', 'param', 'call', 'return',
+] + list(FUSED_BRANCH_OPS)
+OPCODE_INDEX = {op: i for i, op in enumerate(OPCODES)}
+
+LABEL_OPS = ['label', 'goto', 'if_false', 'if_true'] + list(FUSED_BRANCH_OPS)
+NAME_PATTERN = re.compile(r'^[A-Za-z_]\w*$')
+
+OPERAND_NONE = 0
+OPERAND_NAME = 1
+OPERAND_CONST = 2
+OPERAND_LABEL = 3
+OPERAND_LIST = 4
+
+CONST_INT = 0
+CONST_FLOAT = 1
+CONST_STRING = 2
+
+HEADER = struct.Struct('<4sHH32s')
+
+
+def pack_string(value):
+    """Encode a length-prefixed UTF-8 string"""
+    encoded = value.encode('utf-8')
+    return struct.pack('<I', len(encoded)) + encoded
+
+
+def source_hash(source_code):
+    """SHA-256 digest identifying the source a bytecode file was built from"""
+    return hashlib.sha256(source_code.encode('utf-8')).digest()
+
+
+class BytecodeProgram:
+    """Decoded contents of a .rsc file"""
+    def __init__(self, instructions, labels, recipes, source_hash, version, flags=0,
+                 imports=None, exports=None, fingerprint=None):
+        self.instructions = instructions
+        self.labels = labels
+        self.recipes = recipes
+        self.source_hash = source_hash
+        self.version = version
+        self.flags = flags
+        self.imports = imports or []  # [(path, source hash)]
+        self.exports = exports or {}  # recipe -> signature
+        self.fingerprint = fingerprint  # Compiler that built a library unit
+
+
+class BytecodeWriter:
+    def __init__(self):
+        self.constants = []
+        self.constant_index = {}
+        self.names = []
+        self.name_index = {}
+        self.labels = []
+        self.label_index = {}
+
+    def intern_constant(self, value):
+        """Add value to the constant pool (deduplicated by type and value)"""
+        key = (type(value).__name__, value)
+        if key not in self.constant_index:
+            self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return self.constant_index[key]
+
+    def intern_name(self, name):
+        """Add name to the name table"""
+        if name not in self.name_index:
+            self.name_index[name] = len(self.names)
+            self.names.append(name)
+        return self.name_index[name]
+
+    def intern_label(self, label):
+        """Add label to the label table"""
+        if label not in self.label_index:
+            self.label_index[label] = len(self.labels)
+            self.labels.append(label)
+        return self.label_index[label]
+
+    def encode_operand(self, value, is_label=False):
+        """Encode one operand as (kind, index, extra name indices)"""
+        if value is None:
+            return OPERAND_NONE, 0, []
+        if is_label:
+            return OPERAND_LABEL, self.intern_label(value), []
+        if isinstance(value, list):
+            return OPERAND_LIST, len(value), [self.intern_name(name) for name in value]
+        if isinstance(value, str) and NAME_PATTERN.match(value):
+            return OPERAND_NAME, self.intern_name(value), []
+        if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+            return OPERAND_CONST, self.intern_constant(value), []
+        raise Exception(f"Bytecode Error: Cannot encode operand {value!r}")
+
+    def dump(self, instructions, source_code='', imports=None, exports=None, fingerprint=None):
+        """Serialize TAC instructions to bytes (a library unit if exports are given)"""
+        stream = bytearray()
+        label_positions = []
+        recipe_positions = []
+
+        for position, instr in enumerate(instructions):
+            if instr.op not in OPCODE_INDEX:
+                raise Exception(f"Bytecode Error: Unsupported instruction '{instr.op}'")
+            stream += struct.pack('<B', OPCODE_INDEX[instr.op])
+            operands = [
+                self.encode_operand(instr.arg1),
+                self.encode_operand(instr.arg2),
+                self.encode_operand(instr.result, is_label=instr.op in LABEL_OPS),
+            ]
+            for kind, index, extra in operands:
+                stream += struct.pack('<BI', kind, index)
+                for name_index in extra:
+                    stream += struct.pack('<I', name_index)
+            if instr.op == 'label':
+                label_positions.append((self.intern_label(instr.result), position))
+            elif instr.op == 'begin_recipe':
+                recipe_positions.append((self.intern_name(instr.result), position))
+
+        flags = FLAG_LIBRARY if exports is not None else 0
+        data = bytearray(HEADER.pack(BYTECODE_MAGIC, BYTECODE_VERSION, flags, source_hash(source_code)))
+
+        data += struct.pack('<I', len(self.constants))
+        for value in self.constants:
+            if isinstance(value, int):
+                data += struct.pack('<Bq', CONST_INT, value)
+            elif isinstance(value, float):
+                data += struct.pack('<Bd', CONST_FLOAT, value)
+            else:
+                data += struct.pack('<B', CONST_STRING) + pack_string(value)
+
+        for table in (self.names, self.labels):
+            data += struct.pack('<I', len(table))
+            for name in table:
+                data += pack_string(name)
+
+        for positions in (label_positions, recipe_positions):
+            data += struct.pack('<I', len(positions))
+            for index, position in positions:
+                data += struct.pack('<II', index, position)
+
+        data += struct.pack('<I', len(instructions))
+        data += stream
+
+        if flags & FLAG_LIBRARY:
+            data += self.dump_library(imports or [], exports, fingerprint)
+        return bytes(data)
+
+    def dump_library(self, imports, exports, fingerprint=None):
+        """Serialize the compiler fingerprint, import and export tables of a library unit"""
+        data = bytearray(struct.pack('<32s', fingerprint or bytes(32)))
+        data += struct.pack('<I', len(imports))
+        for path, digest in imports:
+            data += pack_string(path) + struct.pack('<32s', digest)
+
+        data += struct.pack('<I', len(exports))
+        for name, signature in exports.items():
+            data += pack_string(name) + pack_string(signature['return_type'] or '')
+            data += struct.pack('<I', len(signature['params']))
+            for param_type, param_name in signature['params']:
+                data += pack_string(param_type) + pack_string(param_name)
+            data += struct.pack('<I', len(signature['reads']))
+            for variable in sorted(signature['reads']):
+                data += pack_string(variable)
+        return data
+
+
+class BytecodeReader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, fmt):
+        """Unpack the next struct fields"""
+        try:
+            values = struct.unpack_from(fmt, self.data, self.offset)
+        except struct.error:
+            raise Exception("Bytecode Error: Unexpected end of file")
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def read_string(self):
+        """Read a length-prefixed UTF-8 string"""
+        (length,) = self.read('<I')
+        raw = self.data[self.offset:self.offset + length]
+        if len(raw) != length:
+            raise Exception("Bytecode Error: Unexpected end of file")
+        self.offset += length
+        return raw.decode('utf-8')
+
+    def load(self):
+        """Decode bytes into a BytecodeProgram"""
+        magic, version, flags, digest = self.read(HEADER.format)
+        if magic != BYTECODE_MAGIC:
+            raise Exception("Bytecode Error: Not a RecipeScript bytecode file")
+        if version != BYTECODE_VERSION:
+            raise Exception(f"Bytecode Error: Unsupported format version {version} (expected {BYTECODE_VERSION})")
+
+        constants = []
+        (count,) = self.read('<I')
+        for _ in range(count):
+            (tag,) = self.read('<B')
+            if tag == CONST_INT:
+                constants.append(self.read('<q')[0])
+            elif tag == CONST_FLOAT:
+                constants.append(self.read('<d')[0])
+            elif tag == CONST_STRING:
+                constants.append(self.read_string())
+            else:
+                raise Exception(f"Bytecode Error: Unknown constant tag {tag}")
+
+        (count,) = self.read('<I')
+        names = [self.read_string() for _ in range(count)]
+        (count,) = self.read('<I')
+        label_names = [self.read_string() for _ in range(count)]
+
+        tables = []
+        for table_names in (label_names, names):
+            (count,) = self.read('<I')
+            table = {}
+            for _ in range(count):
+                index, position = self.read('<II')
+                table[table_names[index]] = position
+            tables.append(table)
+        labels, recipes = tables
+
+        def decode(kind, index):
+            if kind == OPERAND_NONE:
+                return None
+            if kind == OPERAND_NAME:
+                return names[index]
+            if kind == OPERAND_CONST:
+                return constants[index]
+            if kind == OPERAND_LABEL:
+                return label_names[index]
+            if kind == OPERAND_LIST:
+                return [names[self.read('<I')[0]] for _ in range(index)]
+            raise Exception(f"Bytecode Error: Unknown operand kind {kind}")
+
+        instructions = []
+        (count,) = self.read('<I')
+        for _ in range(count):
+            (opcode,) = self.read('<B')
+            if opcode >= len(OPCODES):
+                raise Exception(f"Bytecode Error: Unknown opcode {opcode}")
+            operands = []
+            for _ in range(3):
+                kind, index = self.read('<BI')
+                operands.append(decode(kind, index))
+            instructions.append(TACInstruction(OPCODES[opcode], *operands))
+
+        imports, exports, fingerprint = [], None, None
+        if flags & FLAG_LIBRARY:
+            fingerprint, imports, exports = self.load_library()
+        return BytecodeProgram(instructions, labels, recipes, digest, version, flags, imports, exports, fingerprint)
+
+    def load_library(self):
+        """Decode the compiler fingerprint, import and export tables of a library unit"""
+        (fingerprint,) = self.read('<32s')
+        imports = []
+        (count,) = self.read('<I')
+        for _ in range(count):
+            path = self.read_string()
+            imports.append((path, self.read('<32s')[0]))
+
+        exports = {}
+        (count,) = self.read('<I')
+        for _ in range(count):
+            name = self.read_string()
+            return_type = self.read_string() or None
+            (param_count,) = self.read('<I')
+            params = [(self.read_string(), self.read_string()) for _ in range(param_count)]
+            (variable_count,) = self.read('<I')
+            reads = set(self.read_string() for _ in range(variable_count))
+            exports[name] = {'params': params, 'return_type': return_type, 'reads': reads}
+        return fingerprint, imports, exports
+
+
+def dump_bytecode(instructions, source_code='', imports=None, exports=None, fingerprint=None):
+    """Serialize TAC instructions to .rsc bytes"""
+    return BytecodeWriter().dump(instructions, source_code, imports, exports, fingerprint)
+
+
+def load_bytecode(data):
+    """Decode .rsc bytes"""
+    return BytecodeReader(data).load()
+
+
+def write_bytecode(filename, instructions, source_code='', imports=None, exports=None, fingerprint=None):
+    """Write TAC instructions to a .rsc file"""
+    with open(filename, 'wb') as f:
+        f.write(dump_bytecode(instructions, source_code, imports, exports, fingerprint))
+
+
+def read_bytecode(filename):
+    """Read a .rsc file"""
+    with open(filename, 'rb') as f:
+        return load_bytecode(f.read())
+
+
+def run_bytecode(filename, register_vm=False):
+    """Load and execute a .rsc file (no front-end phases are imported)"""
+    from code_generator import VerifiedCodeGenerator
+    from register_vm import RegisterVM
+    from verifier import IRVerifier
+
+    try:
+        program = read_bytecode(filename)
+        if program.flags & FLAG_LIBRARY:
+            raise Exception(f"Bytecode Error: '{filename}' is a library unit and has no main program")
+        IRVerifier().verify(program.instructions)
+        code_generator = RegisterVM() if register_vm else VerifiedCodeGenerator()
+        code_generator.execute(program.instructions, program.labels, program.recipes)
+        return True
+    except FileNotFoundError:
+        print(f"[ERROR] File '{filename}' not found")
+        return False
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        return False
@@ -0,0 +1,454 @@
+"""
+Control Flow Graph for RecipeScript
+Splits Three-Address Code into functions and basic blocks, and computes
+dominator information used by the flow-sensitive optimizations.
+
+Operand Conventions:
+--------------------
+1. VARIABLES: Identifiers such as flour, t3 (SSA versions are written flour.2)
+2. CONSTANTS: Numbers such as 2, 0.5, 350.0
+3. STRINGS: Quoted literals such as "Ready!"
+4. UNIT VALUES: "value unit" strings; when value is a variable
+   (e.g. "t2 grams", "adjusted minutes") the variable is read at runtime,
+   when it is a number (e.g. "300 ml") the whole string is a constant
+"""
+
+import re
+
+from tac import TACInstruction, FUSED_BRANCH_OPS
+
+VARIABLE_PATTERN = re.compile(r'^[A-Za-z_]\w*(\.\d+)?$')
+TEMP_PATTERN = re.compile(r'^t(\d+)$')
+LABEL_PATTERN = re.compile(r'^L(\d+)$')
+
+ARITHMETIC_OPS = ['add', 'sub', 'mul', 'div']
+COMPARISON_OPS = ['eq', 'neq', 'gt', 'lt', 'gte', 'lte']
+BINARY_OPS = ARITHMETIC_OPS + COMPARISON_OPS
+BRANCH_OPS = ['if_true', 'if_false']
+
+# Unit names as lowered into TAC (TokenType names in lower case)
+UNIT_NAMES = ['cups', 'tbsp', 'tsp', 'ml', 'oz', 'grams', 'lbs', 'fahrenheit', 'celsius',
+              'minutes', 'seconds', 'hours']
+TERMINATOR_OPS = ['goto', 'if_true', 'if_false', 'return'] + list(FUSED_BRANCH_OPS)
+
+
+def is_variable(operand):
+    """Check if operand names a variable"""
+    return isinstance(operand, str) and bool(VARIABLE_PATTERN.match(operand))
+
+
+def unit_reference(operand):
+    """Return the variable read by a "name unit" value, if any"""
+    if not isinstance(operand, str) or operand.startswith('"'):
+        return None
+    parts = operand.split(None, 1)
+    if len(parts) == 2 and is_variable(parts[0]):
+        return parts[0]
+    return None
+
+
+def unit_constant(operand):
+    """Return (number, unit) of a constant "number unit" value, if it is one"""
+    if not isinstance(operand, str):
+        return None
+    parts = operand.split(' ')
+    if len(parts) != 2 or parts[1] not in UNIT_NAMES or is_variable(parts[0]):
+        return None
+    try:
+        float(parts[0])
+    except ValueError:
+        return None
+    return parts[0], parts[1]
+
+
+def base_name(name):
+    """Strip the SSA version from a variable name"""
+    return name.split('.', 1)[0] if isinstance(name, str) else name
+
+
+def uses(instr):
+    """Variables read by an instruction"""
+    if instr.op == 'assign':
+        if is_variable(instr.arg1):
+            return [instr.arg1]
+        ref = unit_reference(instr.arg1)
+        return [ref] if ref else []
+    if instr.op in BINARY_OPS or instr.op in FUSED_BRANCH_OPS:
+        return [arg for arg in (instr.arg1, instr.arg2) if is_variable(arg)]
+    if instr.op in ['param', 'return', 'print', 'wait', 'display', 'scale', 'use'] + BRANCH_OPS:
+        return [instr.arg1] if is_variable(instr.arg1) else []
+    if instr.op == 'heat':
+        return [instr.arg2] if is_variable(instr.arg2) else []
+    if instr.op == 'phi':
+        return [value for value in instr.arg1.values() if is_variable(value)]
+    return []
+
+
+def defs(instr):
+    """Variables written by an instruction"""
+    if instr.op in ['assign', 'call', 'input', 'phi'] + BINARY_OPS:
+        return [instr.result]
+    if instr.op == 'scale':
+        # In SSA form scale writes a new version into result
+        return [instr.result or instr.arg1]
+    return []
+
+
+def replace_uses(instr, rename):
+    """Rewrite the variables read by an instruction through rename(name)"""
+    if instr.op == 'assign':
+        if is_variable(instr.arg1):
+            instr.arg1 = rename(instr.arg1)
+        else:
+            ref = unit_reference(instr.arg1)
+            if ref:
+                unit = instr.arg1.split(None, 1)[1]
+                instr.arg1 = f"{rename(ref)} {unit}"
+    elif instr.op in BINARY_OPS or instr.op in FUSED_BRANCH_OPS:
+        if is_variable(instr.arg1):
+            instr.arg1 = rename(instr.arg1)
+        if is_variable(instr.arg2):
+            instr.arg2 = rename(instr.arg2)
+    elif instr.op in ['param', 'return', 'print', 'wait', 'display', 'scale', 'use'] + BRANCH_OPS:
+        if is_variable(instr.arg1):
+            instr.arg1 = rename(instr.arg1)
+    elif instr.op == 'heat':
+        if is_variable(instr.arg2):
+            instr.arg2 = rename(instr.arg2)
+    elif instr.op == 'phi':
+        for pred, value in instr.arg1.items():
+            if is_variable(value):
+                instr.arg1[pred] = rename(value)
+
+
+def replace_defs(instr, rename):
+    """Rewrite the variables written by an instruction through rename(name)"""
+    if instr.op == 'scale':
+        # Outside SSA form scale updates arg1 in place (renamed as a use)
+        if instr.result:
+            instr.result = rename(instr.result)
+    elif defs(instr):
+        instr.result = rename(instr.result)
+
+
+def copy_instruction(instr):
+    """Copy an instruction so passes can rewrite it in place"""
+    arg1 = instr.arg1
+    if isinstance(arg1, dict):
+        arg1 = dict(arg1)
+    elif isinstance(arg1, list):
+        arg1 = list(arg1)
+    return TACInstruction(instr.op, arg1, instr.arg2, instr.result)
+
+
+class NameSupply:
+    """Fresh temporaries and labels that do not clash with generated ones"""
+    def __init__(self, instructions):
+        self.temp_counter = 0
+        self.label_counter = 0
+        for instr in instructions:
+            for operand in (instr.arg1, instr.arg2, instr.result):
+                if not isinstance(operand, str):
+                    continue
+                match = TEMP_PATTERN.match(base_name(operand))
+                if match:
+                    self.temp_counter = max(self.temp_counter, int(match.group(1)) + 1)
+                match = LABEL_PATTERN.match(operand)
+                if match:
+                    self.label_counter = max(self.label_counter, int(match.group(1)) + 1)
+
+    def new_temp(self):
+        """Generate new temporary variable"""
+        temp = f"t{self.temp_counter}"
+        self.temp_counter += 1
+        return temp
+
+    def new_label(self):
+        """Generate new label"""
+        label = f"L{self.label_counter}"
+        self.label_counter += 1
+        return label
+
+
+class Function:
+    """A recipe body or the main program (name is None)"""
+    def __init__(self, name, instructions, header=None):
+        self.name = name
+        self.instructions = instructions
+        self.header = header  # begin_recipe instruction
+
+    def __repr__(self):
+        return f"Function({self.name or '<main>'}, {len(self.instructions)} instructions)"
+
+
+def split_functions(instructions):
+    """Split a flat TAC program into recipe functions followed by main"""
+    functions = []
+    main = []
+    current = None
+    for instr in instructions:
+        if instr.op == 'begin_recipe':
+            current = Function(instr.result, [], instr)
+        elif instr.op == 'end_recipe':
+            functions.append(current)
+            current = None
+        elif current is not None:
+            current.instructions.append(instr)
+        else:
+            main.append(instr)
+    functions.append(Function(None, main))
+    return functions
+
+
+def join_functions(functions):
+    """Rebuild a flat TAC program from functions"""
+    instructions = []
+    for function in functions:
+        if function.name is None:
+            continue
+        instructions.append(function.header or TACInstruction('begin_recipe', None, None, function.name))
+        instructions.extend(function.instructions)
+        instructions.append(TACInstruction('end_recipe', None, None, function.name))
+    for function in functions:
+        if function.name is None:
+            instructions.extend(function.instructions)
+    return instructions
+
+
+class BasicBlock:
+    """Straight-line instruction sequence with a single entry and exit"""
+    def __init__(self, id, label=None):
+        self.id = id
+        self.label = label
+        self.phis = []
+        self.instructions = []
+        self.preds = []
+        self.succs = []
+
+    def terminator(self):
+        """Return the final jump/branch/return, if any"""
+        if self.instructions and self.instructions[-1].op in TERMINATOR_OPS:
+            return self.instructions[-1]
+        return None
+
+    def falls_through(self):
+        """Check if control can reach the next block in layout order"""
+        term = self.terminator()
+        return term is None or term.op in BRANCH_OPS or term.op in FUSED_BRANCH_OPS
+
+    def __repr__(self):
+        return f"B{self.id}({self.label})" if self.label else f"B{self.id}"
+
+
+class ControlFlowGraph:
+    """Basic blocks of one function in layout order, plus dominators"""
+    def __init__(self, instructions):
+        self.blocks = []
+        self.label_map = {}
+        self.next_id = 0
+        self.build(instructions)
+        self.compute_edges()
+
+    def new_block(self, label=None):
+        """Create a block (not yet placed in layout)"""
+        block = BasicBlock(self.next_id, label)
+        self.next_id += 1
+        if label:
+            self.label_map[label] = block
+        return block
+
+    def build(self, instructions):
+        """Partition instructions into basic blocks"""
+        # Synthetic entry block so the entry never has predecessors
+        self.entry = self.new_block()
+        self.blocks.append(self.entry)
+        current = None
+        for instr in instructions:
+            if instr.op == 'label':
+                current = self.new_block(instr.result)
+                self.blocks.append(current)
+                continue
+            if current is None:
+                current = self.new_block()
+                self.blocks.append(current)
+            current.instructions.append(copy_instruction(instr))
+            if instr.op in TERMINATOR_OPS:
+                current = None
+
+    def compute_edges(self):
+        """(Re)compute predecessor and successor lists from terminators"""
+        for block in self.blocks:
+            block.preds = []
+            block.succs = []
+        for index, block in enumerate(self.blocks):
+            term = block.terminator()
+            if term and term.op != 'return':
+                if term.result not in self.label_map:
+                    raise Exception(f"CFG Error: Label {term.result} not found")
+                target = self.label_map[term.result]
+            else:
+                target = None
+            if block.falls_through() and index + 1 < len(self.blocks):
+                self.add_edge(block, self.blocks[index + 1])
+            if target is not None and target not in block.succs:
+                self.add_edge(block, target)
+
+    def add_edge(self, source, target):
+        """Record a control-flow edge"""
+        source.succs.append(target)
+        target.preds.append(source)
+
+    def reverse_postorder(self):
+        """Reachable blocks in reverse postorder from the entry"""
+        visited = set()
+        order = []
+        stack = [(self.entry, iter(self.entry.succs))]
+        visited.add(self.entry.id)
+        while stack:
+            block, children = stack[-1]
+            advanced = False
+            for succ in children:
+                if succ.id not in visited:
+                    visited.add(succ.id)
+                    stack.append((succ, iter(succ.succs)))
+                    advanced = True
+                    break
+            if not advanced:
+                order.append(block)
+                stack.pop()
+        order.reverse()
+        return order
+
+    def compute_dominators(self):
+        """Immediate dominators (Cooper, Harvey & Kennedy iterative algorithm)"""
+        rpo = self.reverse_postorder()
+        position = {block.id: i for i, block in enumerate(rpo)}
+        idom = {self.entry.id: self.entry}
+
+        def intersect(a, b):
+            while a.id != b.id:
+                while position[a.id] > position[b.id]:
+                    a = idom[a.id]
+                while position[b.id] > position[a.id]:
+                    b = idom[b.id]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block in rpo[1:]:
+                new_idom = None
+                for pred in block.preds:
+                    if pred.id in idom:
+                        new_idom = pred if new_idom is None else intersect(pred, new_idom)
+                if new_idom is not None and idom.get(block.id) is not new_idom:
+                    idom[block.id] = new_idom
+                    changed = True
+
+        self.idom = idom
+        self.rpo = rpo
+        self.dom_children = {block.id: [] for block in rpo}
+        for block in rpo[1:]:
+            self.dom_children[idom[block.id].id].append(block)
+        return idom
+
+    def dominates(self, a, b):
+        """Check if block a dominates block b"""
+        while True:
+            if a is b:
+                return True
+            if b is self.entry or b.id not in self.idom:
+                return False
+            b = self.idom[b.id]
+
+    def dominance_frontiers(self):
+        """Dominance frontier of every reachable block"""
+        frontiers = {block.id: set() for block in self.rpo}
+        for block in self.rpo:
+            preds = [pred for pred in block.preds if pred.id in self.idom]
+            if len(preds) < 2:
+                continue
+            for pred in preds:
+                runner = pred
+                while runner is not self.idom[block.id]:
+                    frontiers[runner.id].add(block)
+                    runner = self.idom[runner.id]
+        return frontiers
+
+    def is_reachable(self, block):
+        """Check if block is reachable from the entry (after compute_dominators)"""
+        return block.id in self.idom
+
+    def split_edge(self, source, target, supply):
+        """Insert an empty block on the edge source -> target"""
+        if target.label is None:
+            target.label = supply.new_label()
+            self.label_map[target.label] = target
+        middle = self.new_block(supply.new_label())
+        term = source.terminator()
+        jumps_to_target = term is not None and term.op != 'return' and term.result == target.label
+        source_index = self.blocks.index(source)
+        next_block = self.blocks[source_index + 1] if source_index + 1 < len(self.blocks) else None
+        if source.falls_through() and next_block is target:
+            # Fall-through edge: place the new block directly after the source
+            self.blocks.insert(source_index + 1, middle)
+        else:
+            # Jump edge: place the new block before the target
+            target_index = self.blocks.index(target)
+            before = self.blocks[target_index - 1]
+            if before.falls_through():
+                before.instructions.append(TACInstruction('goto', None, None, target.label))
+            self.blocks.insert(target_index, middle)
+        if jumps_to_target:
+            term.result = middle.label
+        for phi in target.phis:
+            if source.id in phi.arg1:
+                phi.arg1[middle.id] = phi.arg1.pop(source.id)
+        self.compute_edges()
+        return middle
+
+    def instructions(self):
+        """Linearize the blocks back into a TAC list"""
+        result = []
+        for block in self.blocks:
+            if block.label:
+                result.append(TACInstruction('label', None, None, block.label))
+            result.extend(block.phis)
+            result.extend(block.instructions)
+        return result
+
+
+def liveness(cfg):
+    """Live-in/live-out variable sets of every block (phi-aware backward dataflow)"""
+    gen = {}
+    kill = {}
+    for block in cfg.blocks:
+        block_gen = set()
+        block_kill = set(phi.result for phi in block.phis)
+        for instr in block.instructions:
+            for name in uses(instr):
+                if name not in block_kill:
+                    block_gen.add(name)
+            block_kill.update(defs(instr))
+        gen[block.id] = block_gen
+        kill[block.id] = block_kill
+
+    live_in = {block.id: set() for block in cfg.blocks}
+    live_out = {block.id: set() for block in cfg.blocks}
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(cfg.blocks):
+            out = set()
+            for succ in block.succs:
+                out |= live_in[succ.id] - set(phi.result for phi in succ.phis)
+                for phi in succ.phis:
+                    value = phi.arg1.get(block.id)
+                    if is_variable(value):
+                        out.add(value)
+            new_in = gen[block.id] | (out - kill[block.id])
+            if out != live_out[block.id] or new_in != live_in[block.id]:
+                live_out[block.id] = out
+                live_in[block.id] = new_in
+                changed = True
+    return live_in, live_out
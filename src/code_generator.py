@@ -3,436 +3,624 @@ Code Generator / Interpreter for RecipeScript
 Phase 6: Executes Three-Address Code
 """
 
+from collections import OrderedDict
+
+from tac import FUSED_BRANCH_OPS
+from cfg import split_functions, defs
+from effects import EffectAnalysis
+
+# Safety limit on executed instructions. Repeat counts are literals, so every
+# well-formed program terminates; the limit only catches runaway jumps and
+# must leave room for long loops such as "repeat 10000 times".
+MAX_STEPS = 10_000_000
+# Results of pure recipe calls kept for reuse (least recently used dropped first)
+MEMO_CACHE_SIZE = 256
+MAX_CALL_DEPTH = 1000  # Recipe frames on the call stack at once
+UNSET = ('unset',)  # Value looked up for a variable that is not set
+
+
+def no_operation():
+    """Handler of instructions that do nothing when executed"""
+    return None
+
+
+class Frame:
+    """Activation record of one recipe call"""
+    def __init__(self, variables, return_pc, result, memo_key=None):
+        self.variables = variables  # Parameters bound to the arguments, then the recipe's locals
+        self.return_pc = return_pc  # Position of the CALL to continue after
+        self.result = result  # Caller variable that receives the return value
+        self.memo_key = memo_key  # Memo entry the return value fills (pure recipes)
+
+
+def resolve_operand(operand):
+    """Classify a TAC operand once: (True, variable name) or (False, constant value)"""
+    if operand is None:
+        return False, None
+    operand_str = str(operand)
+    
+    # Quoted string literal
+    if operand_str.startswith('"') and operand_str.endswith('"'):
+        return False, operand_str[1:-1]
+    
+    # Immediate number
+    try:
+        if '.' in operand_str:
+            return False, float(operand_str)
+        return False, int(operand_str)
+    except ValueError:
+        pass
+    
+    # Values with units ("2 cups", "t3 ml") are text; no variable name has a space
+    if ' ' in operand_str:
+        return False, operand_str
+    
+    # Variable reference (an unset name reads as itself)
+    return True, operand_str
+
+
+def typed_values(values):
+    """Values paired with their type names: 2 and 2.0 print differently, so they are different keys"""
+    return tuple((type(value).__name__, value) for value in values)
+
+
+def unit_number(value):
+    """Number in front of a unit ("2 cups" -> 2.0); other values unchanged"""
+    # Handle string values (extract numeric part)
+    if isinstance(value, str) and ' ' in value:
+        try:
+            return float(value.split()[0])
+        except (ValueError, IndexError):
+            pass
+    return value
+
+
 class CodeGenerator:
     def __init__(self):
-        self.variables = {}
+        self.globals = {}  # Main-program variables
+        self.variables = self.globals  # Variables of the running recipe's frame (or main's)
         self.output = []
         self.pc = 0  # Program counter
         self.labels = {}  # Label positions
         self.recipes = {}  # Recipe definitions
-        self.call_stack = []  # Function call stack
+        self.extents = {}  # Recipe -> [start, end) of its body in the linked layout
+        self.params = {}  # Recipe -> parameter names
+        self.main_end = 0  # Main program occupies [0, main_end) of the layout
+        self.call_stack = []  # Frames of the recipe calls in progress
         self.param_stack = []  # Parameter stack
+        self.layout = []  # Instructions in linked order: main program, then recipe bodies
+        self.code = []  # Decoded handler per instruction of the layout
+        self.decoding_frame = None  # While decoding a recipe: the names its frame holds
+        self.pure_reads = {}  # Pure recipe -> main-program variables its result may depend on
+        self.memo = OrderedDict()  # (recipe, arguments, values read) -> result
+        self.memo_hits = {}  # Pure recipe -> calls answered from the memo
+        self.memo_misses = {}  # Pure recipe -> calls that ran the body
     
-    def execute(self, instructions):
+    def execute(self, instructions, labels=None, recipes=None):
         """Execute TAC instructions"""
-        # First pass: collect label positions and recipe definitions
-        for i, instr in enumerate(instructions):
-            if instr.op == 'label':
-                self.labels[instr.result] = i
-            elif instr.op == 'begin_recipe':
-                self.recipes[instr.result] = i
-        
-        # Second pass: execute instructions (skip recipe bodies initially)
+        if labels is not None and recipes is not None:
+            # Tables were linked ahead of time (e.g. loaded from bytecode)
+            self.labels = dict(labels)
+            self.recipes = dict(recipes)
+        else:
+            # First pass: collect label positions and recipe definitions
+            for i, instr in enumerate(instructions):
+                if instr.op == 'label':
+                    self.labels[instr.result] = i
+                elif instr.op == 'begin_recipe':
+                    self.recipes[instr.result] = i
+        self.find_pure_recipes(instructions)
+        self.layout = self.link(instructions)
+        self.code = self.decode(self.layout)
+        
+        # Second pass: execute the main program; recipe bodies run only when called
+        code = self.code
+        main_end = self.main_end
         self.pc = 0
-        max_iterations = len(instructions) * 100  # Safety limit
+        max_iterations = max(len(instructions) * 100, MAX_STEPS)
         iteration_count = 0
         
-        while self.pc < len(instructions):
+        while self.pc < main_end or self.call_stack:
             iteration_count += 1
             if iteration_count > max_iterations:
-                raise Exception(f"Infinite loop detected at PC={self.pc}, instruction: {instructions[self.pc]}")
-            
-            instr = instructions[self.pc]
-            
-            # Skip recipe definitions during main execution
-            if instr.op == 'begin_recipe':
-                # Find end of recipe
-                depth = 1
-                self.pc += 1
-                while self.pc < len(instructions) and depth > 0:
-                    if instructions[self.pc].op == 'begin_recipe':
-                        depth += 1
-                    elif instructions[self.pc].op == 'end_recipe':
-                        depth -= 1
-                    self.pc += 1
-                continue
-            
-            result = self.execute_instruction(instr, instructions)
-            if result == 'return':
-                break
+                raise Exception(f"Infinite loop detected at PC={self.pc}, instruction: {self.layout[self.pc]}")
+            code[self.pc]()
             self.pc += 1
         
         return self.output
     
-    def execute_instruction(self, instr, instructions=None):
-        """Execute single TAC instruction"""
-        if instr.op == 'begin_recipe' or instr.op == 'end_recipe':
-            return None
-        
-        elif instr.op == 'param':
-            # Push parameter onto stack
-            value = self.get_value(instr.arg1)
-            self.param_stack.append(value)
-        
-        elif instr.op == 'call':
-            # Call recipe
-            recipe_name = instr.arg1
-            arg_count = instr.arg2
-            
-            if recipe_name not in self.recipes:
-                raise Exception(f"Runtime Error: Recipe '{recipe_name}' not defined")
-            
-            # Pop arguments from param stack
-            args = []
-            for _ in range(arg_count):
-                if self.param_stack:
-                    args.insert(0, self.param_stack.pop())
+    def link(self, instructions):
+        """Lay out the main program first, then each recipe body, and record the extents"""
+        main = []  # Positions of main-program instructions
+        bodies = []  # (recipe, parameters, positions of its body and END_RECIPE)
+        body = None
+        for index, instr in enumerate(instructions):
+            if instr.op == 'begin_recipe':
+                params = instr.arg1 if isinstance(instr.arg1, list) else []
+                body = (instr.result, params, [])
+                bodies.append(body)
+            elif body is not None:
+                body[2].append(index)
+                if instr.op == 'end_recipe':
+                    body = None
+            else:
+                main.append(index)
+        
+        order = list(main)
+        self.main_end = len(main)
+        for recipe_name, params, positions in bodies:
+            # Recipe body occupies [start, end); its END_RECIPE is the last handler
+            self.extents[recipe_name] = (len(order), len(order) + len(positions))
+            self.params[recipe_name] = params
+            order.extend(positions)
+        
+        position = {index: new for new, index in enumerate(order)}
+        self.labels = {label: position[index] for label, index in self.labels.items()}
+        return [instructions[index] for index in order]
+    
+    def decode(self, layout):
+        """Turn every instruction into a handler with its operands attached"""
+        code = [self.decode_instruction(instr) for instr in layout[:self.main_end]]
+        for recipe_name, (start, end) in self.extents.items():
+            self.decoding_frame = self.frame_names(recipe_name, layout[start:end])
+            code.extend(self.decode_instruction(instr) for instr in layout[start:end])
+        self.decoding_frame = None
+        return code
+    
+    def frame_names(self, recipe_name, body):
+        """Variables a recipe's frame can hold: its parameters and every variable it writes"""
+        names = set(self.params[recipe_name])
+        for instr in body:
+            names.update(defs(instr))
+        return names
+    
+    def decode_instruction(self, instr):
+        """Handler for one instruction"""
+        if instr.op in FUSED_BRANCH_OPS:
+            return self.decode_fused_branch(instr)
+        decoder = getattr(self, f"decode_{instr.op}", None)
+        if decoder is None:
+            return no_operation  # Unknown instructions do nothing
+        return decoder(instr)
+    
+    def execute_instruction(self, instr):
+        """Decode and run one instruction"""
+        return self.decode_instruction(instr)()
+    
+    def operand_reader(self, operand):
+        """Function reading an operand's value, classified once at decode time"""
+        is_variable, value = resolve_operand(operand)
+        if not is_variable:
+            return lambda: value
+        return self.variable_reader(value, value)
+    
+    def variable_key(self, name):
+        """Key under which handlers store a variable in the running frame"""
+        return name
+    
+    def variable_reader(self, name, default):
+        """Function reading a variable from the running frame, else from the main program"""
+        if self.decoding_frame is None or name not in self.decoding_frame:
+            # Main code, or a name the recipe never binds
+            return lambda: self.globals.get(name, default)
+        
+        def read_frame_variable():
+            variables = self.variables
+            if name in variables:
+                return variables[name]
+            return self.globals.get(name, default)
+        return read_frame_variable
+    
+    def lookup(self, name):
+        """Value of a variable from the running frame or the main program (UNSET if neither)"""
+        if name in self.variables:
+            return self.variables[name]
+        return self.globals.get(name, UNSET)
+    
+    def decode_end_recipe(self, instr):
+        """Falling off the end of a recipe returns 0"""
+        return lambda: self.return_from_recipe(None)
+    
+    def decode_param(self, instr):
+        """Push parameter onto stack"""
+        read = self.operand_reader(instr.arg1)
+        return lambda: self.param_stack.append(read())
+    
+    def decode_call(self, instr):
+        """Call recipe (pure recipes may answer from the memo)"""
+        recipe_name, arg_count, result = instr.arg1, instr.arg2, self.variable_key(instr.result)
+        start = self.extents[recipe_name][0] if recipe_name in self.extents else None
+        params = self.params.get(recipe_name, [])
+        
+        def call():
+            args = self.pop_args(recipe_name, arg_count)
+            self.push_frame(start, params, args, result)
+        
+        def call_pure():
+            args = self.pop_args(recipe_name, arg_count)
+            key = self.memo_key(recipe_name, args)
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                self.memo_hits[recipe_name] = self.memo_hits.get(recipe_name, 0) + 1
+                self.variables[result] = self.memo[key]
+                return
+            if key is not None:
+                self.memo_misses[recipe_name] = self.memo_misses.get(recipe_name, 0) + 1
+            self.push_frame(start, params, args, result, key)
+        return call_pure if recipe_name in self.pure_reads else call
+    
+    def decode_return(self, instr):
+        """Return from recipe"""
+        if not instr.arg1:
+            return lambda: self.return_from_recipe(None)
+        read = self.operand_reader(instr.arg1)
+        return lambda: self.return_from_recipe(read())
+    
+    def decode_assign(self, instr):
+        """Copy a value (resolving "variable_name unit" values such as "adjusted minutes")"""
+        is_variable, value = resolve_operand(instr.arg1)
+        result = self.variable_key(instr.result)
+        
+        if not is_variable and not isinstance(value, str):
+            def assign_constant():
+                self.variables[result] = value
+            return assign_constant
+        
+        if not is_variable and len(value.split(None, 1)) == 2:
+            # The value is split once; only the variable in front is read at runtime
+            name, unit = value.split(None, 1)
+            read_name = self.variable_reader(name, UNSET)
             
-            # Execute recipe
-            result = self.execute_recipe(recipe_name, args, instructions)
-            self.variables[instr.result] = result
+            def assign_unit_value():
+                number = read_name()
+                self.variables[result] = value if number is UNSET else f"{number} {unit}"
+            return assign_unit_value
         
-        elif instr.op == 'return':
-            # Return from recipe
-            if instr.arg1:
-                return_value = self.get_value(instr.arg1)
-                return ('return', return_value)
-            return ('return', None)
+        read = self.operand_reader(instr.arg1)
         
-        elif instr.op == 'assign':
-            value = self.get_value(instr.arg1)
-            
-            # Handle "variable_name unit" (e.g., "adjusted minutes")
+        def assign():
+            value = read()
             if isinstance(value, str) and ' ' in value:
                 parts = value.split(None, 1)
-                if parts[0] in self.variables:
-                    resolved_value = self.variables[parts[0]]
-                    value = f"{resolved_value} {parts[1]}"
-                elif parts[0].startswith('t') and parts[0][1:].isdigit() and parts[0] in self.variables:
-                    resolved_value = self.variables[parts[0]]
-                    value = f"{resolved_value} {parts[1]}"
+                number = self.lookup(parts[0])
+                if number is not UNSET:
+                    value = f"{number} {parts[1]}"
             elif isinstance(value, str) and value.startswith('t') and value[1:].isdigit():
-                if value in self.variables:
-                    value = self.variables[value]
-            
-            self.variables[instr.result] = value
-        
-        elif instr.op == 'add':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            self.variables[instr.result] = val1 + val2
-        
-        elif instr.op == 'sub':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            self.variables[instr.result] = val1 - val2
-        
-        elif instr.op == 'mul':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            self.variables[instr.result] = val1 * val2
-        
-        elif instr.op == 'div':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
+                if self.lookup(value) is not UNSET:
+                    value = self.lookup(value)
+            self.variables[result] = value
+        return assign
+    
+    def decode_add(self, instr):
+        """Addition (also concatenates strings)"""
+        read1, read2 = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2)
+        result = self.variable_key(instr.result)
+        
+        def add():
+            self.variables[result] = read1() + read2()
+        return add
+    
+    def decode_sub(self, instr):
+        """Subtraction"""
+        read1, read2 = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2)
+        result = self.variable_key(instr.result)
+        
+        def sub():
+            self.variables[result] = read1() - read2()
+        return sub
+    
+    def decode_mul(self, instr):
+        """Multiplication (values with units use their number)"""
+        read1, read2 = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2)
+        result = self.variable_key(instr.result)
+        
+        def mul():
+            self.variables[result] = unit_number(read1()) * unit_number(read2())
+        return mul
+    
+    def decode_div(self, instr):
+        """Division (values with units use their number)"""
+        read1, read2 = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2)
+        result = self.variable_key(instr.result)
+        
+        def div():
+            val1 = unit_number(read1())
+            val2 = unit_number(read2())
             if val2 == 0:
                 raise Exception("Runtime Error: Division by zero")
-            self.variables[instr.result] = val1 / val2
-        
-        elif instr.op == 'eq':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            self.variables[instr.result] = 1 if val1 == val2 else 0
-        
-        elif instr.op == 'neq':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            self.variables[instr.result] = 1 if val1 != val2 else 0
-        
-        elif instr.op == 'gt':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            self.variables[instr.result] = 1 if val1 > val2 else 0
-        
-        elif instr.op == 'lt':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            self.variables[instr.result] = 1 if val1 < val2 else 0
-        
-        elif instr.op == 'gte':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            self.variables[instr.result] = 1 if val1 >= val2 else 0
-        
-        elif instr.op == 'lte':
-            val1 = self.get_value(instr.arg1)
-            val2 = self.get_value(instr.arg2)
-            # Handle string values (extract numeric part)
-            if isinstance(val1, str) and ' ' in val1:
-                try:
-                    val1 = float(val1.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            if isinstance(val2, str) and ' ' in val2:
-                try:
-                    val2 = float(val2.split()[0])
-                except (ValueError, IndexError):
-                    pass
-            self.variables[instr.result] = 1 if val1 <= val2 else 0
-        
-        elif instr.op == 'label':
-            pass  # Labels are handled in first pass
-        
-        elif instr.op == 'goto':
-            if instr.result in self.labels:
-                self.pc = self.labels[instr.result] - 1  # -1 because pc will be incremented
-            else:
-                raise Exception(f"Runtime Error: Label {instr.result} not found")
+            self.variables[result] = val1 / val2
+        return div
+    
+    def decode_comparison(self, instr):
+        """Comparison storing 1 or 0"""
+        op, result = instr.op, self.variable_key(instr.result)
+        read1, read2 = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2)
+        compare = self.compare
+        
+        def comparison():
+            self.variables[result] = 1 if compare(op, read1(), read2()) else 0
+        return comparison
+    
+    decode_eq = decode_neq = decode_gt = decode_lt = decode_gte = decode_lte = decode_comparison
+    
+    def decode_label(self, instr):
+        """Labels are handled in first pass"""
+        return no_operation
+    
+    def decode_goto(self, instr):
+        """Unconditional jump"""
+        label = instr.result
+        return lambda: self.jump(label)
+    
+    def decode_if_false(self, instr):
+        """Jump when the condition is false"""
+        read, label = self.operand_reader(instr.arg1), instr.result
         
-        elif instr.op == 'if_false':
-            condition = self.get_value(instr.arg1)
+        def if_false():
+            condition = read()
             if not condition or condition == 0:
-                if instr.result in self.labels:
-                    self.pc = self.labels[instr.result] - 1
-                else:
-                    raise Exception(f"Runtime Error: Label {instr.result} not found")
+                self.jump(label)
+        return if_false
+    
+    def decode_if_true(self, instr):
+        """Jump when the condition is true"""
+        read, label = self.operand_reader(instr.arg1), instr.result
         
-        elif instr.op == 'if_true':
-            condition = self.get_value(instr.arg1)
+        def if_true():
+            condition = read()
             if condition and condition != 0:
-                if instr.result in self.labels:
-                    self.pc = self.labels[instr.result] - 1
-                else:
-                    raise Exception(f"Runtime Error: Label {instr.result} not found")
+                self.jump(label)
+        return if_true
+    
+    def decode_fused_branch(self, instr):
+        """Comparison and conditional jump in one instruction"""
+        branch, comparison = FUSED_BRANCH_OPS[instr.op]
+        read1, read2, label = self.operand_reader(instr.arg1), self.operand_reader(instr.arg2), instr.result
+        jump_when = branch == 'if_true'
+        compare = self.compare
+        
+        def fused_branch():
+            if compare(comparison, read1(), read2()) == jump_when:
+                self.jump(label)
+        return fused_branch
+    
+    def decode_print(self, instr):
+        """Print a value"""
+        read = self.operand_reader(instr.arg1)
         
-        elif instr.op == 'print':
-            value = self.get_value(instr.arg1)
+        def print_value():
+            value = read()
             self.output.append(str(value))
             print(value)
+        return print_value
+    
+    def decode_mix(self, instr):
+        """Mix ingredients (the message is fixed)"""
+        return self.decode_message(f"Mixing: {', '.join(instr.arg1)}")
+    
+    def decode_heat(self, instr):
+        """Heat a target to a temperature"""
+        target, read = instr.arg1, self.operand_reader(instr.arg2)
         
-        elif instr.op == 'mix':
-            ingredients = ', '.join(instr.arg1)
-            msg = f"Mixing: {ingredients}"
-            self.output.append(msg)
-            print(msg)
-        
-        elif instr.op == 'heat':
-            target = instr.arg1
-            temperature = self.get_value(instr.arg2)
-            msg = f"Heating {target} to {temperature}"
+        def heat():
+            msg = f"Heating {target} to {read()}"
             self.output.append(msg)
             print(msg)
+        return heat
+    
+    def decode_wait(self, instr):
+        """Wait for a duration"""
+        read = self.operand_reader(instr.arg1)
         
-        elif instr.op == 'wait':
-            duration = self.get_value(instr.arg1)
-            msg = f"Waiting for {duration}"
+        def wait():
+            msg = f"Waiting for {read()}"
             self.output.append(msg)
             print(msg)
-        
-        elif instr.op == 'serve':
-            msg = instr.arg1
+        return wait
+    
+    def decode_serve(self, instr):
+        """Serve a message"""
+        return self.decode_message(instr.arg1)
+    
+    def decode_add_ingredient(self, instr):
+        """Add one ingredient to another (the message is fixed)"""
+        return self.decode_message(f"Adding {instr.arg1} to {instr.arg2}")
+    
+    def decode_message(self, msg):
+        """Handler that outputs a fixed message"""
+        def message():
             self.output.append(msg)
             print(msg)
-        
-        elif instr.op == 'display':
-            # Display variable name and value
-            var_name = instr.arg1
-            if var_name in self.variables:
-                value = self.variables[var_name]
-                # Resolve any temp variable references in the value
-                if isinstance(value, str):
-                    parts = value.split()
-                    if len(parts) >= 2:
-                        # Check if first part is a temp variable
-                        if parts[0].startswith('t') and parts[0][1:].isdigit():
-                            if parts[0] in self.variables:
-                                resolved_val = self.variables[parts[0]]
-                                value = f"{resolved_val} {' '.join(parts[1:])}"
-                
-                # Clean up floating point precision errors
-                if isinstance(value, str):
-                    parts = value.split()
-                    if len(parts) >= 1:
-                        try:
-                            num = float(parts[0])
-                            # Round to 1 decimal place if close to it
-                            if abs(num - round(num, 1)) < 0.0001:
-                                num = round(num, 1)
-                            value = f"{num} {' '.join(parts[1:])}" if len(parts) > 1 else num
-                        except ValueError:
-                            pass
-                elif isinstance(value, float):
-                    if abs(value - round(value, 1)) < 0.0001:
-                        value = round(value, 1)
-                
-                msg = f"{var_name}: {value}"
-                self.output.append(msg)
-                print(msg)
-            else:
-                msg = f"{var_name}: (not set)"
-                self.output.append(msg)
-                print(msg)
-        
-        elif instr.op == 'scale':
-            msg = f"Scaling {instr.arg1} by {instr.arg2}"
+        return message
+    
+    def decode_display(self, instr):
+        """Display variable name and value"""
+        var_name = instr.arg1
+        return lambda: self.display(var_name)
+    
+    def decode_scale(self, instr):
+        """Scale a variable by a factor"""
+        var_name, factor = instr.arg1, instr.arg2
+        key = self.variable_key(var_name)
+        return lambda: self.scale(var_name, factor, key)
+    
+    def decode_input(self, instr):
+        """Read a variable from the user"""
+        var_name = instr.result
+        key = self.variable_key(var_name)
+        return lambda: self.read_input(var_name, key)
+    
+    def display(self, var_name):
+        """Display variable name and value"""
+        value = self.lookup(var_name)
+        if value is not UNSET:
+            # Resolve any temp variable references in the value
+            if isinstance(value, str):
+                parts = value.split()
+                if len(parts) >= 2:
+                    # Check if first part is a temp variable
+                    if parts[0].startswith('t') and parts[0][1:].isdigit():
+                        if self.lookup(parts[0]) is not UNSET:
+                            resolved_val = self.lookup(parts[0])
+                            value = f"{resolved_val} {' '.join(parts[1:])}"
+            
+            # Clean up floating point precision errors
+            if isinstance(value, str):
+                parts = value.split()
+                if len(parts) >= 1:
+                    try:
+                        num = float(parts[0])
+                        # Round to 1 decimal place if close to it
+                        if abs(num - round(num, 1)) < 0.0001:
+                            num = round(num, 1)
+                        value = f"{num} {' '.join(parts[1:])}" if len(parts) > 1 else num
+                    except ValueError:
+                        pass
+            elif isinstance(value, float):
+                if abs(value - round(value, 1)) < 0.0001:
+                    value = round(value, 1)
+            
+            msg = f"{var_name}: {value}"
             self.output.append(msg)
             print(msg)
-            # Update variable value
-            if instr.arg1 in self.variables:
-                current_val = self.variables[instr.arg1]
-                # Extract numeric value if it's a string with units
-                if isinstance(current_val, str):
-                    parts = current_val.split()
-                    if len(parts) >= 1:
-                        try:
-                            num_val = float(parts[0])
-                            scale_factor = float(instr.arg2)
-                            new_val = num_val * scale_factor
-                            # Keep the unit if present
-                            if len(parts) > 1:
-                                self.variables[instr.arg1] = f"{new_val} {parts[1]}"
-                            else:
-                                self.variables[instr.arg1] = new_val
-                        except ValueError:
-                            pass
-                else:
-                    scale_factor = float(instr.arg2)
-                    self.variables[instr.arg1] = current_val * scale_factor
-        
-        elif instr.op == 'add_ingredient':
-            msg = f"Adding {instr.arg1} to {instr.arg2}"
+        else:
+            msg = f"{var_name}: (not set)"
             self.output.append(msg)
             print(msg)
-        
-        elif instr.op == 'input':
-            # Prompt user for input
+    
+    def scale(self, var_name, factor, key):
+        """Scale a variable by a factor"""
+        msg = f"Scaling {var_name} by {factor}"
+        self.output.append(msg)
+        print(msg)
+        # Update variable value (a recipe scales the copy in its own frame)
+        current_val = self.lookup(var_name)
+        if current_val is not UNSET:
+            # Extract numeric value if it's a string with units
+            if isinstance(current_val, str):
+                parts = current_val.split()
+                if len(parts) >= 1:
+                    try:
+                        num_val = float(parts[0])
+                        scale_factor = float(factor)
+                        new_val = num_val * scale_factor
+                        # Keep the unit if present
+                        if len(parts) > 1:
+                            self.variables[key] = f"{new_val} {parts[1]}"
+                        else:
+                            self.variables[key] = new_val
+                    except ValueError:
+                        pass
+            else:
+                scale_factor = float(factor)
+                self.variables[key] = current_val * scale_factor
+    
+    def read_input(self, var_name, key):
+        """Prompt user for input"""
+        try:
+            value = input(f"Enter value for {var_name}: ")
+            # Try to convert to number
             try:
-                value = input(f"Enter value for {instr.result}: ")
-                # Try to convert to number
-                try:
-                    if '.' in value:
-                        self.variables[instr.result] = float(value)
-                    else:
-                        self.variables[instr.result] = int(value)
-                except ValueError:
-                    self.variables[instr.result] = value
-            except EOFError:
-                # For non-interactive mode, use default value
-                self.variables[instr.result] = 4  # Default servings
-    
-    def execute_recipe(self, recipe_name, args, instructions):
-        """Execute a recipe with given arguments"""
-        # Save current state
-        saved_pc = self.pc
-        saved_vars = self.variables.copy()
-        
-        # Find recipe declaration to get parameter names
-        # We need to parse the recipe to find parameter names
-        # For now, we'll use a simple approach: pass args as local variables
-        # In a full implementation, we'd need to track parameter names
-        
-        # Find recipe start
-        recipe_start = self.recipes[recipe_name]
-        self.pc = recipe_start + 1  # Skip begin_recipe instruction
-        
-        # Execute recipe body with arguments available
-        # Store arguments in variables (they'll be referenced by name in the recipe)
-        return_value = None
-        while self.pc < len(instructions):
-            instr = instructions[self.pc]
-            
-            if instr.op == 'end_recipe' and instr.result == recipe_name:
-                break
-            
-            result = self.execute_instruction(instr, instructions)
-            if result and isinstance(result, tuple) and result[0] == 'return':
-                return_value = result[1]
-                # Resolve variable reference in return value
-                if isinstance(return_value, str) and return_value in self.variables:
-                    return_value = self.variables[return_value]
-                break
-            
-            self.pc += 1
-        
-        # Restore state
-        self.pc = saved_pc
-        # Keep only global variables, restore locals
-        for key in list(self.variables.keys()):
-            if key not in saved_vars:
-                del self.variables[key]
-        
-        return return_value if return_value is not None else 0
+                if '.' in value:
+                    self.variables[key] = float(value)
+                else:
+                    self.variables[key] = int(value)
+            except ValueError:
+                self.variables[key] = value
+        except EOFError:
+            # For non-interactive mode, use default value
+            self.variables[key] = 4  # Default servings
+    
+    def jump(self, label):
+        """Continue execution at label"""
+        if label not in self.labels:
+            raise Exception(f"Runtime Error: Label {label} not found")
+        self.pc = self.labels[label] - 1  # -1 because pc will be incremented
+    
+    def pop_args(self, recipe_name, arg_count):
+        """Pop the arguments of a recipe call from the parameter stack"""
+        if recipe_name not in self.recipes:
+            raise Exception(f"Runtime Error: Recipe '{recipe_name}' not defined")
+        
+        args = []
+        for _ in range(arg_count):
+            if self.param_stack:
+                args.insert(0, self.param_stack.pop())
+        return args
+    
+    def push_frame(self, start, params, args, result, memo_key=None):
+        """Enter a recipe: bind its parameters in a new frame and jump to its body"""
+        if len(self.call_stack) >= MAX_CALL_DEPTH:
+            raise Exception(f"Runtime Error: Recipe calls nested more than {MAX_CALL_DEPTH} deep")
+        frame = Frame(dict(zip(params, args)), self.pc, result, memo_key)
+        self.call_stack.append(frame)
+        self.variables = frame.variables
+        self.pc = start - 1  # -1 because pc will be incremented
+    
+    def return_from_recipe(self, value):
+        """Leave the running recipe: pop its frame and store value in the caller's result"""
+        if not self.call_stack:
+            return  # RETURN outside a recipe does nothing
+        frame = self.call_stack.pop()
+        self.variables = self.call_stack[-1].variables if self.call_stack else self.globals
+        self.pc = frame.return_pc
+        if value is None:
+            value = 0
+        self.variables[frame.result] = value
+        if frame.memo_key is not None:
+            self.memo[frame.memo_key] = value
+            if len(self.memo) > MEMO_CACHE_SIZE:
+                self.memo.popitem(last=False)
+    
+    def find_pure_recipes(self, instructions):
+        """Collect the recipes whose calls can be memoized"""
+        if not self.recipes:
+            return
+        effects = EffectAnalysis(split_functions(instructions))
+        self.pure_reads = {name: sorted(effects.call_reads(name)) for name in effects.pure_recipes()}
+    
+    def memo_key(self, recipe_name, args):
+        """Memo key of a pure recipe call, or None if a value cannot be hashed"""
+        values = (self.globals.get(name, UNSET) for name in self.pure_reads[recipe_name])
+        key = (recipe_name, typed_values(args), typed_values(values))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    def display_memo_statistics(self):
+        """Display hit rates of memoized pure recipe calls"""
+        if not self.memo_misses:
+            return
+        print("\n=== Pure Recipe Memoization ===")
+        for name, misses in self.memo_misses.items():
+            hits = self.memo_hits.get(name, 0)
+            print(f"  {name}: {hits + misses} calls, {hits} from memo ({hits / (hits + misses) * 100:.1f}% hit rate)")
+    
+    def compare(self, op, val1, val2):
+        """Evaluate a comparison on runtime values"""
+        if op == 'eq':
+            return val1 == val2
+        if op == 'neq':
+            return val1 != val2
+        val1 = unit_number(val1)
+        val2 = unit_number(val2)
+        if op == 'gt':
+            return val1 > val2
+        if op == 'lt':
+            return val1 < val2
+        if op == 'gte':
+            return val1 >= val2
+        return val1 <= val2
     
     def get_value(self, operand):
         """Get value of operand (variable or constant)"""
-        if operand is None:
-            return None
-        
-        operand_str = str(operand)
-        
-        # Remove quotes from strings
-        if operand_str.startswith('"') and operand_str.endswith('"'):
-            return operand_str[1:-1]
-        
-        # Check if it's a number
-        try:
-            if '.' in operand_str:
-                return float(operand_str)
-            return int(operand_str)
-        except ValueError:
-            pass
-        
-        # Check if it's a variable
-        if operand_str in self.variables:
-            return self.variables[operand_str]
-        
-        # Return as string (for units, etc.)
-        return operand_str
+        is_variable, value = resolve_operand(operand)
+        if is_variable:
+            found = self.lookup(value)
+            return value if found is UNSET else found
+        return value
     
     def display_output(self):
         """Display program output"""
@@ -442,3 +630,23 @@ class CodeGenerator:
         for line in self.output:
             print(line)
         print("=" * 60)
+
+
+class VerifiedCodeGenerator(CodeGenerator):
+    """
+    Interpreter fast path for programs accepted by IRVerifier.
+    Label targets, recipe references and PARAM/CALL pairing were checked
+    once before execution, so jumps and calls skip the per-instruction checks.
+    """
+    
+    def jump(self, label):
+        """Continue execution at label (target verified)"""
+        self.pc = self.labels[label] - 1
+    
+    def pop_args(self, recipe_name, arg_count):
+        """Pop call arguments (recipe and stack depth verified)"""
+        if not arg_count:
+            return []
+        args = self.param_stack[-arg_count:]
+        del self.param_stack[-arg_count:]
+        return args
@@ -14,7 +14,13 @@ from parser import Parser
 from semantic_analyzer import SemanticAnalyzer
 from intermediate_code import IntermediateCodeGenerator
 from optimizer import Optimizer
-from code_generator import CodeGenerator
+from code_generator import VerifiedCodeGenerator
+from register_vm import RegisterVM, parse_backend
+from verifier import IRVerifier
+from linker import Linker
+from pass_manager import DEFAULT_OPT_LEVEL, parse_opt_level
+from bytecode import write_bytecode, BYTECODE_EXTENSION
+from specializer import ProgramSpecializer
 
 def print_separator(title):
     """Print section separator"""
@@ -22,65 +28,90 @@ def print_separator(title):
     print(f"PHASE {title}")
     print("=" * 60)
 
-def compile_and_run(source_code, show_phases=True):
-    """Compile and execute RecipeScript code"""
-    try:
-        # Phase 1: Lexical Analysis
-        if show_phases:
-            print_separator("1: LEXICAL ANALYSIS")
-        lexer = Lexer(source_code)
-        tokens = lexer.tokenize()
-        if show_phases:
-            print(f"Generated {len(tokens)} tokens:")
-            for token in tokens[:20]:  # Show first 20 tokens
-                print(f"  {token}")
-            if len(tokens) > 20:
-                print(f"  ... and {len(tokens) - 20} more tokens")
-        
-        # Phase 2: Syntax Analysis
-        if show_phases:
-            print_separator("2: SYNTAX ANALYSIS")
-        parser = Parser(tokens)
-        ast = parser.parse()
-        if show_phases:
-            print(f"Successfully parsed {len(ast.recipes)} recipes and {len(ast.statements)} statements")
-            print("Abstract Syntax Tree (AST) built successfully")
-        
-        # Phase 3: Semantic Analysis
-        if show_phases:
-            print_separator("3: SEMANTIC ANALYSIS")
-        semantic_analyzer = SemanticAnalyzer()
-        symbol_table = semantic_analyzer.analyze(ast)
-        if show_phases:
-            symbol_table.display()
-            print("\nSemantic analysis completed successfully")
-        
-        # Phase 4: Intermediate Code Generation
-        if show_phases:
-            print_separator("4: INTERMEDIATE CODE GENERATION")
-        ic_generator = IntermediateCodeGenerator()
-        tac_instructions = ic_generator.generate(ast)
+def compile_source(source_code, show_phases=True, base_dir=None, opt_level=DEFAULT_OPT_LEVEL):
+    """Run phases 1-5 and return optimized TAC linked with imported libraries"""
+    # Phase 1: Lexical Analysis
+    if show_phases:
+        print_separator("1: LEXICAL ANALYSIS")
+    lexer = Lexer(source_code)
+    tokens = lexer.tokenize()
+    if show_phases:
+        print(f"Generated {len(tokens)} tokens:")
+        for token in tokens[:20]:  # Show first 20 tokens
+            print(f"  {token}")
+        if len(tokens) > 20:
+            print(f"  ... and {len(tokens) - 20} more tokens")
+    
+    # Phase 2: Syntax Analysis
+    if show_phases:
+        print_separator("2: SYNTAX ANALYSIS")
+    parser = Parser(tokens)
+    ast = parser.parse()
+    if show_phases:
+        print(f"Successfully parsed {len(ast.recipes)} recipes and {len(ast.statements)} statements")
+        print("Abstract Syntax Tree (AST) built successfully")
+    
+    # Imported libraries are compiled once and reused from their cache
+    linker = Linker(opt_level)
+    libraries = linker.load_imports(ast.imports, base_dir)
+    if show_phases:
+        for unit in libraries:
+            origin = "cached IR" if unit.cached else "compiled"
+            print(f"Imported library {unit.name}: {len(unit.exports)} recipes ({origin})")
+    
+    # Phase 3: Semantic Analysis
+    if show_phases:
+        print_separator("3: SEMANTIC ANALYSIS")
+    semantic_analyzer = SemanticAnalyzer()
+    linker.declare_imports(semantic_analyzer, libraries)
+    symbol_table = semantic_analyzer.analyze(ast)
+    if show_phases:
+        symbol_table.display()
+        print("\nSemantic analysis completed successfully")
+    
+    # Phase 4: Intermediate Code Generation
+    if show_phases:
+        print_separator("4: INTERMEDIATE CODE GENERATION")
+    ic_generator = IntermediateCodeGenerator()
+    tac_instructions = ic_generator.generate(ast)
+    if show_phases:
+        ic_generator.display()
+    
+    # Phase 5: Code Optimization
+    if show_phases:
+        print_separator("5: CODE OPTIMIZATION")
+    optimizer = Optimizer(linker.externals(libraries), level=opt_level)
+    optimized_instructions = optimizer.optimize(tac_instructions)
+    if show_phases:
+        print("\n=== Optimized Code ===")
+        for i, instr in enumerate(optimized_instructions, 1):
+            print(f"{i:3}: {instr}")
+        optimizer.display_optimizations()
+    
+    if linker.units:
+        optimized_instructions = linker.link(optimized_instructions)
         if show_phases:
-            ic_generator.display()
+            print(f"\nLinked {linker.linked_recipes} library recipes from {len(linker.units)} libraries")
+    
+    return optimized_instructions
+
+def compile_and_run(source_code, show_phases=True, base_dir=None, opt_level=DEFAULT_OPT_LEVEL, register_vm=False):
+    """Compile and execute RecipeScript code (imports resolve against base_dir)"""
+    try:
+        optimized_instructions = compile_source(source_code, show_phases, base_dir, opt_level)
         
-        # Phase 5: Code Optimization
-        if show_phases:
-            print_separator("5: CODE OPTIMIZATION")
-        optimizer = Optimizer()
-        optimized_instructions = optimizer.optimize(tac_instructions)
-        if show_phases:
-            print("\n=== Optimized Code ===")
-            for i, instr in enumerate(optimized_instructions, 1):
-                print(f"{i:3}: {instr}")
-            optimizer.display_optimizations()
+        # Verify the whole program once so execution can skip runtime checks
+        IRVerifier().verify(optimized_instructions)
         
         # Phase 6: Code Generation / Execution
         if show_phases:
             print_separator("6: CODE EXECUTION")
-        code_generator = CodeGenerator()
+            print("IR verification passed: running without per-instruction checks\n")
+        code_generator = RegisterVM() if register_vm else VerifiedCodeGenerator()
         output = code_generator.execute(optimized_instructions)
         
         if show_phases:
+            code_generator.display_memo_statistics()
             print("\nExecution completed successfully!")
         
         return True
@@ -89,7 +120,55 @@ def compile_and_run(source_code, show_phases=True):
         print(f"\n❌ Error: {e}")
         return False
 
-def run_file(filename):
+def compile_file(filename, output_filename=None, opt_level=DEFAULT_OPT_LEVEL):
+    """Compile a RecipeScript file to a .rsc bytecode file"""
+    try:
+        with open(filename, 'r') as f:
+            source_code = f.read()
+        
+        if output_filename is None:
+            output_filename = os.path.splitext(filename)[0] + BYTECODE_EXTENSION
+        
+        instructions = compile_source(source_code, show_phases=False,
+                                      base_dir=os.path.dirname(os.path.abspath(filename)),
+                                      opt_level=opt_level)
+        IRVerifier().verify(instructions)
+        write_bytecode(output_filename, instructions, source_code)
+        print(f"[SUCCESS] Compiled {filename} -> {output_filename} ({len(instructions)} instructions)")
+        return True
+        
+    except FileNotFoundError:
+        print(f"[ERROR] File '{filename}' not found")
+        return False
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return False
+
+def specialize_file(filename, bindings, output_filename=None, opt_level=DEFAULT_OPT_LEVEL):
+    """Compile a RecipeScript file with fixed input values to a .rsc bytecode file"""
+    try:
+        with open(filename, 'r') as f:
+            source_code = f.read()
+        
+        if output_filename is None:
+            output_filename = os.path.splitext(filename)[0] + BYTECODE_EXTENSION
+        
+        specializer = ProgramSpecializer(source_code, os.path.dirname(os.path.abspath(filename)), opt_level)
+        instructions = specializer.specialize(bindings)
+        write_bytecode(output_filename, instructions, source_code)
+        bound = ', '.join(f"{name}={value}" for name, value in bindings.items())
+        print(f"[SUCCESS] Specialized {filename} for {bound or 'no inputs'} -> {output_filename} "
+              f"({len(instructions)} instructions)")
+        return True
+        
+    except FileNotFoundError:
+        print(f"[ERROR] File '{filename}' not found")
+        return False
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return False
+
+def run_file(filename, opt_level=DEFAULT_OPT_LEVEL, register_vm=False):
     """Compile and run a RecipeScript file"""
     try:
         with open(filename, 'r') as f:
@@ -99,7 +178,9 @@ def run_file(filename):
         print(f"Compiling: {filename}")
         print(f"{'=' * 60}")
         
-        success = compile_and_run(source_code, show_phases=True)
+        success = compile_and_run(source_code, show_phases=True,
+                                  base_dir=os.path.dirname(os.path.abspath(filename)),
+                                  opt_level=opt_level, register_vm=register_vm)
         
         if success:
             print(f"\n[SUCCESS] Successfully compiled and executed {filename}")
@@ -115,7 +196,7 @@ def run_file(filename):
         print(f"[ERROR] Error reading file: {e}")
         return False
 
-def interactive_mode():
+def interactive_mode(opt_level=DEFAULT_OPT_LEVEL, register_vm=False):
     """Interactive REPL mode"""
     print("=" * 60)
     print("RecipeScript Interactive Mode")
@@ -145,7 +226,7 @@ def interactive_mode():
                 continue
             
             # Compile and run the line
-            compile_and_run(line, show_phases=False)
+            compile_and_run(line, show_phases=False, opt_level=opt_level, register_vm=register_vm)
             
         except KeyboardInterrupt:
             print("\nGoodbye!")
@@ -163,13 +244,20 @@ def main():
     print("A Domain-Specific Language for Cooking Recipes")
     print("=" * 60)
     
-    if len(sys.argv) > 1:
+    try:
+        opt_level, args = parse_opt_level(sys.argv[1:])
+        register_vm, args = parse_backend(args)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        sys.exit(2)
+    
+    if args:
         # File mode
-        filename = sys.argv[1]
-        run_file(filename)
+        filename = args[0]
+        run_file(filename, opt_level, register_vm)
     else:
         # Interactive mode
-        interactive_mode()
+        interactive_mode(opt_level, register_vm)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+"""
+Effect Analysis for RecipeScript
+Summarizes which main-program variables each recipe reads so that
+flow-sensitive optimizations can treat CALL instructions conservatively.
+
+Runtime Model:
+--------------
+Every CALL runs the recipe in a frame of its own: the parameters are bound
+to the argument values and every variable the recipe writes stays in the
+frame, so a call changes nothing in its caller but the CALL's result. A
+variable the frame does not hold is read from the main program's variables.
+
+Pure Recipes:
+-------------
+A recipe is pure when a CALL of it only computes its return value:
+1. no instruction with an outside effect (EFFECT_OPS: output, input, scale)
+2. it calls only pure recipes of this program
+Its result then depends only on its arguments and the current values of
+the main-program variables it may read (which no recipe can change), so
+the interpreter can memoize it.
+"""
+
+from tac import TACInstruction
+from cfg import uses, defs
+
+# Instructions with an effect besides writing variables
+EFFECT_OPS = ['print', 'mix', 'heat', 'wait', 'serve', 'display', 'scale', 'add_ingredient', 'input']
+
+
+class EffectAnalysis:
+    def __init__(self, functions, externals=None):
+        self.functions = functions
+        self.recipes = {f.name: f for f in functions if f.name is not None}
+        self.externals = externals or {}  # imported recipe -> variables it reads
+        self.reads = {}   # recipe -> main-program variables it may read
+        self.analyze()
+
+    def analyze(self):
+        """Compute transitive read sets for every recipe"""
+        callees = {}
+        for name, function in self.recipes.items():
+            self.reads[name] = set()
+            callees[name] = set()
+            for instr in function.instructions:
+                self.reads[name].update(uses(instr))
+                if instr.op == 'call':
+                    callees[name].add(instr.arg1)
+            # Parameters are always bound in the recipe's frame
+            self.reads[name] -= set(parameters(function))
+        self.callees = callees
+
+        # Propagate reads through nested calls until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for name in self.recipes:
+                for callee in callees[name]:
+                    if callee not in self.recipes and callee not in self.externals:
+                        continue
+                    before = len(self.reads[name])
+                    self.reads[name] |= self.call_reads(callee)
+                    if len(self.reads[name]) != before:
+                        changed = True
+
+    def call_reads(self, recipe_name):
+        """Main-program variables a CALL of recipe_name may read"""
+        if recipe_name in self.externals:
+            return set(self.externals[recipe_name])
+        return self.reads.get(recipe_name, set())
+
+    def mark_effects(self, cfg, function):
+        """Insert use pseudo-instructions for the variables calls read"""
+        names = set()
+        for block in cfg.blocks:
+            for instr in block.instructions:
+                names.update(uses(instr))
+                names.update(defs(instr))
+
+        for block in cfg.rpo:
+            updated = []
+            for instr in block.instructions:
+                if instr.op == 'call':
+                    for name in sorted(self.call_reads(instr.arg1) & names):
+                        updated.append(TACInstruction('use', name))
+                updated.append(instr)
+            block.instructions = updated
+
+    def pure_recipes(self):
+        """Recipes whose CALLs only compute a return value"""
+        pure = set()
+        for name, function in self.recipes.items():
+            if any(instr.op in EFFECT_OPS for instr in function.instructions):
+                continue
+            if any(callee not in self.recipes for callee in self.callees[name]):
+                continue  # Imported recipes are only known by their summary
+            pure.add(name)
+
+        # A recipe calling an impure recipe is not pure either
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pure):
+                if not self.callees[name] <= pure:
+                    pure.discard(name)
+                    changed = True
+        return pure
+
+
+def parameters(function):
+    """Names a recipe's parameters are bound to (none for main)"""
+    if function.header is None or not isinstance(function.header.arg1, list):
+        return []
+    return function.header.arg1
@@ -0,0 +1,260 @@
+"""
+Recipe Inlining for RecipeScript
+Replaces CALLs of small, non-recursive recipes with a copy of the recipe body.
+
+Call Semantics Preserved:
+-------------------------
+A recipe runs in a frame of its own: its parameters are bound to the PARAM
+values, its writes stay in the frame, and any other variable is read from
+the main program (an unset name reads as the name itself).
+
+An inlined body therefore moves its parameters and every variable it writes
+into fresh temporaries, and each PARAM becomes a copy into the temporary of
+its parameter. A call site is left alone when the renaming would be visible:
+the recipe reads a variable it writes before setting it (that read sees the
+main program's value), displays/scales/inputs a variable of its frame, or,
+inside a recipe, reads a main-program variable the enclosing recipe has a
+variable of its own for.
+
+Returns become an assignment to the call's result and a jump past the
+inlined body; falling off the end assigns 0, like the interpreter does.
+
+Cost Model:
+-----------
+size       instructions in the recipe body (labels excluded)
+frequency  sum over call sites of LOOP_WEIGHT ** (loops around the site)
+growth     size * call sites, less the recipe itself when it is no longer
+           called afterwards (recipes of library units are always kept)
+A recipe is inlined when size <= INLINE_SIZE_LIMIT and
+growth <= INLINE_GROWTH_BUDGET + frequency * CALL_COST.
+Callees are processed before their callers, so a caller's size already
+includes the recipes inlined into it.
+"""
+
+from tac import TACInstruction
+from cfg import (ControlFlowGraph, BRANCH_OPS, TERMINATOR_OPS, uses, defs,
+                 replace_uses, replace_defs, copy_instruction, liveness)
+from effects import parameters
+from allocator import NAMED_OPS
+from loops import find_loops
+
+INLINE_SIZE_LIMIT = 40  # Larger recipes are never inlined
+INLINE_GROWTH_BUDGET = 30  # Instructions a recipe may add to the program for free
+CALL_COST = 8  # PARAM/CALL/RETURN dispatch plus the frame push and pop
+LOOP_WEIGHT = 10  # A call inside a loop counts as this many calls per enclosing loop
+
+
+class RecipeInliner:
+    def __init__(self, functions, supply, library=False):
+        self.functions = functions  # Recipes followed by main
+        self.supply = supply
+        self.library = library  # Library recipes stay exported after inlining
+        self.inlined = []  # (recipe, call sites inlined)
+
+    def run(self):
+        """Inline profitable recipes bottom-up and return the remaining functions"""
+        graph = self.call_graph()
+        for name in self.bottom_up(graph):
+            if self.is_recursive(name, graph):
+                continue
+            callee = self.recipe(name)
+            sites = self.call_sites(name)
+            if not sites or not self.profitable(callee, sites):
+                continue
+
+            count = 0
+            for caller in [function for function in self.functions if function is not callee]:
+                count += self.inline_into(caller, callee)
+            if count:
+                self.inlined.append((name, count))
+            if count and not self.library and not self.call_sites(name):
+                self.functions.remove(callee)
+            graph = self.call_graph()
+        return self.functions
+
+    def recipe(self, name):
+        """The function of a recipe defined in this unit"""
+        return next((f for f in self.functions if f.name == name), None)
+
+    def call_graph(self):
+        """recipe -> recipes it calls (defined in this unit)"""
+        names = set(f.name for f in self.functions if f.name)
+        return {f.name: set(instr.arg1 for instr in f.instructions
+                            if instr.op == 'call' and instr.arg1 in names)
+                for f in self.functions if f.name}
+
+    def bottom_up(self, graph):
+        """Recipes ordered so that callees come before their callers"""
+        order = []
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            visited.add(name)
+            for callee in sorted(graph[name]):
+                visit(callee)
+            order.append(name)
+
+        for name in graph:
+            visit(name)
+        return order
+
+    def is_recursive(self, name, graph):
+        """Check if a recipe can reach itself through calls"""
+        seen = set()
+        work = list(graph[name])
+        while work:
+            callee = work.pop()
+            if callee == name:
+                return True
+            if callee not in seen:
+                seen.add(callee)
+                work.extend(graph.get(callee, ()))
+        return False
+
+    def call_sites(self, name):
+        """(caller, block) for every call of a recipe"""
+        sites = []
+        for function in self.functions:
+            if not any(instr.op == 'call' and instr.arg1 == name for instr in function.instructions):
+                continue
+            cfg = ControlFlowGraph(function.instructions)
+            cfg.compute_dominators()
+            loops = find_loops(cfg)
+            for block in cfg.rpo:
+                depth = sum(1 for loop in loops if block.id in loop.blocks)
+                for instr in block.instructions:
+                    if instr.op == 'call' and instr.arg1 == name:
+                        sites.append((function, depth))
+        return sites
+
+    def profitable(self, callee, sites):
+        """Size and call-frequency cost model"""
+        size = sum(1 for instr in callee.instructions if instr.op != 'label')
+        if size > INLINE_SIZE_LIMIT:
+            return False
+        frequency = sum(LOOP_WEIGHT ** depth for _, depth in sites)
+        growth = size * len(sites) - (0 if self.library else size)
+        return growth <= INLINE_GROWTH_BUDGET + frequency * CALL_COST
+
+    def inline_into(self, caller, callee):
+        """Inline every eligible call of callee in caller; return how many"""
+        count = 0
+        skipped = 0
+        while True:
+            sites = self.eligible_sites(caller, callee)
+            if len(sites) <= skipped:
+                return count
+            index, rename = sites[skipped]
+            if rename is None:
+                skipped += 1
+                continue
+            caller.instructions = self.splice(caller.instructions, index, callee, rename)
+            count += 1
+
+    def eligible_sites(self, caller, callee):
+        """(instruction index, renaming or None) for each call of callee in caller"""
+        cfg = ControlFlowGraph(caller.instructions)
+        cfg.compute_dominators()
+        # Variables of the enclosing recipe's own frame (main's are the main-program variables)
+        caller_frame = None
+        if caller.name is not None:
+            caller_frame = set(parameters(caller))
+            for instr in caller.instructions:
+                caller_frame.update(defs(instr))
+        sites = []
+        index = 0
+        for block in cfg.blocks:
+            if block.label:
+                index += 1
+            for instr in block.instructions:
+                if instr.op == 'call' and instr.arg1 == callee.name:
+                    eligible = cfg.is_reachable(block) and instr.arg2 == len(parameters(callee))
+                    sites.append((index, self.renaming(callee, caller_frame) if eligible else None))
+                index += 1
+        return sites
+
+    def renaming(self, callee, caller_frame):
+        """Map the variables of callee's frame to fresh temporaries, or None if unsafe"""
+        cfg = ControlFlowGraph(callee.instructions)
+        cfg.compute_dominators()
+        live_in, _ = liveness(cfg)
+        params = set(parameters(callee))
+        named = set()
+        written = set()
+        read = set()
+        for instr in callee.instructions:
+            if instr.op in NAMED_OPS:
+                named.update(uses(instr) + defs(instr))
+            written.update(defs(instr))
+            read.update(uses(instr))
+
+        frame = written | params
+        if frame & named:
+            return None  # display/scale/input show the variable's name
+        if (written - params) & live_in[cfg.entry.id]:
+            return None  # Read before the recipe sets it: the main program's value
+        if caller_frame is not None and (read - frame) & caller_frame:
+            return None  # Would read the enclosing recipe's variable instead
+        return {name: self.supply.new_temp() for name in sorted(frame)}
+
+    def splice(self, instructions, index, callee, rename):
+        """Replace the CALL at index with the renamed body, binding its PARAMs to the parameters"""
+        call = instructions[index]
+        params = self.param_indices(instructions, index)
+        if params is None:
+            return instructions
+        bindings = {position: TACInstruction('assign', instructions[position].arg1, None, rename[name])
+                    for position, name in zip(sorted(params), parameters(callee))}
+
+        labels = {instr.result: self.supply.new_label()
+                  for instr in callee.instructions if instr.op == 'label'}
+        done_label = self.supply.new_label()
+        used_done = False
+        body = []
+        for position, instr in enumerate(callee.instructions):
+            instr = copy_instruction(instr)
+            replace_uses(instr, lambda name: rename.get(name, name))
+            replace_defs(instr, lambda name: rename.get(name, name))
+            if instr.op in ['label', 'goto'] + BRANCH_OPS:
+                instr.result = labels.get(instr.result, instr.result)
+            if instr.op == 'return':
+                value = instr.arg1 if instr.arg1 is not None else '0'
+                body.append(TACInstruction('assign', value, None, call.result))
+                if position < len(callee.instructions) - 1:
+                    body.append(TACInstruction('goto', None, None, done_label))
+                    used_done = True
+                continue
+            body.append(instr)
+        if not body or body[-1].op not in TERMINATOR_OPS and callee.instructions[-1].op != 'return':
+            body.append(TACInstruction('assign', '0', None, call.result))
+        if used_done:
+            body.append(TACInstruction('label', None, None, done_label))
+
+        before = [bindings.get(position, instr) for position, instr in enumerate(instructions[:index])]
+        return before + body + instructions[index + 1:]
+
+    def param_indices(self, instructions, index):
+        """Positions of the PARAMs a CALL pops, searched within its block"""
+        call = instructions[index]
+        pending = call.arg2 or 0
+        inner = 0  # PARAMs that belong to calls nested in the arguments
+        found = set()
+        position = index - 1
+        while pending > 0:
+            if position < 0:
+                return None
+            instr = instructions[position]
+            if instr.op == 'label' or instr.op in TERMINATOR_OPS:
+                return None
+            if instr.op == 'call':
+                inner += instr.arg2 or 0
+            elif instr.op == 'param':
+                if inner:
+                    inner -= 1
+                else:
+                    found.add(position)
+                    pending -= 1
+            position -= 1
+        return found
@@ -25,70 +25,7 @@ TAC Conventions Used:
 
 from parser import *
 from token_types import TokenType
-
-class TACInstruction:
-    """Three-Address Code instruction"""
-    def __init__(self, op, arg1=None, arg2=None, result=None):
-        self.op = op
-        self.arg1 = arg1
-        self.arg2 = arg2
-        self.result = result
-    
-    def __str__(self):
-        if self.op == 'assign':
-            return f"{self.result} = {self.arg1}"
-        elif self.op in ['add', 'sub', 'mul', 'div']:
-            op_symbol = {
-                'add': '+', 'sub': '-', 'mul': '*', 'div': '/'
-            }[self.op]
-            return f"{self.result} = {self.arg1} {op_symbol} {self.arg2}"
-        elif self.op in ['eq', 'neq', 'gt', 'lt', 'gte', 'lte']:
-            op_symbol = {
-                'eq': '==', 'neq': '!=', 'gt': '>', 
-                'lt': '<', 'gte': '>=', 'lte': '<='
-            }[self.op]
-            return f"{self.result} = {self.arg1} {op_symbol} {self.arg2}"
-        elif self.op == 'label':
-            return f"{self.result}:"
-        elif self.op == 'goto':
-            return f"goto {self.result}"
-        elif self.op == 'if_false':
-            return f"if_false {self.arg1} goto {self.result}"
-        elif self.op == 'if_true':
-            return f"if_true {self.arg1} goto {self.result}"
-        elif self.op == 'print':
-            return f"print {self.arg1}"
-        elif self.op == 'mix':
-            ingredients = ', '.join(self.arg1)
-            return f"mix {ingredients}"
-        elif self.op == 'heat':
-            return f"heat {self.arg1} to {self.arg2}"
-        elif self.op == 'wait':
-            return f"wait {self.arg1}"
-        elif self.op == 'serve':
-            return f"serve \"{self.arg1}\""
-        elif self.op == 'display':
-            return f"display {self.arg1}"
-        elif self.op == 'scale':
-            return f"scale {self.arg1} by {self.arg2}"
-        elif self.op == 'add_ingredient':
-            return f"add {self.arg1} to {self.arg2}"
-        elif self.op == 'input':
-            return f"input {self.result}"
-        elif self.op == 'begin_recipe':
-            return f"RECIPE {self.result}:"
-        elif self.op == 'end_recipe':
-            return f"END_RECIPE {self.result}"
-        elif self.op == 'param':
-            return f"PARAM {self.arg1}"
-        elif self.op == 'call':
-            return f"{self.result} = CALL {self.arg1}, {self.arg2}"
-        elif self.op == 'return':
-            if self.arg1:
-                return f"RETURN {self.arg1}"
-            return "RETURN"
-        else:
-            return f"{self.op} {self.arg1} {self.arg2} {self.result}"
+from tac import TACInstruction
 
 class IntermediateCodeGenerator:
     def __init__(self):
@@ -324,7 +261,8 @@ class IntermediateCodeGenerator:
     
     def visit_RecipeDeclaration(self, node):
         """Visit recipe declaration"""
-        self.emit('begin_recipe', None, None, node.name)
+        # The parameter names are bound to the arguments when the recipe is called
+        self.emit('begin_recipe', [param['name'] for param in node.params], None, node.name)
         
         # Generate code for body
         for stmt in node.body:
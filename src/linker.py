@@ -0,0 +1,258 @@
+"""
+Library Linker for RecipeScript
+Compiles recipe libraries once to cached IR units and links them into the
+scripts that import them.
+
+Library Units:
+--------------
+1. SOURCE: A .recipe file holding only import directives and recipe
+   declarations. Scripts import it with:  import "helpers.recipe";
+   Paths are relative to the importing file.
+
+2. CACHE: The optimized TAC of a library is stored beside it as
+   __recipecache__/<name>.O<level>.rsl (the .rsc bytecode format plus an
+   export table), one per optimization level. The unit is reused while the hash of its source and of every
+   library it imports still match, and while it was built by the same
+   compiler (a hash of the front end and optimizer sources, so a changed
+   pass never runs code it would no longer produce); otherwise it is recompiled.
+
+3. EXPORTS: For every recipe, its parameters, return type and the
+   main-program variables it may read. Importing scripts are type-checked and
+   optimized against these signatures without seeing the recipe bodies.
+
+4. LINKING: After the script is optimized, the linker copies in the library
+   recipes reachable from its CALLs and renames their temporaries and labels
+   apart from the script's.
+"""
+
+import hashlib
+import os
+
+from lexer import Lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from intermediate_code import IntermediateCodeGenerator
+from optimizer import Optimizer
+from pass_manager import DEFAULT_OPT_LEVEL
+from token_types import TokenType
+from cfg import (Function, NameSupply, TEMP_PATTERN, split_functions, join_functions,
+                 replace_uses, replace_defs, copy_instruction)
+from effects import EffectAnalysis
+from bytecode import read_bytecode, write_bytecode, source_hash, FLAG_LIBRARY
+from tac import FUSED_BRANCH_OPS
+
+CACHE_DIRECTORY = '__recipecache__'
+LIBRARY_EXTENSION = '.rsl'
+LABEL_OPS = ['label', 'goto', 'if_false', 'if_true'] + list(FUSED_BRANCH_OPS)
+# Modules whose code decides what a library unit compiles to
+COMPILER_MODULES = [
+    'lexer', 'parser', 'semantic_analyzer', 'intermediate_code', 'tac', 'cfg', 'effects',
+    'provenance', 'ssa', 'sccp', 'allocator', 'loops', 'inliner', 'peephole', 'optimizer',
+    'pass_manager', 'linker', 'token_types',
+]
+
+
+def compiler_fingerprint():
+    """SHA-256 digest of the compiler sources that produce library units"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for module in COMPILER_MODULES:
+        with open(os.path.join(directory, module + '.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+class LibraryUnit:
+    """A compiled library: optimized recipe TAC and its export table"""
+    def __init__(self, path, source_hash, instructions, exports, imports, cached=False):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.source_hash = source_hash
+        self.instructions = instructions
+        self.exports = exports  # recipe -> signature
+        self.imports = imports  # [(path as written, source hash)]
+        self.cached = cached
+
+    def __repr__(self):
+        return f"LibraryUnit({self.name}, {len(self.exports)} recipes)"
+
+
+class Linker:
+    def __init__(self, opt_level=DEFAULT_OPT_LEVEL):
+        self.opt_level = opt_level  # Libraries are optimized like the importing script
+        self.units = {}  # absolute path -> LibraryUnit, dependencies first
+        self.loading = []  # import chain being loaded, for cycle detection
+        self.linked_recipes = 0
+        self.fingerprint = None  # Compiler fingerprint, computed on first use
+
+    def cache_path(self, path):
+        """Location of the cached unit for a library source file"""
+        directory, filename = os.path.split(path)
+        cache_name = f"{os.path.splitext(filename)[0]}.O{self.opt_level}{LIBRARY_EXTENSION}"
+        return os.path.join(directory, CACHE_DIRECTORY, cache_name)
+
+    def compiler_fingerprint(self):
+        """Fingerprint of this compiler, written into and checked against cached units"""
+        if self.fingerprint is None:
+            self.fingerprint = compiler_fingerprint()
+        return self.fingerprint
+
+    def load_imports(self, imports, base_dir=None):
+        """Load the units named by a program's import directives"""
+        return [self.load(directive.path, base_dir) for directive in imports]
+
+    def load(self, path, base_dir=None):
+        """Load a library unit, from its cache when still valid"""
+        full_path = os.path.abspath(os.path.join(base_dir or '.', path))
+        if full_path in self.units:
+            return self.units[full_path]
+        if full_path in self.loading:
+            chain = ' -> '.join(os.path.basename(p) for p in self.loading + [full_path])
+            raise Exception(f"Link Error: Circular import {chain}")
+
+        try:
+            with open(full_path, 'r') as f:
+                source_code = f.read()
+        except FileNotFoundError:
+            raise Exception(f"Link Error: Library '{path}' not found")
+
+        self.loading.append(full_path)
+        try:
+            unit = self.load_cached(full_path, source_code) or self.compile_unit(full_path, source_code)
+        finally:
+            self.loading.pop()
+        self.units[full_path] = unit
+        return unit
+
+    def load_cached(self, path, source_code):
+        """Reuse the cached unit if neither the library, its imports nor the compiler changed"""
+        cache = self.cache_path(path)
+        if not os.path.exists(cache):
+            return None
+        try:
+            program = read_bytecode(cache)
+        except Exception:
+            return None  # Older format or damaged file: recompile
+        if not program.flags & FLAG_LIBRARY or program.source_hash != source_hash(source_code):
+            return None
+        if program.fingerprint != self.compiler_fingerprint():
+            return None  # Built by a different compiler: its code may no longer be valid
+
+        directory = os.path.dirname(path)
+        for import_path, digest in program.imports:
+            if self.load(import_path, directory).source_hash != digest:
+                return None
+        return LibraryUnit(path, program.source_hash, program.instructions,
+                           program.exports, program.imports, cached=True)
+
+    def compile_unit(self, path, source_code):
+        """Compile a library source file to a unit and cache it"""
+        ast = Parser(Lexer(source_code).tokenize()).parse()
+        if ast.statements:
+            raise Exception(f"Link Error: Library '{os.path.basename(path)}' may only contain "
+                            f"imports and recipe declarations")
+        dependencies = self.load_imports(ast.imports, os.path.dirname(path))
+
+        semantic_analyzer = SemanticAnalyzer()
+        self.declare_imports(semantic_analyzer, dependencies)
+        semantic_analyzer.analyze(ast)
+
+        externals = self.externals(dependencies)
+        instructions = IntermediateCodeGenerator().generate(ast)
+        instructions = Optimizer(externals, library=True, level=self.opt_level).optimize(instructions)
+
+        # Temporaries are renamed apart when linking, so callers never see them
+        effects = EffectAnalysis(split_functions(instructions), externals)
+        exports = {}
+        for recipe in ast.recipes:
+            exports[recipe.name] = {
+                'params': [(param['type'].name, param['name']) for param in recipe.params],
+                'return_type': recipe.return_type.name if recipe.return_type else None,
+                'reads': set(n for n in effects.call_reads(recipe.name) if not TEMP_PATTERN.match(n)),
+            }
+
+        imports = [(directive.path, unit.source_hash) for directive, unit in zip(ast.imports, dependencies)]
+        try:
+            os.makedirs(os.path.join(os.path.dirname(path), CACHE_DIRECTORY), exist_ok=True)
+            write_bytecode(self.cache_path(path), instructions, source_code, imports, exports,
+                           self.compiler_fingerprint())
+        except OSError:
+            pass  # Caching is best-effort; the unit is still usable
+        return LibraryUnit(path, source_hash(source_code), instructions, exports, imports)
+
+    def declare_imports(self, semantic_analyzer, units):
+        """Make imported recipe signatures visible to semantic analysis"""
+        for unit in units:
+            for name, signature in unit.exports.items():
+                semantic_analyzer.register_import(name, {
+                    'params': [{'type': TokenType[param_type], 'name': param_name}
+                               for param_type, param_name in signature['params']],
+                    'return_type': TokenType[signature['return_type']] if signature['return_type'] else None,
+                }, unit.name)
+
+    def externals(self, units):
+        """Read summaries of the recipes exported by units"""
+        summaries = {}
+        for unit in units:
+            for name, signature in unit.exports.items():
+                summaries[name] = signature['reads']
+        return summaries
+
+    def link(self, instructions):
+        """Add the library recipes reachable from a program's CALLs"""
+        functions = split_functions(instructions)
+        defined = set(function.name for function in functions if function.name)
+
+        available = {}  # recipe -> (unit, function)
+        for unit in self.units.values():
+            for function in split_functions(unit.instructions):
+                if function.name is None:
+                    continue
+                if function.name in defined:
+                    raise Exception(f"Link Error: Recipe '{function.name}' from '{unit.name}' "
+                                    f"clashes with a recipe in the script")
+                if function.name in available:
+                    raise Exception(f"Link Error: Recipe '{function.name}' is defined in both "
+                                    f"'{available[function.name][0].name}' and '{unit.name}'")
+                available[function.name] = (unit, function)
+
+        needed = set()
+        work = [instr.arg1 for function in functions for instr in function.instructions if instr.op == 'call']
+        while work:
+            name = work.pop()
+            if name in defined or name in needed:
+                continue
+            if name not in available:
+                raise Exception(f"Link Error: Undefined recipe '{name}'")
+            needed.add(name)
+            work.extend(instr.arg1 for instr in available[name][1].instructions if instr.op == 'call')
+
+        supply = NameSupply(instructions)
+        linked = [self.relocate(function, supply)
+                  for _, function in available.values() if function.name in needed]
+        self.linked_recipes = len(linked)
+        return join_functions(linked + functions)
+
+    def relocate(self, function, supply):
+        """Rename a library recipe's temporaries and labels apart from the program's"""
+        temps = {}
+        labels = {}
+
+        def rename_temp(name):
+            if not TEMP_PATTERN.match(name):
+                return name
+            if name not in temps:
+                temps[name] = supply.new_temp()
+            return temps[name]
+
+        instructions = []
+        for instr in function.instructions:
+            instr = copy_instruction(instr)
+            replace_uses(instr, rename_temp)
+            replace_defs(instr, rename_temp)
+            if instr.op in LABEL_OPS:
+                if instr.result not in labels:
+                    labels[instr.result] = supply.new_label()
+                instr.result = labels[instr.result]
+            instructions.append(instr)
+        return Function(function.name, instructions, function.header)
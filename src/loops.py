@@ -0,0 +1,751 @@
+"""
+Loop Analysis and Loop Optimizations for RecipeScript
+Finds the natural loops of a function's control flow graph and moves
+loop-invariant computations out of them.
+
+Natural Loops:
+--------------
+A back edge is an edge latch -> header whose target dominates its source.
+The loop of a header is the header plus every block that reaches one of its
+latches without passing through the header. Each repeat statement produces
+one loop whose header holds the exit test:
+    L_start: t = counter >= count; if_true t goto L_end
+
+Loop-Invariant Code Motion (on SSA form):
+-----------------------------------------
+1. INVARIANT: a pure instruction whose operands are constants, defined
+   outside the loop, or results of other invariant instructions.
+
+2. SAFE: the instruction must run on the first iteration whenever the loop
+   is entered, so hoisting never runs code the loop would have skipped.
+   Its block dominates every latch and every exit other than the header's,
+   and the header's exit test is known to fall into the body on entry
+   (repeat counts are literals). An instruction that can fail (arithmetic
+   on a value that may be text, see provenance.py, or a division that may
+   divide by zero) also needs a loop known to run, and nothing that prints,
+   has an effect or can fail may run before it on the first iteration, so
+   its error is raised after the same output.
+
+3. MOTION: the computation moves to the preheader (the single block that
+   enters the header from outside the loop, split off if necessary).
+   Private temporaries move outright; any other result keeps a copy of the
+   hoisted value inside the loop, because its name may be displayed or
+   scaled there.
+
+Loop Unrolling (on plain TAC):
+------------------------------
+Repeat counts are literals, so a counted loop's trip count is known:
+    i = 0; L_start: t = i >= N; if_true t goto L_end; <body>; i = i + 1; goto L_start
+1. FULL: when the copies fit FULL_UNROLL_BUDGET instructions (or the loop
+   runs at most once) the loop becomes N copies of its body.
+2. PARTIAL: otherwise the body is copied UNROLL_FACTORS[k] times per
+   iteration within PARTIAL_UNROLL_BUDGET, the loop runs N // k times and
+   the N % k leftover iterations are peeled off in front of it.
+Labels inside each copy are renamed apart; the counter is only kept for
+partially unrolled loops.
+
+Induction Variables (on plain TAC, straight-line repeat bodies):
+-----------------------------------------------------------------
+A basic induction variable is updated once per iteration by v = v + c
+(or - c) with an integer c, starting from an integer constant, so its value
+in iteration k is v0 + k * c exactly.
+1. EVALUATION: a loop of pure instructions is replaced by the code of its
+   last iteration, run on the values entering it: closed form when every
+   variable carried between iterations is an induction variable, otherwise
+   by evaluating the iterations at compile time (within EVALUATION_BUDGET).
+   Values only known at runtime may be recomputed, not carried.
+2. STRENGTH REDUCTION: t = v * k (integer k) becomes a copy of a new
+   variable that starts at v0 * k and is stepped by c * k after v.
+3. SINKING: an induction variable nothing else in the loop reads or writes
+   (and no CALL could read) gets its final value before the loop, and its
+   update leaves the loop. Every other instruction, side effects included,
+   still runs once per iteration.
+
+Loop Fusion (on plain TAC):
+---------------------------
+Two counted loops with the same literal trip count, where only pure code
+that cannot fail sits between them, become one loop that runs the first
+body and then the second body in each iteration. Fusion is refused when:
+1. DEPENDENCE: the first loop writes a variable the second body reads or
+   writes, or the second body writes a variable the first loop reads.
+2. OUTPUT ORDER: both bodies print (print, mix, heat, wait, serve, display,
+   scale, add_ingredient), since their lines would interleave; or one body
+   prints and the other can fail (arithmetic or an ordering comparison on a
+   value that may be text, see provenance.py, or a division by zero), since the error would then stop the program after a
+   different number of lines.
+3. OPAQUE CODE: either body contains a CALL or an INPUT.
+4. CODE BETWEEN: it moves in front of the fused loop when it is independent
+   of the first loop, else behind it when independent of the second body,
+   else the loops stay apart.
+5. JUMPS: code outside jumps into the second loop or to the first loop's exit.
+"""
+
+import math
+
+from tac import TACInstruction
+from cfg import (ControlFlowGraph, BRANCH_OPS, COMPARISON_OPS, BINARY_OPS, is_variable, base_name,
+                 unit_constant, uses, defs, replace_uses, copy_instruction, liveness)
+
+JUMP_OPS = ['goto'] + BRANCH_OPS
+FULL_UNROLL_BUDGET = 64  # Instructions the copies of a fully unrolled loop may take
+PARTIAL_UNROLL_BUDGET = 64  # Instructions for the copies in and before an unrolled loop
+UNROLL_FACTORS = [4, 2]
+EVALUATION_BUDGET = 100_000  # Instructions a loop may take to evaluate at compile time
+PURE_OPS = ['assign'] + BINARY_OPS
+# Instructions that print a line
+OUTPUT_OPS = ['print', 'mix', 'heat', 'wait', 'serve', 'display', 'scale', 'add_ingredient']
+
+
+class Loop:
+    """A natural loop: its header, member block ids and back-edge sources"""
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header.id}
+        self.latches = []
+
+    def exits(self, cfg):
+        """Loop blocks with a successor outside the loop"""
+        return [block for block in cfg.rpo
+                if block.id in self.blocks and any(succ.id not in self.blocks for succ in block.succs)]
+
+    def __repr__(self):
+        return f"Loop({self.header}, {len(self.blocks)} blocks)"
+
+
+def find_loops(cfg):
+    """Natural loops of a graph with dominators computed, innermost first"""
+    loops = {}
+    for block in cfg.rpo:
+        for succ in block.succs:
+            if not cfg.dominates(succ, block):
+                continue
+            loop = loops.setdefault(succ.id, Loop(succ))
+            loop.latches.append(block)
+            work = [block]
+            while work:
+                member = work.pop()
+                if member.id in loop.blocks:
+                    continue
+                loop.blocks.add(member.id)
+                work.extend(pred for pred in member.preds if cfg.is_reachable(pred))
+    return sorted(loops.values(), key=lambda loop: len(loop.blocks))
+
+
+class LoopInvariantMotion:
+    def __init__(self, optimizer, supply, provenance=None, function_name=None):
+        self.optimizer = optimizer  # Purity and constant evaluation rules
+        self.supply = supply
+        self.provenance = provenance  # Which values may be text (see provenance.py)
+        self.function_name = function_name
+        self.hoisted = []  # (loop header label, hoisted instruction)
+
+    def run(self, cfg, holders):
+        """Hoist invariant code out of every loop of an SSA-form graph"""
+        # Splitting an edge for a preheader changes the graph, so loops are
+        # found again after each one is processed
+        done = set()
+        while True:
+            loop = next((loop for loop in find_loops(cfg) if loop.header.id not in done), None)
+            if loop is None:
+                return self.hoisted
+            done.add(loop.header.id)
+            self.hoist(cfg, loop, holders)
+
+    def hoist(self, cfg, loop, holders):
+        """Move the invariant instructions of one loop into its preheader"""
+        entering = [pred for pred in loop.header.preds if pred.id not in loop.blocks]
+        if len(entering) != 1:
+            return
+        entering = entering[0]
+
+        guaranteed = self.guaranteed_blocks(cfg, loop, entering)
+        runs = self.enters_body(cfg, loop, entering)
+        defined = set()
+        for block in cfg.rpo:
+            if block.id in loop.blocks:
+                defined.update(phi.result for phi in block.phis)
+                for instr in block.instructions:
+                    defined.update(defs(instr))
+
+        available = {}  # loop name -> name holding its value before the loop
+        moved = []
+        for block in guaranteed:
+            for instr in list(block.instructions):
+                if instr.op not in PURE_OPS:
+                    continue
+                if self.can_fail(instr) and not (runs and not self.acts_before(loop, block, instr)):
+                    continue  # Its error must come after the output of the iteration
+                if any(name in defined and name not in available for name in uses(instr)):
+                    continue
+                if instr.op == 'assign' and is_variable(instr.arg1):
+                    # Copies need no motion; their value is already available
+                    available[instr.result] = available.get(instr.arg1, instr.arg1)
+                    continue
+                if instr.op == 'assign' and not uses(instr):
+                    continue  # Constants are left to constant propagation
+                hoisted = copy_instruction(instr)
+                replace_uses(hoisted, lambda name: available.get(name, name))
+                if base_name(instr.result) in holders:
+                    block.instructions.remove(instr)
+                else:
+                    hoisted.result = self.supply.new_temp()
+                    instr.op, instr.arg1, instr.arg2 = 'assign', hoisted.result, None
+                available[instr.result] = hoisted.result
+                moved.append(hoisted)
+
+        if not moved:
+            return
+        preheader = self.preheader(cfg, loop, entering)
+        term = preheader.terminator()
+        position = len(preheader.instructions) - 1 if term is not None else len(preheader.instructions)
+        preheader.instructions[position:position] = moved
+        self.hoisted.extend((loop.header.label, instr) for instr in moved)
+
+    def can_fail(self, instr):
+        """Check if an instruction may raise a runtime error (see Optimizer.can_fail)"""
+        return self.optimizer.can_fail(instr, self.provenance, self.function_name)
+
+    def acts_before(self, loop, block, instr):
+        """Check if output, an effect or a failure may come before instr in an iteration"""
+        region = {}
+        work = [] if block is loop.header else [pred for pred in block.preds if pred.id in loop.blocks]
+        while work:
+            member = work.pop()
+            if member.id in region:
+                continue
+            region[member.id] = member
+            if member is not loop.header:
+                work.extend(pred for pred in member.preds if pred.id in loop.blocks)
+        code = [other for member in region.values() for other in member.instructions]
+        code += block.instructions[:block.instructions.index(instr)]
+        for other in code:
+            if other.op in PURE_OPS:
+                if self.can_fail(other):
+                    return True
+            elif other.op not in JUMP_OPS + ['use']:
+                return True
+        return False
+
+    def guaranteed_blocks(self, cfg, loop, entering):
+        """Loop blocks that run on the first iteration whenever the loop is entered"""
+        header = loop.header
+        exits = [block for block in loop.exits(cfg) if block is not header]
+        if header in loop.exits(cfg) and not self.enters_body(cfg, loop, entering):
+            return [header]
+        return [block for block in cfg.rpo
+                if block.id in loop.blocks
+                and all(cfg.dominates(block, other) for other in loop.latches + exits)]
+
+    def enters_body(self, cfg, loop, entering):
+        """Check that the header's exit test stays in the loop on entry"""
+        header = loop.header
+        constants = {}
+        for block in cfg.rpo:
+            for instr in block.instructions:
+                if instr.op == 'assign' and self.optimizer.is_constant(instr.arg1):
+                    constants[instr.result] = instr.arg1
+
+        def value(operand):
+            if self.optimizer.is_constant(operand):
+                return operand
+            return constants.get(operand)
+
+        for phi in header.phis:
+            initial = value(phi.arg1.get(entering.id))
+            if initial is not None:
+                constants[phi.result] = initial
+        for instr in header.instructions:
+            if instr.op in COMPARISON_OPS:
+                arg1, arg2 = value(instr.arg1), value(instr.arg2)
+                if arg1 is not None and arg2 is not None:
+                    constants[instr.result] = self.optimizer.evaluate_comparison(instr.op, arg1, arg2)
+
+        term = header.terminator()
+        if term is None or term.op not in BRANCH_OPS:
+            return False
+        condition = value(term.arg1)
+        if condition is None:
+            return False
+        truth = self.optimizer.parse_number(condition) != 0
+        jumps = truth if term.op == 'if_true' else not truth
+        if jumps:
+            taken = cfg.label_map[term.result]
+        else:
+            index = cfg.blocks.index(header)
+            taken = cfg.blocks[index + 1] if index + 1 < len(cfg.blocks) else None
+        return taken is not None and taken.id in loop.blocks
+
+    def preheader(self, cfg, loop, entering):
+        """Block that runs once before the loop, created on demand"""
+        if entering.succs == [loop.header]:
+            return entering
+        preheader = cfg.split_edge(entering, loop.header, self.supply)
+        cfg.compute_dominators()
+        return preheader
+
+
+def linearize(blocks):
+    """Instructions of blocks in layout order, with their labels"""
+    instructions = []
+    for block in blocks:
+        if block.label:
+            instructions.append(TACInstruction('label', None, None, block.label))
+        instructions.extend(block.instructions)
+    return instructions
+
+
+class CountedLoop:
+    """A repeat loop in layout form: header test, body and counter increment"""
+    def __init__(self, start, end, test, body, increment, initial, trips):
+        self.start = start  # Layout index of the header block
+        self.end = end  # Layout index of the latch block
+        self.test = test  # t = i >= N
+        self.body = body
+        self.increment = increment  # i = i + 1 (or t = i + 1; i = t)
+        self.initial = initial  # Counter value on entry
+        self.trips = trips
+
+
+class CountedLoops:
+    """Recognizes the counter loops generated for repeat statements"""
+    def __init__(self, optimizer, supply):
+        self.optimizer = optimizer
+        self.supply = supply
+
+    def counted_loop(self, cfg, loop):
+        """Recognize the counter loop generated for a repeat statement"""
+        header = loop.header
+        if header.label is None or len(loop.latches) != 1 or len(header.instructions) != 2:
+            return None
+        test, branch = header.instructions
+        if (test.op != 'gte' or not is_variable(test.arg1) or not self.optimizer.is_constant(test.arg2)
+                or branch.op != 'if_true' or branch.arg1 != test.result):
+            return None
+        counter = test.arg1
+
+        latch = loop.latches[0]
+        start, end = cfg.blocks.index(header), cfg.blocks.index(latch)
+        if end <= start or end + 1 >= len(cfg.blocks) or cfg.blocks[end + 1].label != branch.result:
+            return None
+        term = latch.terminator()
+        if term is None or term.op != 'goto' or term.result != header.label:
+            return None
+        increment = self.increment(latch, counter)
+        if increment is None:
+            return None
+
+        region = linearize(cfg.blocks[start + 1:end + 1])
+        body = region[:-1 - len(increment)]
+        counter_names = set([counter, test.result] + [instr.result for instr in increment])
+        labels = set(instr.result for instr in body if instr.op == 'label')
+        for instr in body:
+            if counter_names & set(uses(instr) + defs(instr)):
+                return None
+            if instr.op in JUMP_OPS and instr.result not in labels:
+                return None  # Leaves the loop other than through the header
+        # Nothing outside may jump into the loop or read the counter afterwards
+        labels.add(header.label)
+        outside = linearize(cfg.blocks[:start]) + linearize(cfg.blocks[end + 1:])
+        if any(instr.op in JUMP_OPS and instr.result in labels for instr in outside):
+            return None
+        live_in, _ = liveness(cfg)
+        if counter_names & live_in[cfg.blocks[end + 1].id]:
+            return None
+
+        initial = self.initial_value(cfg, header, loop, counter)
+        if initial is None:
+            return None
+        initial = self.optimizer.parse_number(initial)
+        trips = max(0, math.ceil(self.optimizer.parse_number(test.arg2) - initial))
+        return CountedLoop(start, end, test, body, increment, initial, trips)
+
+    def increment(self, latch, counter):
+        """The counter update at the end of the latch: i = i + 1"""
+        instructions = latch.instructions[:-1]
+        if len(instructions) >= 1 and self.is_step(instructions[-1], counter, counter):
+            return instructions[-1:]
+        if (len(instructions) >= 2 and instructions[-1].op == 'assign'
+                and instructions[-1].result == counter and is_variable(instructions[-1].arg1)
+                and self.is_step(instructions[-2], counter, instructions[-1].arg1)):
+            return instructions[-2:]
+        return None
+
+    def is_step(self, instr, counter, result):
+        """Check for result = counter + 1"""
+        return (instr.op == 'add' and instr.arg1 == counter and instr.result == result
+                and self.optimizer.is_constant(instr.arg2)
+                and self.optimizer.parse_number(instr.arg2) == 1)
+
+    def initial_value(self, cfg, header, loop, name):
+        """Constant a variable holds on entry, found along the entry path"""
+        entering = [pred for pred in header.preds if pred.id not in loop.blocks]
+        block = entering[0] if len(entering) == 1 else None
+        while block is not None:
+            for instr in reversed(block.instructions):
+                if name in defs(instr):
+                    if instr.op == 'assign' and self.optimizer.is_constant(instr.arg1):
+                        return instr.arg1
+                    return None
+            block = block.preds[0] if len(block.preds) == 1 else None
+        return None
+
+
+class LoopUnroller(CountedLoops):
+    def __init__(self, optimizer, supply):
+        super().__init__(optimizer, supply)
+        self.unrolled = []  # (header label, trip count, factor; None when fully unrolled)
+
+    def run(self, instructions):
+        """Unroll the counted loops of one function, innermost first"""
+        done = set()  # Headers of partially unrolled loops
+        while True:
+            cfg = ControlFlowGraph(instructions)
+            cfg.compute_dominators()
+            for loop in find_loops(cfg):
+                if loop.header.label in done:
+                    continue
+                unrolled = self.unroll(cfg, loop, done)
+                if unrolled is not None:
+                    instructions = unrolled
+                    break
+            else:
+                return instructions
+
+    def unroll(self, cfg, loop, done):
+        """Unroll one loop, returning the function's new instructions"""
+        counted = self.counted_loop(cfg, loop)
+        if counted is None:
+            return None
+        label = loop.header.label
+        size = len(counted.body)
+        before = linearize(cfg.blocks[:counted.start])
+        after = linearize(cfg.blocks[counted.end + 1:])
+
+        if counted.trips <= 1 or counted.trips * size <= FULL_UNROLL_BUDGET:
+            copies = []
+            for index in range(counted.trips):
+                copies.extend(self.copy_body(counted.body, done, index == 0))
+            self.unrolled.append((label, counted.trips, None))
+            return before + copies + after
+
+        factor = next((factor for factor in UNROLL_FACTORS
+                       if counted.trips // factor >= 2
+                       and (factor + counted.trips % factor) * size <= PARTIAL_UNROLL_BUDGET), None)
+        if factor is None:
+            return None
+        peeled = []
+        for _ in range(counted.trips % factor):
+            peeled.extend(self.copy_body(counted.body, done, False))
+        copies = []
+        for index in range(factor):
+            copies.extend(self.copy_body(counted.body, done, index == 0))
+
+        # The counter keeps its initial value and now counts unrolled iterations
+        test = copy_instruction(counted.test)
+        test.arg2 = str(counted.initial + counted.trips // factor)
+        branch = cfg.blocks[counted.start].instructions[-1]
+        header = [TACInstruction('label', None, None, label), test, branch]
+        latch = counted.increment + [TACInstruction('goto', None, None, label)]
+        done.add(label)
+        self.unrolled.append((label, counted.trips, factor))
+        return before + peeled + header + copies + latch + after
+
+    def copy_body(self, body, done, keep_labels):
+        """Copy of a loop body with its labels renamed apart"""
+        labels = {}
+        for instr in body:
+            if instr.op == 'label':
+                labels[instr.result] = instr.result if keep_labels else self.supply.new_label()
+                if instr.result in done:
+                    done.add(labels[instr.result])
+        copied = []
+        for instr in body:
+            instr = copy_instruction(instr)
+            if instr.op in ['label'] + JUMP_OPS:
+                instr.result = labels.get(instr.result, instr.result)
+            copied.append(instr)
+        return copied
+
+
+class InductionVariables(CountedLoops):
+    def __init__(self, optimizer, supply):
+        super().__init__(optimizer, supply)
+        self.evaluated = []  # (header label, trip count) of loops replaced by their result
+        self.sunk = []  # (header label, variable) accumulations moved out of a loop
+        self.reduced = []  # (header label, multiplication) replaced by an added step
+
+    def run(self, instructions):
+        """Rewrite the counted loops of one function until none changes"""
+        while True:
+            cfg = ControlFlowGraph(instructions)
+            cfg.compute_dominators()
+            for loop in find_loops(cfg):
+                rewritten = self.rewrite(cfg, loop)
+                if rewritten is not None:
+                    instructions = rewritten
+                    break
+            else:
+                return instructions
+
+    def rewrite(self, cfg, loop):
+        """Evaluate, strength-reduce or shrink one loop; None if nothing applies"""
+        counted = self.counted_loop(cfg, loop)
+        if counted is None or any(instr.op == 'label' or instr.op in JUMP_OPS for instr in counted.body):
+            return None
+        label = loop.header.label
+        before = linearize(cfg.blocks[:counted.start])
+        after = linearize(cfg.blocks[counted.end + 1:])
+        inductions = self.basic_inductions(cfg, loop, counted.body)
+
+        if all(instr.op in PURE_OPS for instr in counted.body):
+            code = self.final_iteration(cfg, loop, counted, inductions)
+            if code is not None:
+                self.evaluated.append((label, counted.trips))
+                return before + code + after
+
+        loop_code = linearize(cfg.blocks[counted.start:counted.end + 1])
+        reduced = self.strength_reduce(label, counted.body, inductions)
+        if reduced is not None:
+            setup, body = reduced
+            return before + setup + self.replace_body(loop_code, counted, body) + after
+
+        sunk = self.sink(cfg, label, counted, inductions)
+        if sunk is not None:
+            setup, body = sunk
+            return before + setup + self.replace_body(loop_code, counted, body) + after
+        return None
+
+    def replace_body(self, loop_code, counted, body):
+        """Loop code (header to latch) with a new body"""
+        head = 3  # label, exit test, branch
+        tail = len(counted.increment) + 1
+        return loop_code[:head] + body + loop_code[-tail:]
+
+    def basic_inductions(self, cfg, loop, body):
+        """v -> (step, defining instructions) for v = v + step (or - step) once per iteration"""
+        inductions = {}
+        carried = self.carried(body)
+        for name in carried:
+            definitions = [index for index, instr in enumerate(body) if name in defs(instr)]
+            if len(definitions) != 1:
+                continue
+            update = body[definitions[0]]
+            chain = [update]
+            if update.op == 'assign' and is_variable(update.arg1):
+                step_defs = [instr for instr in body[:definitions[0]] if update.arg1 in defs(instr)]
+                if len(step_defs) != 1:
+                    continue
+                chain.insert(0, step_defs[0])
+                update = step_defs[0]
+            if update.op not in ['add', 'sub'] or update.arg1 != name or not self.is_integer(update.arg2):
+                continue
+            step = self.optimizer.parse_number(update.arg2)
+            initial = self.initial_value(cfg, loop.header, loop, name)
+            if not self.is_integer(initial):
+                continue
+            inductions[name] = (step if update.op == 'add' else -step, chain, self.optimizer.parse_number(initial))
+        return inductions
+
+    def carried(self, body):
+        """Variables read in the body before the body writes them"""
+        written = set()
+        carried = []
+        for instr in body:
+            for name in uses(instr):
+                if name not in written and name not in carried:
+                    carried.append(name)
+            written.update(defs(instr))
+        return [name for name in carried if name in written]
+
+    def is_integer(self, value):
+        """Check for an integer constant (its repeated sums are exact)"""
+        return self.optimizer.is_constant(value) and isinstance(self.optimizer.parse_number(value), int)
+
+    def final_iteration(self, cfg, loop, counted, inductions):
+        """Code that leaves every variable as the whole (pure) loop would"""
+        if counted.trips == 0:
+            return []
+        carried = self.carried(counted.body)
+        if all(name in inductions for name in carried):
+            # Closed form: each induction variable's value entering the last iteration
+            values = {name: str(initial + step * (counted.trips - 1))
+                      for name, (step, _, initial) in inductions.items()}
+            iterations = 1
+        else:
+            values = {}
+            for name in carried:
+                initial = self.initial_value(cfg, loop.header, loop, name)
+                if initial is None:
+                    return None
+                values[name] = initial
+            if counted.trips * len(counted.body) > EVALUATION_BUDGET:
+                return None
+            iterations = counted.trips
+
+        code = None
+        for _ in range(iterations):
+            result = self.iterate(counted.body, values)
+            if result is None:
+                return None
+            values, code = result
+        return code
+
+    def iterate(self, body, values):
+        """Run one iteration on known values: (values after it, code recomputing them)"""
+        values = dict(values)  # name -> constant, or None when only known at runtime
+        computed = set()  # Names computed at runtime in this iteration
+        code = []
+        for instr in body:
+            if any(values.get(name, '') is None and name not in computed for name in uses(instr)):
+                return None  # Carries a runtime value into the next iteration
+            instr = copy_instruction(instr)
+            replace_uses(instr, lambda name: values.get(name) or name)
+            value = self.constant_result(instr)
+            if value is None:
+                values[instr.result] = None
+                computed.add(instr.result)
+                code.append(instr)
+            else:
+                values[instr.result] = value
+                code.append(TACInstruction('assign', value, None, instr.result))
+        return values, code
+
+    def constant_result(self, instr):
+        """Constant an instruction with substituted operands produces, if known"""
+        if instr.op == 'assign':
+            if self.optimizer.is_constant(instr.arg1) or unit_constant(instr.arg1):
+                return instr.arg1
+            return None
+        result = self.optimizer.fold_binary(instr.op, instr.arg1, instr.arg2)
+        return None if result is None else str(result)
+
+    def strength_reduce(self, label, body, inductions):
+        """Replace one v * k of an induction variable by a variable stepped by k * step"""
+        for index, instr in enumerate(body):
+            if instr.op != 'mul':
+                continue
+            for name, factor in [(instr.arg1, instr.arg2), (instr.arg2, instr.arg1)]:
+                if name not in inductions or not self.is_integer(factor):
+                    continue
+                step, chain, initial = inductions[name]
+                self.reduced.append((label, str(instr)))
+                factor = self.optimizer.parse_number(factor)
+                scaled = self.supply.new_temp()
+                setup = [TACInstruction('assign', str(initial * factor), None, scaled)]
+                body = list(body)
+                body[index] = TACInstruction('assign', scaled, None, instr.result)
+                update = body.index(chain[-1]) + 1
+                body.insert(update, TACInstruction('add', scaled, str(step * factor), scaled))
+                return setup, body
+        return None
+
+    def sink(self, cfg, label, counted, inductions):
+        """Move induction variables nothing in the loop reads out of it"""
+        if any(instr.op == 'call' for instr in counted.body):
+            return None  # Recipes read main-program variables
+        live_in, _ = liveness(cfg)
+        exit_live = live_in[cfg.blocks[counted.end + 1].id]
+        for name, (step, chain, initial) in inductions.items():
+            names = set(defs(chain[0]) + defs(chain[-1]))
+            others = [instr for instr in counted.body if instr not in chain]
+            if any(names & set(uses(instr) + defs(instr)) for instr in others):
+                continue
+            if (names - {name}) & exit_live:
+                continue
+            self.sunk.append((label, name))
+            final = TACInstruction('assign', str(initial + step * counted.trips), None, name)
+            return [final], others
+        return None
+
+
+class LoopFusion(CountedLoops):
+    def __init__(self, optimizer, supply, provenance=None):
+        super().__init__(optimizer, supply)
+        self.provenance = provenance  # Which values may be text (see provenance.py)
+        self.function_name = None
+        self.fused = []  # (first header label, second header label, trip count)
+
+    def run(self, instructions, function_name=None):
+        """Fuse adjacent counted loops of one function until none remain"""
+        self.function_name = function_name
+        while True:
+            cfg = ControlFlowGraph(instructions)
+            cfg.compute_dominators()
+            counted = {}
+            for loop in find_loops(cfg):
+                found = self.counted_loop(cfg, loop)
+                if found is not None:
+                    counted[found.start] = found
+            for first in sorted(counted.values(), key=lambda found: found.start):
+                second = min((found for found in counted.values() if found.start > first.end),
+                             key=lambda found: found.start, default=None)
+                if second is None:
+                    continue
+                fused = self.fuse(cfg, first, second)
+                if fused is not None:
+                    instructions = fused
+                    break
+            else:
+                return instructions
+
+    def fuse(self, cfg, first, second):
+        """One loop running both bodies, or None if that could change the program"""
+        if first.trips != second.trips:
+            return None
+        exit_block = cfg.blocks[first.end + 1]
+        between = linearize(cfg.blocks[first.end + 1:second.start])[1:]
+        if any(instr.op == 'label' or instr.op not in PURE_OPS or not self.cannot_fail(instr)
+               for instr in between):
+            return None  # Only independent computations may sit between the loops
+
+        counter = second.test.arg1
+        between = [instr for instr in between if counter not in defs(instr)]
+        reads_first, writes_first = self.accesses(first.body)
+        reads_second, writes_second = self.accesses(second.body)
+        reads_between, writes_between = self.accesses(between)
+        if writes_first & (reads_second | writes_second) or writes_second & reads_first:
+            return None  # The second body would see values of an unfinished first loop
+
+        loop_code = linearize(cfg.blocks[first.start:first.end + 1])
+        reads_loop, writes_loop = self.accesses(loop_code)
+        hoist = not (writes_loop & (reads_between | writes_between) or writes_between & reads_loop)
+        if not hoist and (writes_second & (reads_between | writes_between) or writes_between & reads_second):
+            return None  # The code between the loops moves before or after the fused loop
+
+        first_outputs = any(instr.op in OUTPUT_OPS for instr in first.body)
+        second_outputs = any(instr.op in OUTPUT_OPS for instr in second.body)
+        if first_outputs and second_outputs:
+            return None  # Output lines would interleave
+        if first_outputs and not all(self.cannot_fail(instr) for instr in second.body):
+            return None  # An error in the second body would cut the first body's output short
+        if second_outputs and not all(self.cannot_fail(instr) for instr in first.body):
+            return None  # ... or come before lines that were printed ahead of it
+        if any(instr.op in ['call', 'input'] for instr in first.body + second.body):
+            return None
+
+        # Nothing else may jump into the second loop or to the first loop's exit
+        second_labels = set(instr.result for instr in second.body if instr.op == 'label')
+        second_labels.update([cfg.blocks[second.start].label, exit_block.label])
+        rest = linearize(cfg.blocks[:first.start]) + linearize(cfg.blocks[second.end + 1:])
+        if any(instr.op in JUMP_OPS and instr.result in second_labels for instr in rest):
+            return None
+
+        tail = len(first.increment) + 1
+        fused = (loop_code[:-tail] + [copy_instruction(instr) for instr in second.body] + loop_code[-tail:]
+                 + [TACInstruction('label', None, None, exit_block.label)])
+        fused = between + fused if hoist else fused + between
+        self.fused.append((cfg.blocks[first.start].label, cfg.blocks[second.start].label, first.trips))
+        return linearize(cfg.blocks[:first.start]) + fused + linearize(cfg.blocks[second.end + 1:])
+
+    def accesses(self, instructions):
+        """Variables read and written by instructions"""
+        reads = set()
+        writes = set()
+        for instr in instructions:
+            reads.update(uses(instr))
+            writes.update(defs(instr))
+        return reads, writes
+
+    def cannot_fail(self, instr):
+        """Check that an instruction raises no runtime error (see Optimizer.can_fail)"""
+        return not self.optimizer.can_fail(instr, self.provenance, self.function_name)
@@ -3,24 +3,37 @@ Code Optimizer for RecipeScript
 Phase 5: Optimizes Three-Address Code
 """
 
+from cfg import (ControlFlowGraph, BINARY_OPS, COMPARISON_OPS, BRANCH_OPS, TEMP_PATTERN, split_functions, join_functions, NameSupply,
+                 base_name, is_variable, unit_reference, unit_constant, uses, defs, replace_uses, liveness)
+from tac import TACInstruction
+from effects import EffectAnalysis
+from ssa import SSABuilder, SSADestructor
+from sccp import ConditionalConstantPropagation
+from allocator import TempAllocator, NAMED_OPS
+from loops import LoopInvariantMotion, LoopUnroller, InductionVariables, LoopFusion
+from inliner import RecipeInliner
+from provenance import ValueProvenance
+from peephole import PeepholeOptimizer
+from pass_manager import PassManager, DEFAULT_OPT_LEVEL
+
+# Instructions with no effect other than writing their result
+PURE_OPS = ['assign'] + BINARY_OPS
+# Operand order does not matter ('add' also concatenates strings)
+COMMUTATIVE_OPS = ['mul', 'eq', 'neq']
+
 class Optimizer:
-    def __init__(self):
+    def __init__(self, externals=None, library=False, level=DEFAULT_OPT_LEVEL):
         self.optimizations_applied = []
+        self.externals = externals  # Effect summaries of imported recipes
+        self.library = library  # Compiling a library unit
+        self.level = level
+        self.pass_manager = None
     
     def optimize(self, instructions):
-        """Apply optimizations to TAC"""
-        optimized = instructions.copy()
-        
-        # Apply constant folding
-        optimized = self.constant_folding(optimized)
-        
-        # Apply constant propagation
-        optimized = self.constant_propagation(optimized)
-        
-        # Apply dead code elimination
-        optimized = self.dead_code_elimination(optimized)
-        
-        return optimized
+        """Apply the optimization pipeline for the -O level to TAC"""
+        # Temporary allocation runs last: earlier passes assume one name per temporary
+        self.pass_manager = PassManager(self, self.level)
+        return self.pass_manager.run(instructions.copy())
     
     def constant_folding(self, instructions):
         """Fold constant expressions at compile time"""
@@ -32,96 +45,423 @@ class Optimizer:
                 optimized.append(instr)
                 continue
             
-            # Fold arithmetic operations with constant operands
-            if instr.op in ['add', 'sub', 'mul', 'div'] and self.is_constant(instr.arg1) and self.is_constant(instr.arg2):
-                try:
-                    result = self.evaluate_op(instr.op, instr.arg1, instr.arg2)
+            # Fold arithmetic and comparison operations with constant operands
+            if instr.op in BINARY_OPS:
+                result = self.fold_binary(instr.op, instr.arg1, instr.arg2)
+                if result is not None:
                     # Replace with direct assignment
-                    from intermediate_code import TACInstruction
                     optimized.append(TACInstruction('assign', str(result), None, instr.result))
                     self.optimizations_applied.append(f"Constant folding: {instr.arg1} {instr.op} {instr.arg2} = {result}")
-                except:
-                    optimized.append(instr)
-            else:
-                optimized.append(instr)
+                    continue
+            optimized.append(instr)
         
         return optimized
     
     def constant_propagation(self, instructions):
-        """Propagate constant values through the code"""
-        # First pass: find variables that are assigned multiple times (loop variables)
-        assignment_count = {}
-        for instr in instructions:
-            if instr.op == 'assign':
-                assignment_count[instr.result] = assignment_count.get(instr.result, 0) + 1
+        """Sparse conditional constant propagation on the SSA form of each function"""
+        functions = split_functions(instructions)
+        effects = EffectAnalysis(functions, self.externals)
+        supply = NameSupply(instructions)
         
-        constants = {}  # Track known constant values
-        optimized = []
+        for function in functions:
+            cfg = SSABuilder(effects).build(function)
+            for name, constant in ConditionalConstantPropagation(self).run(cfg):
+                self.optimizations_applied.append(f"Constant propagation: {base_name(name)} -> {constant}")
+            function.instructions = SSADestructor(supply).destruct(cfg)
         
-        for instr in instructions:
-            # Track constant assignments (but not for variables assigned multiple times)
-            if instr.op == 'assign' and self.is_constant(instr.arg1):
-                # Only propagate if variable is assigned once (not a loop variable)
-                if assignment_count.get(instr.result, 0) == 1:
-                    constants[instr.result] = instr.arg1
-                optimized.append(instr)
-            # Replace variable references with constants where possible
-            elif instr.op in ['add', 'sub', 'mul', 'div', 'eq', 'neq', 'gt', 'lt', 'gte', 'lte']:
-                arg1 = constants.get(instr.arg1, instr.arg1)
-                arg2 = constants.get(instr.arg2, instr.arg2)
-                if arg1 != instr.arg1 or arg2 != instr.arg2:
-                    from intermediate_code import TACInstruction
-                    optimized.append(TACInstruction(instr.op, arg1, arg2, instr.result))
-                    if arg1 != instr.arg1:
-                        self.optimizations_applied.append(f"Constant propagation: {instr.arg1} -> {arg1}")
-                    if arg2 != instr.arg2:
-                        self.optimizations_applied.append(f"Constant propagation: {instr.arg2} -> {arg2}")
-                else:
-                    optimized.append(instr)
+        return join_functions(functions)
+    
+    def branch_folding(self, instructions):
+        """Resolve branches on constants and remove the blocks no longer reached"""
+        functions = split_functions(instructions)
+        for function in functions:
+            cfg = ControlFlowGraph(function.instructions)
+            if not self.fold_branches(cfg):
+                continue
+            cfg.compute_edges()
+            cfg.compute_dominators()
+            self.remove_unreachable_blocks(cfg)
+            function.instructions = cfg.instructions()
+        return join_functions(functions)
+    
+    def fold_branches(self, cfg):
+        """Turn IF_TRUE/IF_FALSE on a known condition into GOTO or nothing"""
+        changed = False
+        for block in cfg.blocks:
+            term = block.terminator()
+            if term is None or term.op not in BRANCH_OPS:
+                continue
+            # A condition set to a constant earlier in the same block is known too
+            condition = term.arg1
+            for instr in reversed(block.instructions[:-1]):
+                if condition in defs(instr):
+                    if instr.op == 'assign' and self.is_constant(instr.arg1):
+                        condition = instr.arg1
+                    break
+            if not self.is_constant(condition):
+                continue
+            
+            taken = (float(condition) != 0) == (term.op == 'if_true')
+            if taken:
+                block.instructions[-1] = TACInstruction('goto', None, None, term.result)
+                self.optimizations_applied.append(f"Branch folding: {term.op} {term.arg1} -> goto {term.result}")
             else:
-                optimized.append(instr)
+                block.instructions.pop()
+                self.optimizations_applied.append(f"Branch folding: {term.op} {term.arg1} never jumps")
+            changed = True
+        return changed
+    
+    def remove_unreachable_blocks(self, cfg):
+        """Delete blocks the entry cannot reach, and jumps to the next block"""
+        reachable = [block for block in cfg.blocks if cfg.is_reachable(block)]
+        for block in cfg.blocks:
+            if not cfg.is_reachable(block):
+                removed = len(block.instructions) + (1 if block.label else 0)
+                self.optimizations_applied.append(
+                    f"Unreachable code elimination: Removed {block.label or 'block'} ({removed} instructions)")
+        cfg.blocks = reachable
         
-        return optimized
+        for index, block in enumerate(cfg.blocks[:-1]):
+            term = block.terminator()
+            if term is not None and term.op == 'goto' and term.result == cfg.blocks[index + 1].label:
+                block.instructions.pop()
+        cfg.compute_edges()
+    
+    def local_value_numbering(self, instructions):
+        """Reuse values already computed earlier in the same basic block"""
+        return self.value_numbering(instructions, dominator_scope=False)
+    
+    def global_cse(self, instructions):
+        """Reuse values computed in dominating blocks (dominator-tree value numbering)"""
+        return self.value_numbering(instructions, dominator_scope=True)
+    
+    def value_numbering(self, instructions, dominator_scope):
+        """Eliminate common subexpressions on the SSA form of each function"""
+        functions = split_functions(instructions)
+        effects = EffectAnalysis(functions, self.externals)
+        supply = NameSupply(instructions)
+        allocator = TempAllocator(functions)
+        
+        for function in functions:
+            # Only private temporaries hold reused values, so user variables keep
+            # one live version each and SSA destruction needs no extra copies
+            holders = allocator.allocatable(function)
+            cfg = SSABuilder(effects).build(function)
+            self.number_values(cfg, holders, dominator_scope)
+            function.instructions = SSADestructor(supply).destruct(cfg)
+        
+        return join_functions(functions)
+    
+    def number_values(self, cfg, holders, dominator_scope):
+        """Replace recomputed expressions with a copy of the temporary holding the value"""
+        # Reassignment and scale create new SSA versions, so a stale value never matches
+        numbers = {}  # SSA name -> name whose value it copies
+        available = {}  # expression -> temporary holding its value
+        
+        def number(name):
+            return numbers.get(name, name)
+        
+        def number_block(block):
+            added = []
+            for phi in block.phis:
+                values = set(number(value) for value in phi.arg1.values())
+                if len(values) == 1:
+                    numbers[phi.result] = values.pop()
+            
+            for instr in block.instructions:
+                if instr.op == 'assign' and is_variable(instr.arg1):
+                    numbers[instr.result] = number(instr.arg1)
+                    continue
+                key = self.expression_key(instr, number)
+                if key is None:
+                    continue
+                if key in available:
+                    holder = available[key]
+                    self.optimizations_applied.append(
+                        f"Common subexpression: {base_name(instr.result)} reuses {base_name(holder)}")
+                    instr.op, instr.arg1, instr.arg2 = 'assign', holder, None
+                    numbers[instr.result] = holder
+                elif base_name(instr.result) in holders:
+                    available[key] = instr.result
+                    added.append(key)
+            return added
+        
+        if not dominator_scope:
+            for block in cfg.rpo:
+                number_block(block)
+                available.clear()
+            return
+        
+        # Expressions stay available in the blocks a definition dominates
+        work = [(cfg.entry, None)]
+        while work:
+            block, added = work.pop()
+            if added is not None:
+                for key in added:
+                    del available[key]
+                continue
+            work.append((block, number_block(block)))
+            for child in reversed(cfg.dom_children[block.id]):
+                work.append((child, None))
+    
+    def expression_key(self, instr, number):
+        """Hashable form of a pure computation, or None"""
+        if instr.op in BINARY_OPS:
+            arg1, arg2 = number(instr.arg1), number(instr.arg2)
+            if instr.op in COMMUTATIVE_OPS:
+                arg1, arg2 = sorted([arg1, arg2])
+            return (instr.op, arg1, arg2)
+        if instr.op == 'assign' and unit_reference(instr.arg1):
+            reference, unit = instr.arg1.split(None, 1)
+            return ('unit', number(reference), unit)
+        return None
+    
+    def loop_invariant_code_motion(self, instructions):
+        """Hoist invariant computations out of loops into preheaders (on SSA form)"""
+        functions = split_functions(instructions)
+        effects = EffectAnalysis(functions, self.externals)
+        supply = NameSupply(instructions)
+        allocator = TempAllocator(functions)
+        provenance = ValueProvenance(functions, self.library)
+        
+        for function in functions:
+            cfg = SSABuilder(effects).build(function)
+            motion = LoopInvariantMotion(self, supply, provenance, function.name)
+            for header, instr in motion.run(cfg, allocator.allocatable(function)):
+                self.optimizations_applied.append(
+                    f"Loop-invariant code motion: {base_name(instr.result)} computed once before loop {header}")
+            function.instructions = SSADestructor(supply).destruct(cfg)
+        
+        return join_functions(functions)
+    
+    def inline_recipes(self, instructions):
+        """Replace calls of small, non-recursive recipes with their bodies"""
+        functions = split_functions(instructions)
+        inliner = RecipeInliner(functions, NameSupply(instructions), self.library)
+        functions = inliner.run()
+        for name, count in inliner.inlined:
+            self.optimizations_applied.append(f"Inlining: recipe {name} inlined at {count} call site(s)")
+        return join_functions(functions)
+    
+    def induction_variables(self, instructions):
+        """Evaluate pure repeat loops and simplify induction variables in the rest"""
+        functions = split_functions(instructions)
+        inductions = InductionVariables(self, NameSupply(instructions))
+        for function in functions:
+            function.instructions = inductions.run(function.instructions)
+        
+        for label, trips in inductions.evaluated:
+            self.optimizations_applied.append(f"Induction variables: loop {label} ({trips} iterations) replaced by its result")
+        for label, name in inductions.sunk:
+            self.optimizations_applied.append(f"Induction variables: final value of {name} computed outside loop {label}")
+        for label, multiplication in inductions.reduced:
+            self.optimizations_applied.append(f"Strength reduction: {multiplication} in loop {label} replaced by an addition")
+        return join_functions(functions)
+    
+    def loop_fusion(self, instructions):
+        """Merge adjacent repeat loops with the same trip count"""
+        functions = split_functions(instructions)
+        fusion = LoopFusion(self, NameSupply(instructions), ValueProvenance(functions, self.library))
+        for function in functions:
+            function.instructions = fusion.run(function.instructions, function.name)
+        
+        for first, second, trips in fusion.fused:
+            self.optimizations_applied.append(f"Loop fusion: loop {second} merged into loop {first} ({trips} iterations)")
+        return join_functions(functions)
+    
+    def loop_unrolling(self, instructions):
+        """Unroll repeat loops fully or by a factor, within a code-size budget"""
+        functions = split_functions(instructions)
+        supply = NameSupply(instructions)
+        
+        for function in functions:
+            unroller = LoopUnroller(self, supply)
+            function.instructions = unroller.run(function.instructions)
+            for label, trips, factor in unroller.unrolled:
+                if factor is None:
+                    self.optimizations_applied.append(
+                        f"Loop unrolling: loop {label} fully unrolled ({trips} iterations)")
+                else:
+                    self.optimizations_applied.append(
+                        f"Loop unrolling: loop {label} unrolled by {factor} ({trips} iterations)")
+        
+        return join_functions(functions)
+    
+    def coalesce_temporaries(self, instructions):
+        """Let expressions write straight into the variable their temporary is copied to"""
+        functions = split_functions(instructions)
+        allocator = TempAllocator(functions)
+        
+        for function in functions:
+            temps = allocator.allocatable(function)
+            if not temps:
+                continue
+            cfg = ControlFlowGraph(function.instructions)
+            _, live_out = liveness(cfg)
+            for block in cfg.blocks:
+                while self.coalesce_block(block, live_out[block.id], temps):
+                    pass
+            function.instructions = cfg.instructions()
+        
+        return join_functions(functions)
+    
+    def coalesce_block(self, block, live_out, temps):
+        """Merge one temporary into the assignment that consumes it; False if none"""
+        instructions = block.instructions
+        live_after = [None] * len(instructions)
+        live = set(live_out)
+        for index in range(len(instructions) - 1, -1, -1):
+            live_after[index] = set(live)
+            live -= set(defs(instructions[index]))
+            live |= set(uses(instructions[index]))
+        
+        for index, consumer in enumerate(instructions):
+            # "x = tN" or "x = tN unit", where tN dies here
+            if consumer.op != 'assign':
+                continue
+            source = consumer.arg1 if is_variable(consumer.arg1) else unit_reference(consumer.arg1)
+            target = consumer.result
+            if source not in temps or source == target or source in live_after[index]:
+                continue
+            
+            for position in range(index - 1, -1, -1):
+                instr = instructions[position]
+                if source in defs(instr):
+                    if instr.op not in PURE_OPS and instr.op != 'call':
+                        break
+                    # tN = expr; x = tN          ->  x = expr
+                    # tN = expr; x = tN unit     ->  x = expr; x = x unit
+                    instr.result = target
+                    if consumer.arg1 == source:
+                        del instructions[index]
+                    else:
+                        consumer.arg1 = f"{target} {consumer.arg1.split(None, 1)[1]}"
+                    self.optimizations_applied.append(f"Coalescing: {source} into {target}")
+                    return True
+                # Moving the write of target earlier must not be observable
+                if (source in uses(instr) or target in uses(instr) or target in defs(instr)
+                        or instr.op == 'call'):
+                    break
+        return False
+    
+    def copy_propagation(self, instructions):
+        """Read the original variable instead of a copy of it (within basic blocks)"""
+        functions = split_functions(instructions)
+        
+        for function in functions:
+            cfg = ControlFlowGraph(function.instructions)
+            for block in cfg.blocks:
+                self.propagate_block_copies(block)
+            function.instructions = cfg.instructions()
+        
+        return join_functions(functions)
+    
+    def propagate_block_copies(self, block):
+        """Forward pass replacing uses through chains of "x = y" copies"""
+        copies = {}  # copy -> variable it holds the value of
+        
+        def original(name):
+            if name in copies:
+                self.optimizations_applied.append(f"Copy propagation: {name} -> {copies[name]}")
+                return copies[name]
+            return name
+        
+        for instr in block.instructions:
+            # display/scale/input refer to the variable by name, not just its value
+            if instr.op not in NAMED_OPS:
+                replace_uses(instr, original)
+            for name in defs(instr):
+                copies = {copy: value for copy, value in copies.items() if name not in (copy, value)}
+            # A temporary copied into a named variable is left for coalescing to merge
+            if (instr.op == 'assign' and is_variable(instr.arg1) and instr.arg1 != instr.result
+                    and (TEMP_PATTERN.match(instr.result) or not TEMP_PATTERN.match(instr.arg1))):
+                copies[instr.result] = instr.arg1
     
     def dead_code_elimination(self, instructions):
-        """Remove unused variable assignments"""
-        # Build use-def chains
-        used_vars = set()
+        """Remove computations whose results are never read (CFG liveness)"""
+        functions = split_functions(instructions)
+        effects = EffectAnalysis(functions, self.externals)
+        provenance = ValueProvenance(functions, self.library)
         
-        # First pass: find all used variables (including in assign operations)
-        for instr in instructions:
-            if instr.op in ['add', 'sub', 'mul', 'div', 'eq', 'neq', 'gt', 'lt', 'gte', 'lte']:
-                if instr.arg1 and not self.is_constant(instr.arg1):
-                    used_vars.add(instr.arg1)
-                if instr.arg2 and not self.is_constant(instr.arg2):
-                    used_vars.add(instr.arg2)
-            elif instr.op == 'assign':
-                # Check if the assigned value references a variable
-                if instr.arg1 and not self.is_constant(instr.arg1):
-                    used_vars.add(instr.arg1)
-                # Also check if result is used (mark as used for now)
-                if not instr.result.startswith('t'):
-                    used_vars.add(instr.result)
-            elif instr.op in ['display', 'return', 'if_false', 'if_true', 'wait', 'scale']:
-                if instr.arg1 and not self.is_constant(instr.arg1):
-                    used_vars.add(instr.arg1)
-            elif instr.op == 'param':
-                if instr.arg1 and not self.is_constant(instr.arg1):
-                    used_vars.add(instr.arg1)
-        
-        # Second pass: remove assignments to unused temp variables
-        optimized = []
-        for instr in instructions:
-            # Only remove temp variable assignments that are never used AND not assigned from another variable
-            if (instr.op == 'assign' and 
-                instr.result.startswith('t') and 
-                instr.result not in used_vars and
-                self.is_constant(instr.arg1)):
-                self.optimizations_applied.append(f"Dead code elimination: Removed unused {instr.result}")
-            else:
-                optimized.append(instr)
+        for function in functions:
+            function.instructions = self.eliminate_dead_code(function, effects, provenance)
         
-        return optimized
+        return join_functions(functions)
+    
+    def eliminate_dead_code(self, function, effects, provenance=None):
+        """Delete dead pure instructions of one function until none remain"""
+        cfg = ControlFlowGraph(function.instructions)
+        cfg.compute_dominators()
+        # Calls read variables by name at runtime
+        effects.mark_effects(cfg, function)
+        
+        changed = True
+        while changed:
+            changed = False
+            _, live_out = liveness(cfg)
+            for block in cfg.blocks:
+                live = set(live_out[block.id])
+                kept = []
+                for instr in reversed(block.instructions):
+                    if self.is_removable(instr, provenance, function.name) and not set(defs(instr)) & live:
+                        self.optimizations_applied.append(f"Dead code elimination: Removed unused {instr.result}")
+                        changed = True
+                        continue
+                    live -= set(defs(instr))
+                    live |= set(uses(instr))
+                    kept.append(instr)
+                block.instructions = list(reversed(kept))
+        
+        for block in cfg.blocks:
+            block.instructions = [instr for instr in block.instructions if instr.op != 'use']
+        return cfg.instructions()
+    
+    def can_fail(self, instr, provenance=None, function_name=None):
+        """Check if an instruction may raise a runtime error when it runs"""
+        if provenance is not None:
+            return provenance.can_fail(function_name, instr)
+        if instr.op not in BINARY_OPS or instr.op in ['eq', 'neq']:
+            return False  # Copies and equality tests accept any values
+        # Without provenance any variable may hold text read by input
+        if not (self.is_constant(instr.arg1) and self.is_constant(instr.arg2)):
+            return True
+        return instr.op == 'div' and float(instr.arg2) == 0
+    
+    def is_removable(self, instr, provenance=None, function_name=None):
+        """Check if an instruction only computes its result (no output, jumps or calls)"""
+        if instr.op not in PURE_OPS:
+            return False
+        # Runtime errors (text input in arithmetic, division by zero) must still be raised
+        return not self.can_fail(instr, provenance, function_name)
+    
+    def allocate_temporaries(self, instructions):
+        """Map temporaries onto reusable slots using live intervals"""
+        functions = split_functions(instructions)
+        allocator = TempAllocator(functions)
+        for function in functions:
+            function.instructions = allocator.allocate(function)
+        
+        if allocator.slots_after < allocator.temps_before:
+            self.optimizations_applied.append(
+                f"Temporary allocation: {allocator.temps_before} temporaries -> {allocator.slots_after} slots")
+        return join_functions(functions)
+    
+    def peephole(self, instructions):
+        """Thread jumps, clean up jump and label patterns, fuse compare-and-branch"""
+        functions = split_functions(instructions)
+        peephole = PeepholeOptimizer(functions)
+        for function in functions:
+            function.instructions = peephole.run(function)
+        
+        for count, what in [(peephole.threaded, "jumps threaded"),
+                            (peephole.jumps_removed, "jumps to the next instruction removed"),
+                            (peephole.inverted, "branches over a goto inverted"),
+                            (peephole.dead_removed, "unreachable instructions after a goto removed"),
+                            (peephole.fused, "comparisons fused into branches"),
+                            (peephole.labels_removed, "unreferenced labels removed")]:
+            if count:
+                self.optimizations_applied.append(f"Peephole: {count} {what}")
+        return join_functions(functions)
     
     def is_constant(self, value):
         """Check if value is a constant"""
@@ -135,10 +475,44 @@ class Optimizer:
         except ValueError:
             return False
     
+    def parse_number(self, value):
+        """Read a numeric constant the way the interpreter does"""
+        if isinstance(value, float):
+            return value
+        value_str = str(value)
+        return float(value_str) if '.' in value_str else int(value_str)
+    
+    def fold_binary(self, op, arg1, arg2):
+        """Result of a binary operation on constant operands, or None if it must run"""
+        units = (unit_constant(arg1), unit_constant(arg2))
+        if not all(self.is_constant(arg) or unit for arg, unit in zip((arg1, arg2), units)):
+            return None
+        try:
+            if not any(units):
+                if op in COMPARISON_OPS:
+                    return self.evaluate_comparison(op, arg1, arg2)
+                return self.evaluate_op(op, arg1, arg2)
+            # The interpreter compares "2 cups" as text for eq/neq
+            if op in ['eq', 'neq']:
+                equal = all(units) and arg1 == arg2
+                return 1 if equal == (op == 'eq') else 0
+            # Other operations use the number in front of the unit, as a float
+            if op in ['mul', 'div'] + COMPARISON_OPS:
+                val1 = float(units[0][0]) if units[0] else arg1
+                val2 = float(units[1][0]) if units[1] else arg2
+                if op in COMPARISON_OPS:
+                    return self.evaluate_comparison(op, val1, val2)
+                return self.evaluate_op(op, val1, val2)
+        except Exception:
+            pass
+        # Adding or subtracting a unit value fails (or concatenates) at runtime
+        return None
+    
     def evaluate_op(self, op, arg1, arg2):
         """Evaluate arithmetic operation"""
-        val1 = float(arg1)
-        val2 = float(arg2)
+        # Same int/float rules as at runtime, so folded values print identically
+        val1 = self.parse_number(arg1)
+        val2 = self.parse_number(arg2)
         
         if op == 'add':
             return val1 + val2
@@ -155,8 +529,8 @@ class Optimizer:
     
     def evaluate_comparison(self, op, arg1, arg2):
         """Evaluate comparison operation"""
-        val1 = float(arg1)
-        val2 = float(arg2)
+        val1 = self.parse_number(arg1)
+        val2 = self.parse_number(arg2)
         
         if op == 'eq':
             return 1 if val1 == val2 else 0
@@ -181,3 +555,5 @@ class Optimizer:
                 print(f"  - {opt}")
         else:
             print("\n=== No Optimizations Applied ===")
+        if self.pass_manager:
+            self.pass_manager.display()
@@ -10,9 +10,15 @@ class ASTNode:
     pass
 
 class Program(ASTNode):
-    def __init__(self, recipes, statements):
+    def __init__(self, recipes, statements, imports=None):
         self.recipes = recipes
         self.statements = statements
+        self.imports = imports or []
+
+class ImportDirective(ASTNode):
+    def __init__(self, path, line=0):
+        self.path = path
+        self.line = line
 
 class Declaration(ASTNode):
     def __init__(self, var_type, name, value, line=0):
@@ -142,9 +148,14 @@ class Parser:
     
     def parse(self):
         """Parse entire program"""
+        imports = []
         recipes = []
         statements = []
         
+        # Parse library imports first
+        while self.current_token and self.current_token.type == TokenType.IMPORT:
+            imports.append(self.parse_import())
+        
         # Parse recipe declarations first
         while self.current_token and self.current_token.type == TokenType.RECIPE:
             recipe = self.parse_recipe_declaration()
@@ -157,7 +168,15 @@ class Parser:
             if stmt:
                 statements.append(stmt)
         
-        return Program(recipes, statements)
+        return Program(recipes, statements, imports)
+    
+    def parse_import(self):
+        """Parse import directive: import "library.recipe";"""
+        line = self.current_token.line
+        self.expect(TokenType.IMPORT)
+        path = self.expect(TokenType.STRING).value
+        self.expect(TokenType.SEMICOLON)
+        return ImportDirective(path, line)
     
     def parse_statement(self):
         """Parse a single statement"""
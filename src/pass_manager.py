@@ -0,0 +1,134 @@
+"""
+Optimization Pass Manager for RecipeScript
+Runs the optimizer's passes as an ordered pipeline chosen by the -O level.
+
+Pipelines:
+----------
+-O0: no optimization
+-O1: local passes (folding, branch folding, value numbering within blocks,
+     copy propagation, coalescing, dead code elimination), one sweep each,
+     then the peephole pass
+-O2: folding, sparse conditional constant propagation, branch folding with
+     unreachable block removal, global common subexpression elimination,
+     loop-invariant code motion, copy propagation, coalescing and dead code
+     elimination repeated until the code stops changing (at most 4 rounds),
+     then recipe inlining and induction-variable simplification (pure repeat
+     loops evaluated, strength reduction), fusion of adjacent repeat loops,
+     the same passes again, temporary allocation and the peephole pass (jump
+     threading, label cleanup, compare-and-branch fusion)
+-O3: as -O2 with up to 10 rounds, and loop unrolling after loop fusion
+
+A pipeline is a list of stages. A stage is either a single pass that runs once
+or a group of passes repeated to a fixed point. For every pass the manager
+records how often it ran, the time it took and how the instruction count changed.
+"""
+
+import re
+import time
+
+DEFAULT_OPT_LEVEL = 2
+OPT_LEVEL_PATTERN = re.compile(r'^-O([0-3])$')
+
+# Cleanup passes repeated to a fixed point at -O2 and -O3
+SCALAR_PASSES = ['constant_folding', 'constant_propagation', 'branch_folding', 'global_cse', 'loop_invariant_code_motion',
+                 'copy_propagation', 'coalesce_temporaries', 'dead_code_elimination']
+
+# (passes, repeat to fixed point?) per stage
+PIPELINES = {
+    0: [],
+    1: [(['constant_folding', 'branch_folding', 'local_value_numbering', 'copy_propagation', 'coalesce_temporaries',
+          'dead_code_elimination'], False),
+        (['peephole'], False)],
+    2: [(SCALAR_PASSES, True),
+        (['inline_recipes', 'induction_variables', 'loop_fusion'], False),
+        (SCALAR_PASSES, True),
+        (['allocate_temporaries', 'peephole'], False)],
+    3: [(SCALAR_PASSES, True),
+        (['inline_recipes', 'induction_variables', 'loop_fusion', 'loop_unrolling'], False),
+        (SCALAR_PASSES, True),
+        (['allocate_temporaries', 'peephole'], False)],
+}
+MAX_ITERATIONS = {0: 1, 1: 1, 2: 4, 3: 10}
+
+
+def parse_opt_level(args):
+    """Split an -O0..-O3 flag out of command line arguments"""
+    level = DEFAULT_OPT_LEVEL
+    remaining = []
+    for arg in args:
+        match = OPT_LEVEL_PATTERN.match(arg)
+        if match:
+            level = int(match.group(1))
+        elif arg.startswith('-O'):
+            raise Exception(f"Invalid optimization level '{arg}' (expected -O0, -O1, -O2 or -O3)")
+        else:
+            remaining.append(arg)
+    return level, remaining
+
+
+class PassStatistics:
+    """Accumulated cost and effect of one pass"""
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.instructions_removed = 0
+        self.changed_runs = 0
+
+
+class PassManager:
+    def __init__(self, optimizer, level=DEFAULT_OPT_LEVEL):
+        if level not in PIPELINES:
+            raise Exception(f"Invalid optimization level {level} (expected 0-3)")
+        self.optimizer = optimizer
+        self.level = level
+        self.statistics = {}  # pass name -> PassStatistics, in first-run order
+        self.iterations = 0
+        self.converged = True
+
+    def run(self, instructions):
+        """Run the pipeline for the optimization level"""
+        for passes, fixed_point in PIPELINES[self.level]:
+            if not fixed_point:
+                for name in passes:
+                    instructions = self.run_pass(name, instructions)
+                continue
+
+            self.converged = False
+            for _ in range(MAX_ITERATIONS[self.level]):
+                self.iterations += 1
+                before = [str(instr) for instr in instructions]
+                for name in passes:
+                    instructions = self.run_pass(name, instructions)
+                if [str(instr) for instr in instructions] == before:
+                    self.converged = True
+                    break
+        return instructions
+
+    def run_pass(self, name, instructions):
+        """Run one pass and record its time and instruction delta"""
+        stats = self.statistics.setdefault(name, PassStatistics(name))
+        before = [str(instr) for instr in instructions]
+        start = time.perf_counter()
+        result = getattr(self.optimizer, name)(instructions)
+        stats.seconds += time.perf_counter() - start
+        stats.runs += 1
+        stats.instructions_removed += len(instructions) - len(result)
+        if [str(instr) for instr in result] != before:
+            stats.changed_runs += 1
+        return result
+
+    def display(self):
+        """Display per-pass timing and instruction-count deltas"""
+        print(f"\n=== Pass Statistics (-O{self.level}) ===")
+        if not self.statistics:
+            print("  No passes run")
+            return
+        print(f"  {'Pass':<26} {'Runs':>5} {'Changed':>8} {'Time (ms)':>10} {'Instructions':>13}")
+        for stats in self.statistics.values():
+            delta = f"{-stats.instructions_removed:+d}"
+            print(f"  {stats.name:<26} {stats.runs:>5} {stats.changed_runs:>8} "
+                  f"{stats.seconds * 1000:>10.2f} {delta:>13}")
+        if self.iterations:
+            state = "fixed point reached" if self.converged else "iteration cap reached"
+            print(f"  {self.iterations} iterations, {state}")
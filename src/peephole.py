@@ -0,0 +1,150 @@
+"""
+Peephole Optimization for RecipeScript
+Final cleanup of each function's linear TAC, run after the CFG-based passes.
+The interpreter dispatches every instruction it passes, labels included, so
+each jump or label removed here is one dispatch fewer per visit.
+
+Jump Threading:
+---------------
+Consecutive labels name the same position. A jump to a label whose first
+instruction is "goto L" jumps straight to L's final target instead.
+
+Window Patterns:
+----------------
+goto L / if_* x goto L, followed by L:             -> jump removed
+if_false x goto L1; goto L2; L1:                   -> if_true x goto L2; L1:
+goto L followed by unlabeled instructions          -> instructions removed
+t = a > b; if_false t goto L  (private t, dead)    -> ifnot_gt a, b goto L
+
+Labels that no jump refers to are removed last.
+"""
+
+from tac import TACInstruction, FUSED_BRANCH_OPS
+from cfg import ControlFlowGraph, BRANCH_OPS, COMPARISON_OPS, liveness
+from allocator import TempAllocator
+
+JUMP_OPS = ['goto'] + BRANCH_OPS + list(FUSED_BRANCH_OPS)
+INVERTED_BRANCH = {'if_true': 'if_false', 'if_false': 'if_true'}
+FUSED_OPS = {pair: op for op, pair in FUSED_BRANCH_OPS.items()}
+
+
+class PeepholeOptimizer:
+    def __init__(self, functions):
+        self.allocator = TempAllocator(functions)
+        self.threaded = 0  # Jumps retargeted
+        self.jumps_removed = 0
+        self.dead_removed = 0
+        self.inverted = 0
+        self.fused = 0
+        self.labels_removed = 0
+
+    def run(self, function):
+        """Optimize one function and return its instructions"""
+        instructions = function.instructions
+        while True:
+            before = [str(instr) for instr in instructions]
+            instructions = self.sweep(self.thread_jumps(instructions))
+            if [str(instr) for instr in instructions] == before:
+                break
+        instructions = self.fuse_comparisons(instructions, self.allocator.allocatable(function))
+        return self.remove_unreferenced_labels(instructions)
+
+    def thread_jumps(self, instructions):
+        """Retarget jumps to the final destination of their label"""
+        runs = {}  # label -> (first label of its run, position after the run)
+        position = 0
+        while position < len(instructions):
+            if instructions[position].op != 'label':
+                position += 1
+                continue
+            start = position
+            while position < len(instructions) and instructions[position].op == 'label':
+                position += 1
+            for instr in instructions[start:position]:
+                runs[instr.result] = (instructions[start].result, position)
+
+        def destination(label):
+            seen = set()
+            while label in runs and label not in seen:
+                seen.add(label)
+                first, after = runs[label]
+                if after < len(instructions) and instructions[after].op == 'goto':
+                    label = instructions[after].result
+                else:
+                    return first
+            return label
+
+        threaded = []
+        for instr in instructions:
+            if instr.op in JUMP_OPS:
+                target = destination(instr.result)
+                if target != instr.result:
+                    self.threaded += 1
+                    instr = TACInstruction(instr.op, instr.arg1, instr.arg2, target)
+            threaded.append(instr)
+        return threaded
+
+    def labels_at(self, instructions, position):
+        """Labels starting at position (the labels of the next instruction)"""
+        labels = set()
+        while position < len(instructions) and instructions[position].op == 'label':
+            labels.add(instructions[position].result)
+            position += 1
+        return labels
+
+    def sweep(self, instructions):
+        """One pass of the sliding window over the instructions"""
+        result = []
+        position = 0
+        while position < len(instructions):
+            instr = instructions[position]
+            position += 1
+
+            # A jump (or branch) to the very next position does nothing
+            if instr.op in ['goto'] + BRANCH_OPS and instr.result in self.labels_at(instructions, position):
+                self.jumps_removed += 1
+                continue
+
+            # Branch over a goto: branch on the opposite condition instead
+            if (instr.op in BRANCH_OPS and position < len(instructions)
+                    and instructions[position].op == 'goto'
+                    and instr.result in self.labels_at(instructions, position + 1)):
+                target = instructions[position].result
+                result.append(TACInstruction(INVERTED_BRANCH[instr.op], instr.arg1, None, target))
+                self.inverted += 1
+                position += 1
+                continue
+
+            result.append(instr)
+
+            # Nothing reaches the instructions between a goto and the next label
+            if instr.op == 'goto':
+                while position < len(instructions) and instructions[position].op != 'label':
+                    self.dead_removed += 1
+                    position += 1
+        return result
+
+    def fuse_comparisons(self, instructions, private):
+        """Merge a comparison into the branch that is its only use"""
+        cfg = ControlFlowGraph(instructions)
+        _, live_out = liveness(cfg)
+        changed = False
+        for block in cfg.blocks:
+            if len(block.instructions) < 2:
+                continue
+            compare, branch = block.instructions[-2:]
+            if (branch.op in BRANCH_OPS and compare.op in COMPARISON_OPS
+                    and compare.result == branch.arg1 and compare.result in private
+                    and compare.result not in live_out[block.id]):
+                fused = FUSED_OPS[(branch.op, compare.op)]
+                block.instructions[-2:] = [TACInstruction(fused, compare.arg1, compare.arg2, branch.result)]
+                self.fused += 1
+                changed = True
+        return cfg.instructions() if changed else instructions
+
+    def remove_unreferenced_labels(self, instructions):
+        """Drop labels that no jump targets"""
+        targets = set(instr.result for instr in instructions if instr.op in JUMP_OPS)
+        kept = [instr for instr in instructions if instr.op != 'label' or instr.result in targets]
+        self.labels_removed += len(instructions) - len(kept)
+        return kept
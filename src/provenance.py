@@ -0,0 +1,229 @@
+"""
+Value Provenance for RecipeScript
+Finds, for every variable of a program, which kinds of value it may hold at
+runtime, so the optimizer knows which arithmetic can raise an error.
+
+Kinds:
+------
+number  an int or float (numeric literals, counters, arithmetic results)
+unit    a "number unit" string ("2 cups", "t3 ml" with a numeric t3)
+text    any other value: whatever input reads (kept as text unless it
+        parses as a number), quoted literals, names read before they are set
+
+Origins:
+--------
+1. Literals have their own kind; a copy has the kinds of its source.
+2. INPUT may give a number or text.
+3. Parameters have the kinds of the arguments at every call site; call
+   results have the kinds the recipe returns. Recipes of a library unit may
+   be called with anything, and recipes of other units may return anything.
+4. A name read before it is set reads as its own name (text). A recipe reads
+   a name it has not set from the main program, which may not have set it
+   yet either.
+The analysis is flow-insensitive per function and iterates to a fixed point.
+
+Failures:
+---------
+eq/neq never fail. mul, div and ordering comparisons use the number in
+front of a unit, so only text can make them fail, and text times a small
+integer literal repeats it; add needs two numbers or two strings, sub two
+numbers. A division fails unless it divides by a
+non-zero numeric literal.
+
+Example:
+    provenance = ValueProvenance(split_functions(instructions))
+    provenance.can_fail(None, instr)  # instr of the main program
+"""
+
+from cfg import ControlFlowGraph, BINARY_OPS, is_variable, unit_reference, unit_constant, base_name, defs, liveness
+from effects import parameters
+
+NUMBER = 'number'
+UNIT = 'unit'
+TEXT = 'text'
+ANY = frozenset([NUMBER, UNIT, TEXT])
+INPUT_KINDS = frozenset([NUMBER, TEXT])
+REPEAT_LIMIT = 1000  # Largest integer literal text may be multiplied by without failing
+
+
+def literal_kind(operand):
+    """Kind of a constant operand, or None for a variable or unit reference"""
+    text = str(operand)
+    if is_variable(text):
+        return None
+    if text.startswith('"') and text.endswith('"'):
+        return TEXT
+    try:
+        float(text)
+        return NUMBER
+    except ValueError:
+        pass
+    if unit_constant(text):
+        return UNIT
+    return None
+
+
+def small_integer(operand):
+    """Check if an operand is an integer literal text can be repeated by"""
+    text = str(operand)
+    if '.' in text or is_variable(text):
+        return False
+    try:
+        return abs(int(text)) <= REPEAT_LIMIT
+    except ValueError:
+        return False
+
+
+def exposed_names(function):
+    """Base names a function may read before it sets them"""
+    if not function.instructions:
+        return set()
+    cfg = ControlFlowGraph(function.instructions)
+    live_in, _ = liveness(cfg)
+    return set(base_name(name) for name in live_in[cfg.blocks[0].id]) - set(parameters(function))
+
+
+class ValueProvenance:
+    def __init__(self, functions, library=False):
+        self.functions = {function.name: function for function in functions}
+        self.kinds = {name: {} for name in self.functions}  # function -> variable -> kinds
+        self.returns = {name: set() for name in self.functions if name is not None}
+        self.frames = {}  # recipe -> names its frame binds
+        self.exposed = {}  # function -> names it may read before setting them
+        for function in functions:
+            self.exposed[function.name] = exposed_names(function)
+            names = set(parameters(function))
+            for instr in function.instructions:
+                names.update(base_name(name) for name in defs(instr))
+            self.frames[function.name] = names
+            if library:
+                for param in parameters(function):
+                    self.kinds[function.name][param] = set(ANY)
+        self.frames.setdefault(None, set())
+        self.kinds.setdefault(None, {})
+        self.analyze()
+
+    def analyze(self):
+        """Propagate kinds through every function until nothing changes"""
+        changed = True
+        while changed:
+            changed = False
+            for function in self.functions.values():
+                changed |= self.visit(function)
+
+    def visit(self, function):
+        """Apply one function's instructions once; True if a kind was added"""
+        name = function.name
+        changed = False
+        pushed = []
+        for instr in function.instructions:
+            if instr.op == 'param':
+                pushed.append(self.operand_kinds(name, instr.arg1))
+            elif instr.op == 'call':
+                count = instr.arg2 or 0
+                args = pushed[len(pushed) - count:] if count else []
+                del pushed[len(pushed) - count:]
+                callee = self.functions.get(instr.arg1)
+                if callee is None or callee.name is None:
+                    changed |= self.add(name, instr.result, ANY)
+                    continue
+                for param, kinds in zip(parameters(callee), args):
+                    changed |= self.add(callee.name, param, kinds)
+                changed |= self.add(name, instr.result, self.returns[callee.name])
+            elif instr.op == 'return' and name is not None:
+                kinds = self.operand_kinds(name, instr.arg1) if instr.arg1 is not None else {NUMBER}
+                if not kinds <= self.returns[name]:
+                    self.returns[name] |= kinds
+                    changed = True
+            elif instr.op == 'input':
+                changed |= self.add(name, instr.result, INPUT_KINDS)
+            elif instr.op == 'assign':
+                changed |= self.add(name, instr.result, self.assign_kinds(name, instr.arg1))
+            elif instr.op in BINARY_OPS:
+                kinds = self.result_kinds(instr.op, self.operand_kinds(name, instr.arg1),
+                                          self.operand_kinds(name, instr.arg2))
+                changed |= self.add(name, instr.result, kinds)
+            elif instr.op == 'scale':
+                # Text that starts with a number becomes a number or unit value
+                variable = instr.result or instr.arg1
+                kinds = self.operand_kinds(name, instr.arg1)
+                changed |= self.add(name, variable, kinds | ({NUMBER, UNIT} if TEXT in kinds else set()))
+            else:
+                for variable in defs(instr):
+                    changed |= self.add(name, variable, ANY)
+        if name is not None and NUMBER not in self.returns[name]:
+            # Falling off the end of a recipe returns 0
+            self.returns[name].add(NUMBER)
+            changed = True
+        return changed
+
+    def add(self, function_name, name, kinds):
+        """Add kinds to what a variable may hold; True if any were new"""
+        known = self.kinds[function_name].setdefault(base_name(name), set())
+        if kinds <= known:
+            return False
+        known |= kinds
+        return True
+
+    def operand_kinds(self, function_name, operand):
+        """Kinds an operand of an instruction may have when read in a function"""
+        kind = literal_kind(operand)
+        if kind is not None:
+            return {kind}
+        if not is_variable(operand):
+            return {TEXT}  # Only ASSIGN resolves unit references
+        name = base_name(operand)
+        if function_name not in self.kinds or name not in self.frames[function_name]:
+            return self.unset_kinds(function_name, name)
+        kinds = set(self.kinds[function_name].get(name, set()))
+        if name in self.exposed[function_name]:
+            kinds |= self.unset_kinds(function_name, name)
+        return kinds
+
+    def unset_kinds(self, function_name, name):
+        """Kinds of a name a function reads before setting it"""
+        # An unset name reads as itself; a recipe first falls back to the main
+        # program's value, which may not be set when the recipe is called
+        kinds = {TEXT}
+        if function_name is not None:
+            kinds |= self.kinds[None].get(name, set())
+        return kinds
+
+    def assign_kinds(self, function_name, source):
+        """Kinds of the value an ASSIGN stores"""
+        kind = literal_kind(source)
+        if kind is not None:
+            return {kind}
+        reference = unit_reference(source)
+        if reference is None:
+            return self.operand_kinds(function_name, source) if is_variable(source) else {TEXT}
+        # "t3 ml" is a unit value when t3 holds a number
+        return {UNIT} if self.operand_kinds(function_name, reference) <= {NUMBER} else {UNIT, TEXT}
+
+    def result_kinds(self, op, kinds1, kinds2):
+        """Kinds an operation may produce when it does not fail"""
+        if op == 'add':
+            result = set()
+            if NUMBER in kinds1 and NUMBER in kinds2:
+                result.add(NUMBER)
+            if kinds1 - {NUMBER} and kinds2 - {NUMBER}:
+                result.add(TEXT)  # String concatenation
+            return result
+        if op == 'mul' and TEXT in kinds1 | kinds2:
+            return {NUMBER, TEXT}  # Text times an int repeats it
+        return {NUMBER}
+
+    def can_fail(self, function_name, instr):
+        """Check if an instruction of a function may raise a runtime error"""
+        if instr.op not in BINARY_OPS or instr.op in ['eq', 'neq']:
+            return False
+        kinds = self.operand_kinds(function_name, instr.arg1) | self.operand_kinds(function_name, instr.arg2)
+        if instr.op == 'div' and not (literal_kind(instr.arg2) == NUMBER and float(instr.arg2) != 0):
+            return True  # The divisor may be zero
+        if instr.op == 'add':
+            return not (kinds <= {NUMBER} or kinds <= {UNIT, TEXT})
+        if instr.op == 'sub':
+            return not kinds <= {NUMBER}
+        if instr.op == 'mul' and (small_integer(instr.arg1) or small_integer(instr.arg2)):
+            return False  # Text times an int repeats it
+        return TEXT in kinds
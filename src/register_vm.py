@@ -0,0 +1,177 @@
+"""
+Register VM for RecipeScript
+Runs TAC like the interpreter in code_generator.py, but keeps variables in
+integer-indexed slots instead of dictionaries keyed by name.
+
+Slots:
+------
+1. REGISTERS: every main-program variable (and every name a recipe may read
+   from the main program) is given an index into one flat list when the
+   program is decoded. Slots start out UNSET, so an unset name still reads
+   as itself and displays as "(not set)".
+
+2. FRAMES: each recipe has a slot layout of its own, parameters first and
+   then every variable it writes. A call allocates a list of that size with
+   the arguments in front; a frame slot that is still UNSET is read from the
+   main program's register of the same name, as with dictionary frames.
+
+3. HANDLERS: instructions are decoded by the interpreter's decoders; a
+   result is stored under its slot index and operands are read with the
+   index resolved, so no name is hashed while the program runs. Names are
+   only looked up for display, scale and values that refer to a variable at
+   runtime ("t3 cups"), through the running frame's slot map.
+
+Output, including display and serve formatting, is the interpreter's.
+
+Example:
+    vm = RegisterVM()
+    vm.execute(instructions)
+"""
+
+from cfg import defs
+from code_generator import VerifiedCodeGenerator, Frame, UNSET, MAX_CALL_DEPTH, MEMO_CACHE_SIZE, typed_values
+
+REGISTER_VM_FLAG = '--register-vm'  # Command line option selecting this backend
+
+
+def parse_backend(args):
+    """Split the --register-vm flag out of command line arguments"""
+    remaining = [arg for arg in args if arg != REGISTER_VM_FLAG]
+    return len(remaining) != len(args), remaining
+
+
+class RegisterFrame(Frame):
+    """Activation record whose variables are a list of slots"""
+    def __init__(self, variables, slots, return_pc, result, memo_key=None):
+        super().__init__(variables, return_pc, result, memo_key)
+        self.slots = slots  # Variable name -> index in variables
+
+
+class RegisterVM(VerifiedCodeGenerator):
+    """Verified interpreter with slot-indexed registers and frames"""
+
+    def __init__(self):
+        super().__init__()
+        self.registers = []  # Main-program variable values by slot
+        self.global_slots = {}  # Main-program variable name -> register index
+        self.frame_slots = None  # Slot map of the running recipe (None in the main program)
+        self.recipe_slots = {}  # Recipe -> slot map of its frame
+        self.frame_layouts = {}  # Body start -> (slot map, parameter count, frame size)
+        self.pure_slots = {}  # Pure recipe -> registers its result may depend on
+        self.variables = self.registers
+
+    def execute(self, instructions, labels=None, recipes=None):
+        """Execute TAC instructions, then name the main-program values"""
+        output = super().execute(instructions, labels, recipes)
+        self.globals = {name: self.registers[index] for name, index in self.global_slots.items()
+                        if self.registers[index] is not UNSET}
+        return output
+
+    def decode(self, layout):
+        """Assign slots while decoding, then fix every recipe's frame layout"""
+        self.pure_slots = {name: [self.global_slot(read) for read in reads]
+                           for name, reads in self.pure_reads.items()}
+        code = super().decode(layout)
+        for recipe_name, (start, end) in self.extents.items():
+            slots = self.recipe_slots[recipe_name]
+            self.frame_layouts[start] = (slots, len(self.params[recipe_name]), len(slots))
+        return code
+
+    def frame_names(self, recipe_name, body):
+        """Slot map of a recipe's frame: parameters first, then the variables it writes"""
+        slots = {}
+        for name in self.params[recipe_name]:
+            slots.setdefault(name, len(slots))
+        for instr in body:
+            for name in defs(instr):
+                slots.setdefault(name, len(slots))
+        self.recipe_slots[recipe_name] = slots
+        return slots
+
+    def global_slot(self, name):
+        """Register index of a main-program variable (allocated on first use)"""
+        if name not in self.global_slots:
+            self.global_slots[name] = len(self.registers)
+            self.registers.append(UNSET)
+        return self.global_slots[name]
+
+    def variable_key(self, name):
+        """Slot a handler stores a variable in: frame slot in a recipe, else register"""
+        if self.decoding_frame is None:
+            return self.global_slot(name)
+        return self.decoding_frame.setdefault(name, len(self.decoding_frame))
+
+    def variable_reader(self, name, default):
+        """Function reading a variable's slot, falling back to the main program's register"""
+        registers, index = self.registers, self.global_slot(name)
+        if self.decoding_frame is None or name not in self.decoding_frame:
+            # Main code, or a name the recipe never binds
+            def read_register():
+                value = registers[index]
+                return default if value is UNSET else value
+            return read_register
+
+        slot = self.decoding_frame[name]
+
+        def read_frame_slot():
+            value = self.variables[slot]
+            if value is UNSET:
+                value = registers[index]
+                if value is UNSET:
+                    return default
+            return value
+        return read_frame_slot
+
+    def lookup(self, name):
+        """Value of a variable from the running frame or the main program (UNSET if neither)"""
+        slots = self.frame_slots
+        if slots is not None and name in slots:
+            value = self.variables[slots[name]]
+            if value is not UNSET:
+                return value
+        index = self.global_slots.get(name)
+        return UNSET if index is None else self.registers[index]
+
+    def push_frame(self, start, params, args, result, memo_key=None):
+        """Enter a recipe: a new slot list with the arguments in the parameter slots"""
+        if len(self.call_stack) >= MAX_CALL_DEPTH:
+            raise Exception(f"Runtime Error: Recipe calls nested more than {MAX_CALL_DEPTH} deep")
+        slots, param_count, size = self.frame_layouts[start]
+        variables = args[:param_count]
+        variables.extend([UNSET] * (size - len(variables)))
+        frame = RegisterFrame(variables, slots, self.pc, result, memo_key)
+        self.call_stack.append(frame)
+        self.variables = variables
+        self.frame_slots = slots
+        self.pc = start - 1  # -1 because pc will be incremented
+
+    def return_from_recipe(self, value):
+        """Leave the running recipe: pop its frame and store value in the caller's slot"""
+        if not self.call_stack:
+            return  # RETURN outside a recipe does nothing
+        frame = self.call_stack.pop()
+        if self.call_stack:
+            self.variables = self.call_stack[-1].variables
+            self.frame_slots = self.call_stack[-1].slots
+        else:
+            self.variables = self.registers
+            self.frame_slots = None
+        self.pc = frame.return_pc
+        if value is None:
+            value = 0
+        self.variables[frame.result] = value
+        if frame.memo_key is not None:
+            self.memo[frame.memo_key] = value
+            if len(self.memo) > MEMO_CACHE_SIZE:
+                self.memo.popitem(last=False)
+
+    def memo_key(self, recipe_name, args):
+        """Memo key of a pure recipe call from the registers it reads"""
+        registers = self.registers
+        values = (registers[index] for index in self.pure_slots[recipe_name])
+        key = (recipe_name, typed_values(args), typed_values(values))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
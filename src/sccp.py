@@ -0,0 +1,252 @@
+"""
+Sparse Conditional Constant Propagation for RecipeScript
+Wegman and Zadeck's algorithm on the SSA form of one function: finds the
+variables that hold the same constant on every path the program can take,
+together with the control-flow edges it can never take.
+
+Lattice:
+--------
+TOP       no executable definition seen yet (optimistic: may still be anything)
+constant  a number or a "number unit" value, written as in TAC
+BOTTOM    may hold different values at runtime (input, calls, loop counters)
+Values only move down, TOP -> constant -> BOTTOM, so the analysis ends.
+Function parameters and variables read before any definition are BOTTOM.
+
+Algorithm:
+----------
+1. Only the edge into the entry block is executable; every value is TOP.
+2. FLOW WORKLIST: when an edge becomes executable the phis of its target are
+   evaluated again, and the first time a block is reached its instructions
+   are evaluated.
+3. SSA WORKLIST: when a value moves down, the phis and instructions that
+   read it are evaluated again (in blocks already reached).
+4. A phi meets only the values arriving over executable edges, and a branch
+   only makes the successors its condition allows executable:
+   TOP -> none yet, constant -> the one it selects, BOTTOM -> both.
+Arithmetic and comparisons are evaluated with the optimizer's folding rules,
+so values with units behave as they do at runtime.
+
+Rewriting:
+----------
+Constant operands of copies, arithmetic, comparisons and branches are replaced
+by their values ("t3 ml" with t3 = 300 becomes "300 ml"). Unit values are only
+substituted where the operation then folds, since anything else keeps them as
+text. Constant folding and branch folding finish the job: branches on constant
+conditions are resolved and the blocks found unreachable here are removed.
+"""
+
+from tac import FUSED_BRANCH_OPS
+from cfg import BINARY_OPS, BRANCH_OPS, is_variable, unit_reference, unit_constant, uses, defs
+
+TOP = 'TOP'
+BOTTOM = 'BOTTOM'
+
+
+class ConditionalConstantPropagation:
+    def __init__(self, optimizer):
+        self.optimizer = optimizer  # Constant evaluation rules
+        self.values = {}  # SSA name -> constant or BOTTOM (missing: TOP)
+        self.defined = set()  # Names some instruction or phi defines
+        self.readers = {}  # SSA name -> [(block, instruction or phi)]
+        self.executable = set()  # (predecessor id, block id); predecessor None for the entry
+        self.reached = set()  # Ids of blocks with an executable incoming edge
+        self.flow_work = []
+        self.ssa_work = []
+        self.substituted = []  # (variable, constant) replacements made
+
+    def run(self, cfg):
+        """Analyze an SSA-form graph, then substitute the constants found"""
+        self.analyze(cfg)
+        self.rewrite(cfg)
+        return self.substituted
+
+    def analyze(self, cfg):
+        """Propagate values and executable edges until both worklists are empty"""
+        for block in cfg.blocks:
+            for instr in block.phis + block.instructions:
+                self.defined.update(defs(instr))
+                for name in uses(instr):
+                    self.readers.setdefault(name, []).append((block, instr))
+
+        self.flow_work.append((None, cfg.entry))
+        while self.flow_work or self.ssa_work:
+            while self.flow_work:
+                pred, block = self.flow_work.pop()
+                edge = (pred.id if pred is not None else None, block.id)
+                if edge in self.executable:
+                    continue
+                self.executable.add(edge)
+                for phi in block.phis:
+                    self.visit_phi(block, phi)
+                if block.id not in self.reached:
+                    self.reached.add(block.id)
+                    for instr in block.instructions:
+                        self.visit(cfg, block, instr)
+                    if block.terminator() is None:
+                        self.add_successors(block, block.succs)
+
+            while self.ssa_work and not self.flow_work:
+                block, instr = self.ssa_work.pop()
+                if block.id not in self.reached:
+                    continue
+                if instr.op == 'phi':
+                    self.visit_phi(block, instr)
+                else:
+                    self.visit(cfg, block, instr)
+
+    def visit_phi(self, block, phi):
+        """Meet the values arriving over executable edges"""
+        value = TOP
+        for pred_id, arg in phi.arg1.items():
+            if (pred_id, block.id) in self.executable:
+                value = self.meet(value, self.operand(arg))
+        self.update(phi.result, value)
+
+    def visit(self, cfg, block, instr):
+        """Evaluate one instruction, and the edges it enables if it is a terminator"""
+        if instr.op == 'assign':
+            self.update(instr.result, self.evaluate_assign(instr.arg1))
+        elif instr.op in BINARY_OPS:
+            self.update(instr.result, self.evaluate_binary(instr.op, instr.arg1, instr.arg2))
+        else:
+            for name in defs(instr):
+                self.update(name, BOTTOM)  # input, call results, scale
+
+        if instr is block.terminator():
+            self.add_successors(block, self.successors(cfg, block, instr))
+
+    def successors(self, cfg, block, term):
+        """Successors a terminator can reach with what is known so far"""
+        if term.op == 'goto':
+            return block.succs
+        if term.op == 'return':
+            return []
+        taken = self.branch_taken(term)
+        if taken is TOP:
+            return []
+        if taken is BOTTOM:
+            return block.succs
+        target = cfg.label_map[term.result]
+        if taken:
+            return [target]
+        return [succ for succ in block.succs if succ is not target or len(block.succs) == 1]
+
+    def branch_taken(self, term):
+        """Whether a branch jumps: True/False, or TOP/BOTTOM when not known"""
+        if term.op in FUSED_BRANCH_OPS:
+            branch, compare = FUSED_BRANCH_OPS[term.op]
+            condition = self.evaluate_binary(compare, term.arg1, term.arg2)
+        else:
+            branch = term.op
+            condition = self.operand(term.arg1)
+        if condition in (TOP, BOTTOM):
+            return condition
+        if not self.optimizer.is_constant(condition):
+            return BOTTOM  # A unit value as condition is tested as text
+        return (float(condition) != 0) == (branch == 'if_true')
+
+    def add_successors(self, block, successors):
+        """Queue the edges from block to successors"""
+        for succ in successors:
+            if (block.id, succ.id) not in self.executable:
+                self.flow_work.append((block, succ))
+
+    def evaluate_assign(self, source):
+        """Lattice value of an ASSIGN's source operand"""
+        reference = unit_reference(source)
+        if is_variable(source) or reference is None:
+            return self.operand(source)
+        value = self.operand(reference)
+        if value in (TOP, BOTTOM):
+            return value
+        # "t3 ml" with a known t3 is the unit constant "300 ml"
+        constant = f"{value} {source.split(None, 1)[1]}"
+        return constant if unit_constant(constant) else BOTTOM
+
+    def evaluate_binary(self, op, arg1, arg2):
+        """Lattice value of arithmetic or a comparison"""
+        values = (self.operand(arg1), self.operand(arg2))
+        if BOTTOM in values:
+            return BOTTOM
+        if TOP in values:
+            return TOP
+        result = self.optimizer.fold_binary(op, *values)
+        if result is None:
+            return BOTTOM  # Division by zero, string concatenation, ...
+        result = str(result)
+        # inf and nan would read back as variable names
+        return result if self.optimizer.is_constant(result) and not is_variable(result) else BOTTOM
+
+    def operand(self, arg):
+        """Lattice value of an operand"""
+        if is_variable(arg):
+            return self.values.get(arg, TOP) if arg in self.defined else BOTTOM
+        if self.optimizer.is_constant(arg) or unit_constant(arg):
+            return arg
+        return BOTTOM  # Quoted text
+
+    def meet(self, a, b):
+        """Greatest lower bound of two lattice values"""
+        if a == TOP:
+            return b
+        if b == TOP or a == b:
+            return a
+        return BOTTOM
+
+    def update(self, name, value):
+        """Lower the value of name and queue its readers if it changed"""
+        old = self.values.get(name, TOP)
+        value = self.meet(old, value) if old != TOP else value
+        if value == old:
+            return
+        self.values[name] = value
+        for reader in self.readers.get(name, []):
+            self.ssa_work.append(reader)
+
+    def known(self, name):
+        """The constant a variable holds, or None"""
+        value = self.values.get(name) if is_variable(name) else None
+        return None if value in (None, TOP, BOTTOM) else value
+
+    def rewrite(self, cfg):
+        """Replace constant operands in the blocks that can run"""
+        for block in cfg.blocks:
+            if block.id not in self.reached:
+                continue  # Branch folding removes it
+            for instr in block.instructions:
+                if instr.op == 'assign':
+                    self.rewrite_assign(instr)
+                elif instr.op in BINARY_OPS or instr.op in FUSED_BRANCH_OPS:
+                    self.rewrite_binary(instr)
+                elif instr.op in BRANCH_OPS and self.known(instr.arg1) is not None:
+                    self.substitute(instr, 'arg1', self.known(instr.arg1))
+
+    def rewrite_assign(self, instr):
+        """Copy of a constant, or a "name unit" value with a constant name"""
+        if self.known(instr.arg1) is not None:
+            self.substitute(instr, 'arg1', self.known(instr.arg1))
+            return
+        reference = unit_reference(instr.arg1)
+        if reference is not None and self.optimizer.is_constant(self.known(reference)):
+            unit = instr.arg1.split(None, 1)[1]
+            self.substituted.append((reference, f"{self.known(reference)} {unit}"))
+            instr.arg1 = f"{self.known(reference)} {unit}"
+
+    def rewrite_binary(self, instr):
+        """Substitute constant operands of arithmetic, comparisons and fused branches"""
+        arg1 = self.known(instr.arg1) or instr.arg1
+        arg2 = self.known(instr.arg2) or instr.arg2
+        # Unit values are only substituted where the operation then folds
+        op = FUSED_BRANCH_OPS[instr.op][1] if instr.op in FUSED_BRANCH_OPS else instr.op
+        if (unit_constant(arg1) or unit_constant(arg2)) and self.optimizer.fold_binary(op, arg1, arg2) is None:
+            arg1 = arg1 if self.optimizer.is_constant(arg1) else instr.arg1
+            arg2 = arg2 if self.optimizer.is_constant(arg2) else instr.arg2
+        if arg1 != instr.arg1:
+            self.substitute(instr, 'arg1', arg1)
+        if arg2 != instr.arg2:
+            self.substitute(instr, 'arg2', arg2)
+
+    def substitute(self, instr, field, constant):
+        """Replace one variable operand by its constant"""
+        self.substituted.append((getattr(instr, field), constant))
+        setattr(instr, field, constant)
@@ -301,6 +301,21 @@ class SemanticAnalyzer:
             'line': line
         }
     
+    def register_import(self, name, signature, library):
+        """Register a recipe exported by an imported library"""
+        if name in self.recipe_table:
+            self.error(f"Recipe '{name}' imported from '{library}' is already defined")
+        
+        self.symbol_table.declare(name, 'RECIPE', 0)
+        
+        self.recipe_table[name] = {
+            'params': signature['params'],
+            'return_type': signature['return_type'],
+            'body': None,
+            'line': 0,
+            'library': library
+        }
+    
     def visit_RecipeDeclaration(self, node):
         """Visit recipe declaration"""
         self.current_recipe = node.name
@@ -0,0 +1,125 @@
+"""
+Input Specialization for RecipeScript
+Compiles a script once to unoptimized TAC, then produces residual programs
+for given values of its input variables.
+
+Specialization:
+---------------
+1. BINDING: every "input x" of a bound variable becomes "x = value", with the
+   value converted the way the interpreter converts typed input (int, then
+   float when it has a '.', otherwise text). Unbound inputs still prompt.
+
+2. RESIDUAL PROGRAM: the bound program goes through the full optimizer for
+   the -O level, so scaling arithmetic on the inputs is folded and branches
+   on them are resolved; library recipes are linked in afterwards and the
+   result is verified once.
+
+3. CACHE: residual programs are kept per input tuple (the bound values in
+   the order the script reads its inputs), least recently used first out
+   once SPECIALIZATION_CACHE_SIZE is reached.
+
+Example:
+    specializer = ProgramSpecializer(source_code)
+    program = specializer.specialize({'servings': 4})
+    VerifiedCodeGenerator().execute(program)
+"""
+
+from collections import OrderedDict
+
+from lexer import Lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from intermediate_code import IntermediateCodeGenerator
+from optimizer import Optimizer
+from verifier import IRVerifier
+from linker import Linker
+from pass_manager import DEFAULT_OPT_LEVEL
+from tac import TACInstruction
+from cfg import copy_instruction
+
+SPECIALIZATION_CACHE_SIZE = 32  # Residual programs kept per specializer
+
+
+class ProgramSpecializer:
+    def __init__(self, source_code, base_dir=None, opt_level=DEFAULT_OPT_LEVEL):
+        self.opt_level = opt_level
+        self.linker = Linker(opt_level)
+        ast = Parser(Lexer(source_code).tokenize()).parse()
+        libraries = self.linker.load_imports(ast.imports, base_dir)
+        semantic_analyzer = SemanticAnalyzer()
+        self.linker.declare_imports(semantic_analyzer, libraries)
+        semantic_analyzer.analyze(ast)
+        self.externals = self.linker.externals(libraries)
+        self.generic = IntermediateCodeGenerator().generate(ast)  # Unoptimized TAC
+
+        self.inputs = []  # Input variables in the order the script reads them
+        for instr in self.generic:
+            if instr.op == 'input' and instr.result not in self.inputs:
+                self.inputs.append(instr.result)
+        self.cache = OrderedDict()  # input tuple -> residual program
+        self.hits = 0
+        self.misses = 0
+
+    def specialize(self, bindings):
+        """Residual program for the given input values (from the cache if built before)"""
+        values = {}
+        for name, value in bindings.items():
+            if name not in self.inputs:
+                raise Exception(f"Specialization Error: '{name}' is not an input of the program")
+            values[name] = self.convert(value)
+        # 4 and 4.0 print differently, so the type is part of the key
+        key = tuple((name, type(values[name]).__name__, values[name]) for name in self.inputs if name in values)
+
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+
+        instructions = [self.bind(instr, values) for instr in self.generic]
+        optimizer = Optimizer(self.externals, level=self.opt_level)
+        instructions = optimizer.optimize(instructions)
+        if self.linker.units:
+            instructions = self.linker.link(instructions)
+        IRVerifier().verify(instructions)
+
+        self.cache[key] = instructions
+        if len(self.cache) > SPECIALIZATION_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return instructions
+
+    def convert(self, value):
+        """Value an input variable holds after reading value, as the interpreter stores it"""
+        if not isinstance(value, str):
+            return value
+        try:
+            return float(value) if '.' in value else int(value)
+        except ValueError:
+            return value
+
+    def bind(self, instr, values):
+        """Replace the INPUT of a bound variable with an assignment of its value"""
+        if instr.op != 'input' or instr.result not in values:
+            return copy_instruction(instr)
+        return TACInstruction('assign', self.literal(instr.result, values[instr.result]), None, instr.result)
+
+    def literal(self, name, value):
+        """TAC operand the interpreter reads back as value"""
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise Exception(f"Specialization Error: Unsupported value {value!r} for input '{name}'")
+        if isinstance(value, str):
+            if '"' in value:
+                raise Exception(f"Specialization Error: Input '{name}' may not contain '\"'")
+            return f'"{value}"'
+        text = str(value)
+        # Numbers are read back as float with a '.', else as int
+        if isinstance(value, float) and ('.' not in text or float(text) != value):
+            raise Exception(f"Specialization Error: {value!r} for input '{name}' has no literal form")
+        return text
+
+    def display_statistics(self):
+        """Display specialization cache use"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        print("\n=== Specialization Cache ===")
+        print(f"  {len(self.cache)} residual programs, {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)")
@@ -0,0 +1,289 @@
+"""
+Static Single Assignment Form for RecipeScript
+Converts each function's TAC into SSA form over its control flow graph
+and translates it back out again.
+
+SSA Conventions Used:
+---------------------
+1. VERSIONS: Every definition of x creates a new name x.1, x.2, ...
+   The bare name x stands for the value x had on entry to the function.
+
+2. PHI NODES: result = phi(value [block], ...) at join points
+   Example: t11.2 = phi(t11.1 [B3], t11.3 [B6])
+
+3. SCALE: scale reads one version and writes the next
+   Example: scale flour.1 by 1.2 -> flour.2
+
+4. CALLS: A recipe reads main-program variables by name (its writes stay
+   in its own frame), so SSA construction puts a pseudo-instruction
+   "use x" before the CALL for every variable x the recipe may read.
+"""
+
+from tac import TACInstruction
+from cfg import (ControlFlowGraph, uses, defs, replace_uses, replace_defs,
+                 is_variable, base_name, liveness)
+
+# Instructions that refer to a variable by its source name at runtime
+PINNED_OPS = ['display', 'scale', 'input', 'use']
+
+
+class SSABuilder:
+    def __init__(self, effects=None):
+        self.effects = effects
+
+    def build(self, function):
+        """Build the SSA-form control flow graph of a function"""
+        cfg = ControlFlowGraph(function.instructions)
+        cfg.compute_dominators()
+        self.remove_unreachable(cfg)
+        self.insert_call_effects(cfg, function)
+        self.insert_phis(cfg)
+        self.rename(cfg)
+        return cfg
+
+    def remove_unreachable(self, cfg):
+        """Drop blocks the entry cannot reach; renaming only visits reachable ones"""
+        cfg.blocks = [block for block in cfg.blocks if cfg.is_reachable(block)]
+        cfg.compute_edges()
+
+    def insert_call_effects(self, cfg, function):
+        """Make the implicit reads of recipe calls explicit"""
+        if self.effects is not None:
+            self.effects.mark_effects(cfg, function)
+
+    def insert_phis(self, cfg):
+        """Place phi nodes at iterated dominance frontiers (semi-pruned SSA)"""
+        frontiers = cfg.dominance_frontiers()
+        def_blocks = {}
+        global_names = set()
+        for block in cfg.rpo:
+            killed = set()
+            for instr in block.instructions:
+                for name in uses(instr):
+                    if name not in killed:
+                        global_names.add(name)
+                for name in defs(instr):
+                    killed.add(name)
+                    def_blocks.setdefault(name, []).append(block)
+
+        for name in sorted(global_names):
+            worklist = list(def_blocks.get(name, []))
+            placed = set()
+            while worklist:
+                block = worklist.pop()
+                for frontier in frontiers[block.id]:
+                    if frontier.id in placed:
+                        continue
+                    placed.add(frontier.id)
+                    args = {pred.id: name for pred in frontier.preds if cfg.is_reachable(pred)}
+                    frontier.phis.append(TACInstruction('phi', args, None, name))
+                    worklist.append(frontier)
+
+    def rename(self, cfg):
+        """Give every definition a fresh version (dominator-tree walk)"""
+        counters = {}
+        stacks = {}
+
+        def current(name):
+            stack = stacks.get(name)
+            return stack[-1] if stack else name
+
+        def fresh(name):
+            counters[name] = counters.get(name, 0) + 1
+            version = f"{name}.{counters[name]}"
+            stacks.setdefault(name, []).append(version)
+            pushed.append(name)
+            return version
+
+        work = [(cfg.entry, False)]
+        pushed_per_block = {}
+        while work:
+            block, done = work.pop()
+            if done:
+                for name in pushed_per_block.pop(block.id):
+                    stacks[name].pop()
+                continue
+            pushed = []
+            for phi in block.phis:
+                phi.result = fresh(phi.result)
+            for instr in block.instructions:
+                replace_uses(instr, current)
+                if instr.op == 'scale':
+                    instr.result = instr.arg1
+                replace_defs(instr, lambda name: fresh(base_name(name)))
+            for succ in block.succs:
+                for phi in succ.phis:
+                    if block.id in phi.arg1:
+                        phi.arg1[block.id] = current(phi.arg1[block.id])
+            pushed_per_block[block.id] = pushed
+            work.append((block, True))
+            for child in reversed(cfg.dom_children[block.id]):
+                work.append((child, False))
+
+
+class SSADestructor:
+    def __init__(self, supply):
+        self.supply = supply
+
+    def destruct(self, cfg):
+        """Translate an SSA-form graph back to TAC instructions"""
+        copies = self.insert_copies(cfg)
+        names = self.coalesce(cfg, copies)
+
+        def rename(name):
+            return names.get(name, base_name(name))
+
+        for block in cfg.blocks:
+            updated = []
+            for instr in block.instructions:
+                if instr.op == 'use':
+                    continue
+                replace_uses(instr, rename)
+                replace_defs(instr, rename)
+                if instr.op == 'assign' and instr.arg1 == instr.result:
+                    continue
+                if instr.op == 'scale':
+                    if instr.result != instr.arg1:
+                        updated.append(TACInstruction('assign', instr.arg1, None, instr.result))
+                        instr.arg1 = instr.result
+                    instr.result = None
+                updated.append(instr)
+            block.instructions = updated
+        return cfg.instructions()
+
+    def insert_copies(self, cfg):
+        """Replace phi nodes with copies at the end of each predecessor"""
+        for block in list(cfg.blocks):
+            if not block.phis or len(block.preds) < 2:
+                continue
+            for pred in list(block.preds):
+                if len(pred.succs) > 1:
+                    cfg.split_edge(pred, block, self.supply)
+
+        copies = []
+        for block in cfg.blocks:
+            if not block.phis:
+                continue
+            for pred in block.preds:
+                moves = [(phi.result, phi.arg1[pred.id]) for phi in block.phis if pred.id in phi.arg1]
+                sequence = self.sequentialize(moves)
+                term = pred.terminator()
+                position = len(pred.instructions) - 1 if term is not None else len(pred.instructions)
+                pred.instructions[position:position] = sequence
+                copies.extend(sequence)
+            block.phis = []
+        return copies
+
+    def sequentialize(self, moves):
+        """Order a parallel copy so no source is overwritten before it is read"""
+        moves = [(dest, src) for dest, src in moves if dest != src]
+        sequence = []
+        while moves:
+            pending_sources = set(src for _, src in moves)
+            ready = [(dest, src) for dest, src in moves if dest not in pending_sources]
+            if ready:
+                for dest, src in ready:
+                    sequence.append(TACInstruction('assign', src, None, dest))
+                    moves.remove((dest, src))
+                continue
+            # Only cycles remain: break one with a fresh temporary
+            dest, src = moves[0]
+            temp = self.supply.new_temp()
+            sequence.append(TACInstruction('assign', src, None, temp))
+            moves[0] = (dest, temp)
+        return sequence
+
+    def coalesce(self, cfg, copies):
+        """Merge versions of the same variable that never interfere"""
+        interference = self.build_interference(cfg)
+        parent = {}
+
+        def find(name):
+            parent.setdefault(name, name)
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        members = {}
+
+        def group(name):
+            root = find(name)
+            return members.setdefault(root, {root})
+
+        def try_union(a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b:
+                return True
+            group_a, group_b = group(root_a), group(root_b)
+            for x in group_a:
+                if interference.get(x, set()) & group_b:
+                    return False
+            parent[root_b] = root_a
+            group_a |= members.pop(root_b)
+            return True
+
+        versions = {}
+        pinned = set()
+        for block in cfg.blocks:
+            for instr in block.instructions:
+                for name in uses(instr) + defs(instr):
+                    versions.setdefault(base_name(name), set()).add(name)
+                    if instr.op in PINNED_OPS:
+                        pinned.add(name)
+
+        # Copies from phi nodes first, then any other versions
+        for copy in copies:
+            if is_variable(copy.arg1) and base_name(copy.arg1) == base_name(copy.result):
+                try_union(copy.result, copy.arg1)
+        for base, names in versions.items():
+            ordered = sorted(names, key=lambda n: (n != base, n))
+            for name in ordered[1:]:
+                try_union(ordered[0], name)
+
+        names = {}
+        for base, group_names in versions.items():
+            roots = []
+            for name in group_names:
+                if find(name) not in roots:
+                    roots.append(find(name))
+            # The class holding pinned versions keeps the source name
+            roots.sort(key=lambda root: -len(group(root) & pinned))
+            for index, root in enumerate(roots):
+                if index > 0 and group(root) & pinned:
+                    raise Exception(f"SSA Error: Versions of '{base}' interfere across a named use")
+                final = base if index == 0 else self.supply.new_temp()
+                for name in group(root):
+                    names[name] = final
+        return names
+
+    def build_interference(self, cfg):
+        """Pairs of variables that are live at the same time"""
+        _, live_out = liveness(cfg)
+        interference = {}
+
+        def add(a, b):
+            interference.setdefault(a, set()).add(b)
+            interference.setdefault(b, set()).add(a)
+
+        for block in cfg.blocks:
+            live = set(live_out[block.id])
+            for instr in reversed(block.instructions):
+                source = instr.arg1 if instr.op == 'assign' and is_variable(instr.arg1) else None
+                for name in defs(instr):
+                    for other in live:
+                        if other != name and other != source:
+                            add(name, other)
+                    live.discard(name)
+                live.update(uses(instr))
+        return interference
+
+
+def to_ssa(function, effects=None):
+    """Convert a function to an SSA-form control flow graph"""
+    return SSABuilder(effects).build(function)
+
+
+def from_ssa(cfg, supply):
+    """Convert an SSA-form control flow graph back to TAC"""
+    return SSADestructor(supply).destruct(cfg)
@@ -0,0 +1,87 @@
+"""
+Three-Address Code Instruction for RecipeScript
+Shared by the intermediate code generator, the optimizer, the bytecode
+format and the interpreter (kept free of front-end imports)
+"""
+
+COMPARISON_SYMBOLS = {'eq': '==', 'neq': '!=', 'gt': '>', 'lt': '<', 'gte': '>=', 'lte': '<='}
+
+# Comparison fused with a conditional jump by the peephole pass:
+# if_gt a, b -> L jumps when a > b, ifnot_gt a, b -> L when it does not
+FUSED_BRANCH_OPS = {f"{prefix}_{comparison}": (branch, comparison)
+                    for prefix, branch in [('if', 'if_true'), ('ifnot', 'if_false')]
+                    for comparison in COMPARISON_SYMBOLS}
+
+
+class TACInstruction:
+    """Three-Address Code instruction"""
+    def __init__(self, op, arg1=None, arg2=None, result=None):
+        self.op = op
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.result = result
+    
+    def __str__(self):
+        if self.op == 'assign':
+            return f"{self.result} = {self.arg1}"
+        elif self.op in ['add', 'sub', 'mul', 'div']:
+            op_symbol = {
+                'add': '+', 'sub': '-', 'mul': '*', 'div': '/'
+            }[self.op]
+            return f"{self.result} = {self.arg1} {op_symbol} {self.arg2}"
+        elif self.op in COMPARISON_SYMBOLS:
+            return f"{self.result} = {self.arg1} {COMPARISON_SYMBOLS[self.op]} {self.arg2}"
+        elif self.op == 'label':
+            return f"{self.result}:"
+        elif self.op == 'goto':
+            return f"goto {self.result}"
+        elif self.op == 'if_false':
+            return f"if_false {self.arg1} goto {self.result}"
+        elif self.op == 'if_true':
+            return f"if_true {self.arg1} goto {self.result}"
+        elif self.op in FUSED_BRANCH_OPS:
+            branch, comparison = FUSED_BRANCH_OPS[self.op]
+            keyword = 'if' if branch == 'if_true' else 'ifnot'
+            return f"{keyword} {self.arg1} {COMPARISON_SYMBOLS[comparison]} {self.arg2} goto {self.result}"
+        elif self.op == 'print':
+            return f"print {self.arg1}"
+        elif self.op == 'mix':
+            ingredients = ', '.join(self.arg1)
+            return f"mix {ingredients}"
+        elif self.op == 'heat':
+            return f"heat {self.arg1} to {self.arg2}"
+        elif self.op == 'wait':
+            return f"wait {self.arg1}"
+        elif self.op == 'serve':
+            return f"serve \"{self.arg1}\""
+        elif self.op == 'display':
+            return f"display {self.arg1}"
+        elif self.op == 'scale':
+            if self.result:
+                return f"scale {self.arg1} by {self.arg2} -> {self.result}"
+            return f"scale {self.arg1} by {self.arg2}"
+        elif self.op == 'add_ingredient':
+            return f"add {self.arg1} to {self.arg2}"
+        elif self.op == 'input':
+            return f"input {self.result}"
+        elif self.op == 'begin_recipe':
+            if self.arg1:
+                return f"RECIPE {self.result}({', '.join(self.arg1)}):"
+            return f"RECIPE {self.result}:"
+        elif self.op == 'end_recipe':
+            return f"END_RECIPE {self.result}"
+        elif self.op == 'param':
+            return f"PARAM {self.arg1}"
+        elif self.op == 'call':
+            return f"{self.result} = CALL {self.arg1}, {self.arg2}"
+        elif self.op == 'return':
+            if self.arg1:
+                return f"RETURN {self.arg1}"
+            return "RETURN"
+        elif self.op == 'phi':
+            args = ', '.join(f"{value} [B{block}]" for block, value in self.arg1.items())
+            return f"{self.result} = phi({args})"
+        elif self.op == 'use':
+            return f"use {self.arg1}"
+        else:
+            return f"{self.op} {self.arg1} {self.arg2} {self.result}"
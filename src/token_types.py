@@ -36,6 +36,9 @@ class TokenType(Enum):
     RETURN = auto()
     RETURNS = auto()
     
+    # Libraries
+    IMPORT = auto()
+    
     # Input/Output
     INPUT = auto()
     
@@ -136,6 +139,7 @@ KEYWORDS = {
     'recipe': TokenType.RECIPE,
     'return': TokenType.RETURN,
     'returns': TokenType.RETURNS,
+    'import': TokenType.IMPORT,
     'input': TokenType.INPUT,
     'to': TokenType.TO,
     'with': TokenType.WITH,
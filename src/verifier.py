@@ -0,0 +1,117 @@
+"""
+IR Verifier for RecipeScript
+Statically validates a whole TAC program before execution so the
+interpreter can run it without per-instruction safety checks.
+
+Checks Performed:
+-----------------
+1. RECIPES: begin_recipe/end_recipe are paired, not nested, and unique
+2. LABELS: every label is defined once, and every goto/if_true/if_false
+   (or fused compare-and-branch) targets a label inside the same recipe (or the main program)
+3. CALLS: every CALL names a defined recipe, with a non-negative
+   argument count matching the recipe's declared parameters (when recorded)
+4. PARAMS: PARAM pushes are consumed by CALLs in the same basic block,
+   and no CALL pops more arguments than were pushed
+"""
+
+from cfg import split_functions
+from tac import FUSED_BRANCH_OPS
+
+KNOWN_OPS = [
+    'assign', 'add', 'sub', 'mul', 'div',
+    'eq', 'neq', 'gt', 'lt', 'gte', 'lte',
+    'label', 'goto', 'if_false', 'if_true',
+    'print', 'mix', 'heat', 'wait', 'serve', 'display', 'scale',
+    'add_ingredient', 'input',
+    'begin_recipe', 'end_recipe', 'param', 'call', 'return',
+] + list(FUSED_BRANCH_OPS)
+JUMP_OPS = ['goto', 'if_false', 'if_true'] + list(FUSED_BRANCH_OPS)
+
+
+class IRVerifier:
+    def __init__(self):
+        self.errors = []
+
+    def error(self, msg):
+        """Record verification error"""
+        self.errors.append(msg)
+
+    def verify(self, instructions):
+        """Verify a program; raises if any check fails"""
+        self.errors = []
+        recipes = self.check_recipe_structure(instructions)
+        if not self.errors:
+            for function in split_functions(instructions):
+                self.check_function(function, recipes)
+
+        if self.errors:
+            details = '; '.join(self.errors[:5])
+            more = f" (and {len(self.errors) - 5} more)" if len(self.errors) > 5 else ''
+            raise Exception(f"Verification Error: {details}{more}")
+        return True
+
+    def check_recipe_structure(self, instructions):
+        """Check begin/end nesting and collect recipe headers"""
+        recipes = {}
+        current = None
+        for i, instr in enumerate(instructions):
+            if instr.op not in KNOWN_OPS:
+                self.error(f"Unknown instruction '{instr.op}' at {i}")
+            elif instr.op == 'begin_recipe':
+                if current is not None:
+                    self.error(f"Recipe '{instr.result}' nested inside '{current.result}' at {i}")
+                elif instr.result in recipes:
+                    self.error(f"Recipe '{instr.result}' defined twice")
+                recipes[instr.result] = instr
+                current = instr
+            elif instr.op == 'end_recipe':
+                if current is None:
+                    self.error(f"END_RECIPE {instr.result} without matching RECIPE at {i}")
+                elif current.result != instr.result:
+                    self.error(f"END_RECIPE {instr.result} closes recipe '{current.result}' at {i}")
+                current = None
+        if current is not None:
+            self.error(f"Recipe '{current.result}' is never closed")
+        return recipes
+
+    def check_function(self, function, recipes):
+        """Check labels, jumps and calls inside one recipe or the main program"""
+        where = f"recipe '{function.name}'" if function.name else "main program"
+        labels = set()
+        for instr in function.instructions:
+            if instr.op == 'label':
+                if instr.result in labels:
+                    self.error(f"Label {instr.result} defined twice in {where}")
+                labels.add(instr.result)
+
+        pending_params = 0
+        for instr in function.instructions:
+            if instr.op == 'label' or instr.op in JUMP_OPS or instr.op == 'return':
+                if pending_params:
+                    self.error(f"{pending_params} PARAM(s) not consumed by a CALL in {where}")
+                    pending_params = 0
+            if instr.op in JUMP_OPS and instr.result not in labels:
+                self.error(f"Jump to undefined label {instr.result} in {where}")
+            elif instr.op == 'param':
+                pending_params += 1
+            elif instr.op == 'call':
+                pending_params = self.check_call(instr, recipes, pending_params, where)
+        if pending_params:
+            self.error(f"{pending_params} PARAM(s) not consumed by a CALL in {where}")
+
+    def check_call(self, instr, recipes, pending_params, where):
+        """Check one CALL and return the PARAM depth after it"""
+        arg_count = instr.arg2
+        if not isinstance(arg_count, int) or arg_count < 0:
+            self.error(f"CALL {instr.arg1} has invalid argument count {arg_count!r} in {where}")
+            return pending_params
+        if instr.arg1 not in recipes:
+            self.error(f"CALL to undefined recipe '{instr.arg1}' in {where}")
+        else:
+            declared = recipes[instr.arg1].arg1
+            if isinstance(declared, list) and len(declared) != arg_count:
+                self.error(f"CALL {instr.arg1} passes {arg_count} arguments, recipe declares {len(declared)}")
+        if arg_count > pending_params:
+            self.error(f"CALL {instr.arg1} pops {arg_count} arguments but only {pending_params} PARAM(s) were pushed in {where}")
+            return 0
+        return pending_params - arg_count
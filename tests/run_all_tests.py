@@ -1,19 +1,65 @@
 """
 Test Runner for RecipeScript Compiler
 Runs all test files and reports results
+
+Besides running every file, the runner checks what the programs print:
+- OUTPUTS: every test runs at -O0..-O3 and on the register VM with fixed
+  input values (one of them text); all of them must print what -O0 prints,
+  which must match tests/expected/<test>.out
+  (python run_all_tests.py --update-expected rewrites those files)
+- OPTIMIZATIONS: optimizations a test exists for must still be applied,
+  and ones that would change what a test prints must not be
+- SHAPES: tests of code transformations (unrolling) check how many
+  instructions of some kinds the optimized code has
 """
 
+import builtins
+import contextlib
+import io
 import os
 import sys
 
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
 
-from compiler import run_file
+from compiler import run_file, compile_source
+from code_generator import VerifiedCodeGenerator
+from register_vm import RegisterVM
+from verifier import IRVerifier
+from lexer import Lexer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from intermediate_code import IntermediateCodeGenerator
+from optimizer import Optimizer
+from linker import Linker
 
-def main():
-    """Run all test files"""
-    test_files = [
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPECTED_DIR = os.path.join(TESTS_DIR, 'expected')
+INPUT_VALUES = ['4', '2.5', 'abc']  # Every INPUT of a run reads the same value
+# (backend name, optimization level, register VM?) compared against -O0
+BACKENDS = [('-O0', 0, False), ('-O1', 1, False), ('-O2', 2, False), ('-O3', 3, False),
+            ('-O2 --register-vm', 2, True)]
+
+# (test file, optimization level, text of an optimization, whether it must be applied)
+OPTIMIZATION_CHECKS = [
+    ('dead_arithmetic.recipe', 1, 'Dead code elimination: Removed unused doubled', True),
+    ('dead_arithmetic.recipe', 2, 'Dead code elimination: Removed unused spare', False),
+    ('hoisted_trays.recipe', 2, 'computed once before loop L0', False),
+    ('hoisted_trays.recipe', 2, 'Loop-invariant code motion: t7 computed once before loop L2', True),
+    ('bakery_shift.recipe', 2, 'Loop-invariant code motion', True),
+    ('knead_and_rest.recipe', 2, 'Loop-invariant code motion', True),
+    ('knead_and_rest.recipe', 2, 'Loop fusion', True),
+    ('fixed_batch.recipe', 3, 'Loop unrolling: loop L4 fully unrolled (3 iterations)', True),
+    ('unrolled_batches.recipe', 3, 'Loop unrolling: loop L0 unrolled by 4 (202 iterations)', True),
+]
+
+# (test file, optimization level, {op: number of instructions with that op in the optimized code})
+SHAPE_CHECKS = [
+    ('fixed_batch.recipe', 3, {'mix': 3, 'goto': 0}),  # Three copies of the body, no loop left
+    ('unrolled_batches.recipe', 3, {'add': 7, 'goto': 1}),  # 2 peeled copies, 4 per iteration, the counter
+]
+
+TEST_FILES = [
         'simple_cookies.recipe',
         'rice_arithmetic.recipe',
         'oven_conditional.recipe',
@@ -29,7 +75,25 @@ def main():
         'pizza_long.recipe',
         'pizza.recipe',
         'sample.recipe',
-    ]
+        'library_import.recipe',
+        'shared_measurements.recipe',
+        'bakery_shift.recipe',
+        'fixed_batch.recipe',
+        'party_units.recipe',
+        'proofing_schedule.recipe',
+        'knead_and_rest.recipe',
+        'steady_oven.recipe',
+        'batch_timer.recipe',
+        'early_return.recipe',
+        'dead_arithmetic.recipe',
+        'hoisted_trays.recipe',
+        'unrolled_batches.recipe',
+]
+
+
+def main():
+    """Run all test files"""
+    test_files = TEST_FILES
     
     print("=" * 60)
     print("RecipeScript Compiler - Test Suite")
@@ -62,10 +126,109 @@ def main():
     
     print(f"\nTotal: {passed}/{total} tests passed")
     
-    if passed == total:
+    failures = check_outputs(test_files) + check_optimizations() + check_shapes()
+    for failure in failures:
+        print(f"[FAIL] - {failure}")
+    
+    if passed == total and not failures:
         print("\n[SUCCESS] All tests passed!")
     else:
-        print(f"\n[WARNING] {total - passed} test(s) failed")
+        print(f"\n[WARNING] {total - passed} test(s) failed, {len(failures)} check(s) failed")
+
+
+def run_program(test_file, opt_level, register_vm, value):
+    """Lines a test prints at an optimization level when every INPUT reads value"""
+    with open(test_file, 'r') as f:
+        source_code = f.read()
+    code_generator = RegisterVM() if register_vm else VerifiedCodeGenerator()
+    old_input = builtins.input
+    builtins.input = lambda prompt='': value
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            instructions = compile_source(source_code, show_phases=False, base_dir=TESTS_DIR, opt_level=opt_level)
+            IRVerifier().verify(instructions)
+            code_generator.execute(instructions)
+        return code_generator.output
+    except Exception as e:
+        # Lines printed before a runtime error are part of the output
+        return code_generator.output + [f"ERROR: {e}"]
+    finally:
+        builtins.input = old_input
+
+
+def program_outputs(test_file, opt_level, register_vm):
+    """Printed lines of a test for every input value, in the expected-file format"""
+    lines = []
+    for value in INPUT_VALUES:
+        lines.append(f"# input: {value}")
+        lines.extend(run_program(test_file, opt_level, register_vm, value))
+    return '\n'.join(lines) + '\n'
+
+
+def check_outputs(test_files):
+    """Compare every backend's output with -O0 and -O0 with the expected file"""
+    update = '--update-expected' in sys.argv
+    failures = []
+    for test_file in test_files:
+        if not os.path.exists(test_file):
+            continue
+        reference = program_outputs(test_file, 0, False)
+        for name, opt_level, register_vm in BACKENDS[1:]:
+            if program_outputs(test_file, opt_level, register_vm) != reference:
+                failures.append(f"{test_file}: output at {name} differs from -O0")
+        
+        expected_file = os.path.join(EXPECTED_DIR, os.path.splitext(test_file)[0] + '.out')
+        if update:
+            os.makedirs(EXPECTED_DIR, exist_ok=True)
+            with open(expected_file, 'w') as f:
+                f.write(reference)
+        elif not os.path.exists(expected_file):
+            failures.append(f"{test_file}: no expected output ({expected_file})")
+        else:
+            with open(expected_file, 'r') as f:
+                if f.read() != reference:
+                    failures.append(f"{test_file}: output differs from {expected_file}")
+    return failures
+
+
+def optimize_file(test_file, opt_level):
+    """Optimizer that compiled a test at an optimization level (for its statistics) and the code"""
+    with open(test_file, 'r') as f:
+        ast = Parser(Lexer(f.read()).tokenize()).parse()
+    linker = Linker(opt_level)
+    libraries = linker.load_imports(ast.imports, TESTS_DIR)
+    semantic_analyzer = SemanticAnalyzer()
+    linker.declare_imports(semantic_analyzer, libraries)
+    semantic_analyzer.analyze(ast)
+    optimizer = Optimizer(linker.externals(libraries), level=opt_level)
+    with contextlib.redirect_stdout(io.StringIO()):
+        instructions = optimizer.optimize(IntermediateCodeGenerator().generate(ast))
+    return optimizer, instructions
+
+
+def check_optimizations():
+    """Check that the optimizations tests were written for are applied (or not)"""
+    failures = []
+    for test_file, opt_level, expected, wanted in OPTIMIZATION_CHECKS:
+        applied = optimize_file(test_file, opt_level)[0].optimizations_applied
+        found = any(expected in optimization for optimization in applied)
+        if found and not wanted:
+            failures.append(f"{test_file}: -O{opt_level} applies '{expected}'")
+        elif wanted and not found:
+            failures.append(f"{test_file}: -O{opt_level} no longer applies '{expected}'")
+    return failures
+
+
+def check_shapes():
+    """Check the instruction counts of optimized tests"""
+    failures = []
+    for test_file, opt_level, counts in SHAPE_CHECKS:
+        _, instructions = optimize_file(test_file, opt_level)
+        for op, expected in counts.items():
+            found = sum(1 for instr in instructions if instr.op == op)
+            if found != expected:
+                failures.append(f"{test_file}: -O{opt_level} code has {found} '{op}' instructions, expected {expected}")
+    return failures
 
 if __name__ == "__main__":
     main()